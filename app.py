@@ -1,9 +1,10 @@
 import argparse
 import asyncio
 
-from src import scan_products, store_products_remote
+from src import scan_and_store, scan_products, store_products_remote
 from src.config.environment_vars import EnvironmentVars
 from src.config.logger import setup_logger
+from src.sharding import Shard
 
 logger = setup_logger(EnvironmentVars().get_logging_level())
 
@@ -16,11 +17,15 @@ def main():
         "--operation",
         "-op",
         type=str,
-        choices=["scan", "store"],
+        choices=["scan", "store", "scan-and-store"],
         required=True,
-        help="Operation to perform: scan or store",
+        help=(
+            "Operation to perform: scan, store, or scan-and-store (store the new products as they "
+            "are scanned, with the async engine)"
+        ),
     )
-    parser.add_argument(
+    sampling = parser.add_mutually_exclusive_group()
+    sampling.add_argument(
         "--partial",
         "-p",
         type=str,
@@ -35,19 +40,115 @@ def main():
         required=False,
         help="Scan/store only a part of the products",
     )
+    sampling.add_argument(
+        "--shard",
+        "-s",
+        type=Shard.parse,
+        required=False,
+        help="Scan/store only the i-th of N hash-balanced shards, e.g. `2/5` (1-based)",
+    )
+    parser.add_argument(
+        "--engine",
+        "-e",
+        type=str,
+        choices=["browser", "async", "http"],
+        default="browser",
+        help=(
+            "Scan: with a headless browser (sync or async Playwright), or through the JSON API "
+            "(browser as fallback)"
+        ),
+    )
+    parser.add_argument(
+        "--scan-workers",
+        "-k",
+        type=int,
+        default=1,
+        help="Scan: browsers scanning categories in parallel (browser engine)",
+    )
+    parser.add_argument(
+        "--budget",
+        "-b",
+        type=int,
+        required=False,
+        help="Store: maximum number of products to refresh (most volatile and stalest first)",
+    )
+
+    parser.add_argument(
+        "--queue",
+        "-q",
+        action="store_true",
+        help="Store: claim work from the shared database queue (for several store processes)",
+    )
+
+    parser.add_argument(
+        "--deadline",
+        "-d",
+        type=float,
+        required=False,
+        help="Store/scan-and-store: stop cleanly before this many minutes",
+    )
+
+    parser.add_argument(
+        "--parse-workers",
+        "-w",
+        type=int,
+        default=0,
+        help=(
+            "Store/scan-and-store: processes parsing the responses (0: on the main thread, -1: one "
+            "per core)"
+        ),
+    )
+
+    parser.add_argument(
+        "--snapshot-dir",
+        type=str,
+        required=False,
+        help=(
+            "Store/scan-and-store: also export the observed prices as a Parquet snapshot under "
+            "this directory"
+        ),
+    )
 
     # Parse the arguments
     args = parser.parse_args()
 
     operation = args.operation
     partial = args.partial
+    budget = args.budget
+    shard = args.shard
+    engine = args.engine
+    scan_workers = args.scan_workers
+    use_queue = args.queue
+    deadline = args.deadline
+    parse_workers = args.parse_workers
+    snapshot_dir = args.snapshot_dir
 
     if operation == "scan":
-        scan_products.main(partial)
+        scan_products.main(partial, shard, engine, scan_workers)
     elif operation == "store":
-        asyncio.run(store_products_remote.main(partial))
+        asyncio.run(
+            store_products_remote.main(
+                partial,
+                budget,
+                shard,
+                use_queue,
+                deadline_minutes=deadline,
+                parse_workers=parse_workers,
+                snapshot_dir=snapshot_dir,
+            )
+        )
+    elif operation == "scan-and-store":
+        asyncio.run(
+            scan_and_store.main(
+                partial,
+                shard,
+                deadline_minutes=deadline,
+                parse_workers=parse_workers,
+                snapshot_dir=snapshot_dir,
+            )
+        )
     else:
-        print("Invalid option. Please use 'scan' or 'store'.")
+        print("Invalid option. Please use 'scan', 'store' or 'scan-and-store'.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+"""Per-product CPU cost of parsing product API responses.
+
+Usage:
+    python -m scripts.benchmark_parser [--responses N] [--input responses.json]
+
+By default the recorded responses of `tests/fixtures/products_full.json` are replicated (with
+different IDs) up to N responses.
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Callable
+
+from src.models import (
+    Badge,
+    Category,
+    FullInfo,
+    NutritionInformation,
+    Photo,
+    PriceInstruction,
+    Product,
+    Supplier,
+)
+from src.scraper.extractor import extract_full_info, extract_raw
+from src.scraper.info_parser import InfoParser
+
+
+def info_parser_double_build(item: dict) -> dict:
+    """Previous path: `InfoParser` walks, models built for the inserts and again for `FullInfo`."""
+    product_data = InfoParser.product(item)
+    product_id = float(product_data["id"])
+    _ = Badge(**InfoParser.badge(item))
+    _ = Supplier(**InfoParser.supplier(item))
+    _ = Product(**product_data)
+    photos_data = InfoParser.photo(item)
+    for photo_data in photos_data:
+        photo_data["product_id"] = product_id
+        _ = Photo(**photo_data)
+    categories_data = InfoParser.category(item)
+    for category_data in categories_data:
+        _ = Category(**category_data)
+    price_data = InfoParser.price_instruction(item)
+    price_data["product_id"] = product_id
+    _ = PriceInstruction(**price_data)
+    nutrition_data = InfoParser.nutrition_information(item)
+    nutrition_data["product_id"] = product_id
+    _ = NutritionInformation(**nutrition_data)
+
+    full_info = FullInfo(
+        product=Product(**product_data),
+        badge=Badge(**InfoParser.badge(item)),
+        supplier=Supplier(**InfoParser.supplier(item)),
+        photos=[Photo(**photo_data) for photo_data in photos_data],
+        categories=[Category(**category_data) for category_data in categories_data],
+        price_instruction=PriceInstruction(**price_data),
+        nutrition_information=NutritionInformation(**nutrition_data),
+    )
+    return full_info.model_dump()
+
+
+def extractor_payload(item: dict) -> dict:
+    """Current storage payload: single walk, single validation, dump."""
+    return extract_full_info(item).model_dump()
+
+
+def load_responses(path: str, n_responses: int) -> list[dict]:
+    with open(path, "r", encoding="utf-8") as json_file:
+        recorded = json.load(json_file)
+
+    responses = []
+    for i in range(n_responses):
+        response = dict(recorded[i % len(recorded)])
+        response["id"] = str(i + 1)
+        responses.append(response)
+    return responses
+
+
+def run(name: str, parse: Callable[[Any], object], items: list) -> None:
+    start = time.process_time()
+    for item in items:
+        parse(item)
+    elapsed = time.process_time() - start
+    print(f"{name:<28} {elapsed:8.3f}s total {1e6 * elapsed / len(items):10.1f}us/product")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the product parsers.")
+    parser.add_argument("--responses", "-n", type=int, default=5000)
+    parser.add_argument("--input", "-i", type=str, default="tests/fixtures/products_full.json")
+    args = parser.parse_args()
+
+    responses = load_responses(args.input, args.responses)
+    full_infos = [extract_full_info(response) for response in responses]
+
+    print(f"{len(responses)} responses")
+    run("InfoParser + double build", info_parser_double_build, responses)
+    run("extract_raw (walk only)", extract_raw, responses)
+    run("extract_full_info", extract_full_info, responses)
+    run("extract_full_info + dump", extractor_payload, responses)
+    run("model_dump only", FullInfo.model_dump, full_infos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""CPU cost of the scan bookkeeping (`ProductsState`) for a whole catalog.
+
+Usage:
+    python -m scripts.benchmark_products_state [--products N]
+
+The page is replaced by fake locators, and the calls of `get_product_basic.compute` are replayed
+(every product opened one at a time), so only the bookkeeping is measured. The reads of the
+texts of the elements are counted too, since each of them is a round trip to the browser in a real
+scan.
+"""
+
+import argparse
+import time
+from datetime import datetime
+from typing import Any
+
+from src.models import ScannedProduct
+from src.scraper.product_state import ProductsState
+
+N_CATEGORIES = 25
+N_SUBCATEGORIES = 20
+
+
+class FakeLocator:
+    """Stands for both a `Locator` and an `ElementHandle` of an element with a fixed text."""
+
+    n_round_trips = 0
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def inner_text(self) -> str:
+        FakeLocator.n_round_trips += 1
+        return self.text
+
+    def element_handle(self) -> "FakeLocator":
+        return self
+
+
+def read_all(texts) -> tuple[list[Any], list[str]]:
+    """Locators of a list of elements, with their texts read at once (`all_inner_texts`)."""
+    FakeLocator.n_round_trips += 1
+    return [FakeLocator(text) for text in texts], list(texts)
+
+
+def synthetic_catalog(n_products: int) -> dict[str, dict[str, list[str]]]:
+    n_per_subcategory = max(1, n_products // (N_CATEGORIES * N_SUBCATEGORIES))
+    return {
+        f"Category {c:02d}": {
+            f"Subcategory {c:02d}-{s:02d}": [
+                f"Product {c:02d}-{s:02d}-{p:03d}" for p in range(n_per_subcategory)
+            ]
+            for s in range(N_SUBCATEGORIES)
+        }
+        for c in range(N_CATEGORIES)
+    }
+
+
+def replay_scan(catalog: dict[str, dict[str, list[str]]]) -> ProductsState:
+    """Same calls as `get_product_basic.compute`, in the same order."""
+    products_state = ProductsState()
+    product_names = [p for category in catalog.values() for s in category.values() for p in s]
+    ids = {name: float(i) for i, name in enumerate(product_names)}
+
+    def subcategories(category_loc: Any) -> tuple[list[Any], list[str]]:
+        return read_all(catalog[category_loc.text])
+
+    def products(category_loc: Any, subcategory_loc: Any) -> tuple[list[Any], list[str], list[Any]]:
+        locators, names = read_all(catalog[category_loc.text][subcategory_loc.text])
+        # Handles (`element_handles`)
+        FakeLocator.n_round_trips += 1
+        return locators, names, locators
+
+    products_state.add_categories(*read_all(catalog))
+    pending_cats: list[Any] = products_state.get_pending_categories()
+    products_state.add_subcategories(pending_cats[0], *subcategories(pending_cats[0]))
+    pending_subcats: list[Any] = products_state.get_pending_subcategories(pending_cats[0])
+    products_state.add_products(
+        pending_cats[0], pending_subcats[0], *products(pending_cats[0], pending_subcats[0])
+    )
+    pending_products: list[Any] = products_state.get_pending_products(
+        pending_cats[0], pending_subcats[0]
+    )
+
+    while True:
+        if pending_products:
+            category_name, subcategory_name = products_state.get_names(
+                pending_cats[0], pending_subcats[0]
+            )
+            products_state.add_scanned_product(
+                pending_cats[0],
+                pending_subcats[0],
+                pending_products[0],
+                ScannedProduct(
+                    product_id=ids[pending_products[0].text],
+                    category_name=category_name,
+                    subcategory_name=subcategory_name,
+                    scanned_at=datetime.now(),
+                ),
+            )
+
+        current_cat = pending_cats[0]
+        current_subcat = pending_subcats[0]
+
+        pending_cats = products_state.get_pending_categories()
+        if pending_cats:
+            pending_subcats = products_state.get_pending_subcategories(pending_cats[0])
+        else:
+            break
+        if pending_subcats:
+            pending_products = products_state.get_pending_products(
+                pending_cats[0], pending_subcats[0]
+            )
+
+        if current_cat != pending_cats[0] or len(pending_subcats) == 0:
+            products_state.add_subcategories(pending_cats[0], *subcategories(pending_cats[0]))
+            pending_subcats = products_state.get_pending_subcategories(pending_cats[0])
+
+        if current_subcat != pending_subcats[0]:
+            products_state.add_products(
+                pending_cats[0], pending_subcats[0], *products(pending_cats[0], pending_subcats[0])
+            )
+            pending_products = products_state.get_pending_products(
+                pending_cats[0], pending_subcats[0]
+            )
+
+    return products_state
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="CPU cost of the scan bookkeeping.")
+    parser.add_argument("--products", type=int, default=10000)
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.products)
+    n_products = sum(len(s) for c in catalog.values() for s in c.values())
+    start = time.perf_counter()
+    products_state = replay_scan(catalog)
+    elapsed = time.perf_counter() - start
+
+    assert len(products_state.get_scanned_products()) == n_products
+    print(
+        f"{n_products} products: {elapsed:.3f}s ({elapsed / n_products * 1e6:.0f} us/product), "
+        f"{FakeLocator.n_round_trips} text reads"
+    )
+
+
+if __name__ == "__main__":
+    main()
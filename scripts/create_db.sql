@@ -7,6 +7,12 @@ DROP TABLE IF EXISTS product_category CASCADE;
 DROP TABLE IF EXISTS price_instruction CASCADE;
 DROP TABLE IF EXISTS nutrition_information CASCADE;
 DROP TABLE IF EXISTS scanned_products CASCADE;
+DROP TABLE IF EXISTS product_refresh CASCADE;
+DROP TABLE IF EXISTS store_queue CASCADE;
+DROP TABLE IF EXISTS category_price_daily CASCADE;
+DROP TABLE IF EXISTS alert_rule CASCADE;
+DROP TABLE IF EXISTS alert_outbox CASCADE;
+DROP TABLE IF EXISTS html_category CASCADE;
 
 
 -- Badge Table
@@ -116,5 +122,83 @@ CREATE TABLE scanned_products (
     product_id NUMERIC(10,3) PRIMARY KEY,
     category_name VARCHAR(255),
     subcategory_name VARCHAR(255),
-    scanned_at TIMESTAMP
+    scanned_at TIMESTAMP,
+    -- Set when a scan of its category does not find the product any more
+    delisted_at TIMESTAMP
+);
+
+-- Product_Refresh Table (last time the full info of a product was fetched)
+CREATE TABLE product_refresh (
+    product_id NUMERIC(10,3) PRIMARY KEY,
+    refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Store_Queue Table (products to store, claimed in leased batches by the store workers)
+CREATE TABLE store_queue (
+    product_id NUMERIC(10,3) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    priority INTEGER NOT NULL DEFAULT 0,
+    n_tries INTEGER NOT NULL DEFAULT 0,
+    worker_id VARCHAR(255),
+    lease_expires_at TIMESTAMP,
+    enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+CREATE INDEX store_queue_claim_idx ON store_queue (status, priority);
+
+-- Category_Price_Daily Table (unit prices per category and day, maintained by the store path)
+CREATE TABLE category_price_daily (
+    category_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    n_prices INTEGER NOT NULL DEFAULT 0,
+    sum_price NUMERIC(14,2) NOT NULL DEFAULT 0,
+    min_price NUMERIC(10,2),
+    max_price NUMERIC(10,2),
+    sketch JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (category_id, day)
+);
+
+-- Alert_Rule Table (price alerts on a product, a category or every product)
+CREATE TABLE alert_rule (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255),
+    product_id NUMERIC(10,3),
+    category_id INTEGER,
+    below_price NUMERIC(10,2),
+    min_change_pct NUMERIC(6,2),
+    active BOOLEAN NOT NULL DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Alert_Outbox Table (fired alerts, until a notifier delivers them)
+CREATE TABLE alert_outbox (
+    id SERIAL PRIMARY KEY,
+    rule_id INTEGER REFERENCES alert_rule(id) ON DELETE SET NULL,
+    product_id NUMERIC(10,3),
+    old_price NUMERIC(10,2),
+    new_price NUMERIC(10,2),
+    pct_change NUMERIC(8,2),
+    message TEXT,
+    fired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    delivered_at TIMESTAMP
+);
+
+CREATE INDEX alert_outbox_pending_idx ON alert_outbox (delivered_at, fired_at);
+-- A product stored again the same day (e.g. a retried batch) does not fire the same alert twice
+CREATE UNIQUE INDEX alert_outbox_once_a_day_idx
+    ON alert_outbox (rule_id, product_id, (fired_at::date));
+
+-- Html_Category Table (fingerprints of the subcategory listings, with the IDs of their products)
+CREATE TABLE html_category (
+    id SERIAL PRIMARY KEY,
+    html TEXT,
+    category_name VARCHAR(255),
+    subcategory_name VARCHAR(255),
+    hash_value VARCHAR(64) UNIQUE NOT NULL,
+    product_ids NUMERIC(10,3)[] NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Last time the subcategory was walked and its product IDs confirmed
+    walked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
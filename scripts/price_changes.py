@@ -0,0 +1,91 @@
+"""Price changes between two daily snapshots (see `--snapshot-dir` of the store operation).
+
+Usage:
+    python -m scripts.price_changes --snapshot-dir snapshots --old 2024-05-01 --new 2024-05-02
+    python -m scripts.price_changes --benchmark 100000
+
+With `--benchmark N` two synthetic catalogs of N products are compared instead, to measure the
+engine alone.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src.price_changes import ChangeSet, PriceArrays, compute_changes
+from src.snapshot import read_snapshot
+
+
+def synthetic_snapshots(n_products: int, seed: int = 0) -> tuple[PriceArrays, PriceArrays]:
+    rng = np.random.default_rng(seed)
+    product_ids = rng.permutation(np.arange(1, 1.1 * n_products + 1))[: int(1.1 * n_products)]
+    category_ids = rng.integers(1, 30, len(product_ids)).astype(np.int32)
+    prices = np.round(rng.uniform(0.5, 30, len(product_ids)), 2)
+    new_prices = prices.copy()
+    changed = rng.random(len(prices)) < 0.05
+    new_prices[changed] = np.round(prices[changed] * rng.uniform(0.7, 1.3, changed.sum()), 2)
+
+    # 5% only in the old snapshot, 5% only in the new one
+    old_slice, new_slice = slice(0, n_products), slice(len(product_ids) - n_products, None)
+    old = PriceArrays(product_ids[old_slice], prices[old_slice], category_ids[old_slice])
+    new = PriceArrays(product_ids[new_slice], new_prices[new_slice], category_ids[new_slice])
+    return old, new
+
+
+def report(change_set: ChangeSet, top: int) -> None:
+    print(
+        f"{len(change_set)} changed, {len(change_set.only_new_ids)} only in the new snapshot, "
+        f"{len(change_set.only_old_ids)} only in the old one (not fetched on both days)"
+    )
+    by_category = change_set.by_category()
+    movers = change_set.top_movers(top)
+    for i, category_id in enumerate(by_category.category_ids):
+        name = change_set.category_names.get(int(category_id), "")
+        print(
+            f"{category_id:>5} {name:<40} changed {by_category.n_changed[i]:>5} "
+            f"(+{by_category.n_increases[i]} / -{by_category.n_decreases[i]}) "
+            f"mean {by_category.mean_pct_change[i]:+.1f}%"
+        )
+        for j in movers[change_set.category_ids[movers] == category_id]:
+            print(
+                f"{'':>7}{change_set.product_ids[j]:>12} {change_set.old_prices[j]:>8.2f} -> "
+                f"{change_set.new_prices[j]:>8.2f} ({change_set.pct_changes[j]:+.1f}%)"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Price changes between two snapshots.")
+    parser.add_argument("--snapshot-dir", type=str, default="snapshots")
+    parser.add_argument("--old", type=str, help="Date of the old snapshot (YYYY-MM-DD)")
+    parser.add_argument("--new", type=str, help="Date of the new snapshot (YYYY-MM-DD)")
+    parser.add_argument("--top", type=int, default=5, help="Top movers per category")
+    parser.add_argument("--output", type=str, help="Write the change set to this Parquet file")
+    parser.add_argument("--benchmark", type=int, help="Compare two synthetic catalogs instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        old, new = synthetic_snapshots(args.benchmark)
+    else:
+        if not args.old or not args.new:
+            parser.error("--old and --new are required")
+        start = time.perf_counter()
+        old = PriceArrays.from_table(read_snapshot(args.snapshot_dir, args.old))
+        new = PriceArrays.from_table(read_snapshot(args.snapshot_dir, args.new))
+        print(f"Loaded {len(old)} and {len(new)} products in {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    change_set = compute_changes(old, new)
+    change_set.by_category()
+    change_set.top_movers(args.top)
+    print(f"Computed the change set in {time.perf_counter() - start:.3f}s")
+
+    if args.output:
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+        pq.write_table(change_set.to_table(), args.output)
+    report(change_set, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""Recompute the daily category price aggregates (`category_price_daily`) from the history.
+
+Usage:
+    python -m scripts.rebuild_category_aggregates
+"""
+
+from src import category_aggregates
+
+if __name__ == "__main__":
+    category_aggregates.rebuild()
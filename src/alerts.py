@@ -0,0 +1,132 @@
+from src.config.logger import logger
+from src.models import Alert, AlertRule
+
+# Price differences below this are float noise, not price changes
+PRICE_EPSILON = 1e-6
+
+
+class RuleIndex:
+    """Alert rules indexed by the product and the category they watch."""
+
+    def __init__(self, rules: list[AlertRule]) -> None:
+        self.by_product: dict[float, list[AlertRule]] = {}
+        self.by_category: dict[int, list[AlertRule]] = {}
+        self.global_rules: list[AlertRule] = []
+        for rule in rules:
+            if rule.product_id is not None:
+                self.by_product.setdefault(rule.product_id, []).append(rule)
+            elif rule.category_id is not None:
+                self.by_category.setdefault(rule.category_id, []).append(rule)
+            else:
+                self.global_rules.append(rule)
+
+    def __bool__(self) -> bool:
+        return bool(self.by_product or self.by_category or self.global_rules)
+
+    def lookup(self, product_id: float, category_ids: list[int]) -> list[AlertRule]:
+        rules = self.by_product.get(product_id, []) + self.global_rules
+        for category_id in category_ids:
+            rules += self.by_category.get(category_id, [])
+        return rules
+
+
+def _old_price(price_instruction: dict, last_price: float | None) -> float | None:
+    """Price before the current observation: the stored one, else the one reported by the API.
+
+    The API reports `previous_unit_price` (and `price_decreased`) while a price drop is recent, so
+    a product already stored at its new price is not considered changed again.
+    """
+    if last_price is not None:
+        return last_price
+    previous_unit_price = price_instruction.get("previous_unit_price")
+    return float(previous_unit_price) if previous_unit_price is not None else None
+
+
+def fire(rule: AlertRule, product_id: float, old_price: float, new_price: float) -> Alert | None:
+    pct_change = 100 * (new_price - old_price) / old_price if old_price > 0 else None
+    reasons = []
+    if rule.below_price is not None and new_price < rule.below_price:
+        reasons.append(f"below {rule.below_price:.2f}")
+    if (
+        rule.min_change_pct is not None
+        and pct_change is not None
+        and abs(pct_change) >= rule.min_change_pct
+    ):
+        reasons.append(f"changed {pct_change:+.1f}%")
+    if not reasons:
+        return None
+
+    return Alert(
+        rule_id=rule.id,
+        product_id=product_id,
+        old_price=old_price,
+        new_price=new_price,
+        pct_change=round(pct_change, 2) if pct_change is not None else None,
+        message=f"{rule.name or 'Product'} {product_id}: {old_price:.2f} -> {new_price:.2f} "
+        f"({', '.join(reasons)})",
+    )
+
+
+class AlertEngine:
+    """Evaluate the alert rules on the products whose price changed in the current store run.
+
+    Only the parsed products watched by a rule (looked up in the `RuleIndex`) are considered, and
+    only their prices at the last refresh are read, so the cost does not grow with the history.
+    Records are added once the storage endpoint accepted them, but before the products are marked
+    as refreshed, so a product changed when its unit price differs from the one of the previous
+    refresh or, for products never refreshed, from the `previous_unit_price` reported by the API.
+    Fired alerts are written to the `alert_outbox` table, once per rule, product and day.
+    """
+
+    def __init__(self, rules: list[AlertRule]) -> None:
+        self.index = RuleIndex(rules)
+        self.n_fired = 0
+
+    def evaluate(self, records: list[dict], last_prices: dict[float, float]) -> list[Alert]:
+        alerts = []
+        for record in records:
+            product_id = record["product"]["id"]
+            price_instruction = record["price_instruction"]
+            new_price = price_instruction.get("unit_price")
+            if new_price is None:
+                continue
+
+            old_price = _old_price(price_instruction, last_prices.get(product_id))
+            if old_price is None or abs(new_price - old_price) <= PRICE_EPSILON:
+                continue
+
+            category_ids = [category["id"] for category in record["categories"]]
+            for rule in self.index.lookup(product_id, category_ids):
+                alert = fire(rule, product_id, old_price, new_price)
+                if alert is not None:
+                    alerts.append(alert)
+        return alerts
+
+    def watched(self, records: list[dict]) -> list[dict]:
+        return [
+            record
+            for record in records
+            if self.index.lookup(
+                record["product"]["id"], [category["id"] for category in record["categories"]]
+            )
+        ]
+
+    def add(self, records: list[dict]) -> None:
+        from src import db  # pylint: disable=import-outside-toplevel
+
+        if not self.index:
+            return
+
+        watched = self.watched(records)
+        if not watched:
+            return
+
+        last_prices = db.get_refreshed_unit_prices(
+            [record["product"]["id"] for record in watched]
+        )
+        alerts = self.evaluate(watched, last_prices)
+        db.insert_alerts(alerts)
+        self.n_fired += len(alerts)
+
+    def close(self) -> None:
+        logger.info("Fired %s price alerts", self.n_fired)
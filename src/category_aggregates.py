@@ -0,0 +1,73 @@
+from collections.abc import Iterable
+from datetime import date
+
+from src.config.logger import logger
+from src.models import CategoryPriceDaily
+from src.price_sketch import PriceSketch
+
+
+def aggregate_prices(prices: Iterable[tuple[int, date, float]]) -> list[CategoryPriceDaily]:
+    """Aggregate (category ID, day, unit price) observations by category and day."""
+    aggregates: dict[tuple[int, date], CategoryPriceDaily] = {}
+    sketches: dict[tuple[int, date], PriceSketch] = {}
+    for category_id, day, price in prices:
+        key = (category_id, day)
+        aggregate = aggregates.get(key)
+        if aggregate is None:
+            aggregate = aggregates[key] = CategoryPriceDaily(category_id=category_id, day=day)
+            sketches[key] = PriceSketch()
+        aggregate.n_prices += 1
+        aggregate.sum_price += price
+        aggregate.min_price = (
+            price if aggregate.min_price is None else min(aggregate.min_price, price)
+        )
+        aggregate.max_price = (
+            price if aggregate.max_price is None else max(aggregate.max_price, price)
+        )
+        sketches[key].add(price)
+
+    for key, aggregate in aggregates.items():
+        aggregate.sketch = sketches[key].buckets
+    return list(aggregates.values())
+
+
+class CategoryAggregator:
+    """Keep `category_price_daily` up to date as the store path stores product prices.
+
+    Only the records the storage endpoint confirmed are added (see `store_product_details`). The
+    unit price of each product is added to the aggregates of all its categories (of every level)
+    for the current day, and merged into the table after every batch (see
+    `db.merge_category_price_daily`). A product is counted once a day: those already refreshed
+    today, e.g. by a retried attempt or another worker, are skipped.
+    """
+
+    def __init__(self) -> None:
+        self.n_products = 0
+
+    def add(self, records: list[dict]) -> None:
+        from src import db  # pylint: disable=import-outside-toplevel
+
+        today = date.today()
+        counted = db.get_refreshed_product_ids(
+            [record["product"]["id"] for record in records], today
+        )
+        prices: list[tuple[int, date, float]] = []
+        for record in records:
+            unit_price = record["price_instruction"].get("unit_price")
+            if unit_price is None or record["product"]["id"] in counted:
+                continue
+            prices.extend((category["id"], today, unit_price) for category in record["categories"])
+            self.n_products += 1
+
+        db.merge_category_price_daily(aggregate_prices(prices))
+
+    def close(self) -> None:
+        logger.info("Aggregated the prices of %s products by category", self.n_products)
+
+
+def rebuild() -> None:
+    """Recompute `category_price_daily` from the price history (a backfill, see
+    `db.iter_category_daily_prices`)."""
+    from src import db  # pylint: disable=import-outside-toplevel
+
+    db.replace_category_price_daily(aggregate_prices(db.iter_category_daily_prices()))
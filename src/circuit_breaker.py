@@ -0,0 +1,126 @@
+import json
+import os
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Callable
+
+from src.config.logger import logger
+
+
+class BreakerState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stop calling a failing dependency until it recovers.
+
+    - Closed: calls go through. After `failure_threshold` consecutive failures the breaker opens.
+    - Open: calls are rejected. After `reset_timeout` seconds the breaker becomes half-open.
+    - Half-open: a single probe call goes through. Its success closes the breaker, its failure
+    opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._state = BreakerState.CLOSED
+        self._n_failures = 0
+        self._opened_at = 0.0
+        # Start of the current outage (the breaker left CLOSED), kept while it half-opens
+        self._outage_started_at: float | None = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> BreakerState:
+        if (
+            self._state == BreakerState.OPEN
+            and self.clock() - self._opened_at >= self.reset_timeout
+        ):
+            self._set_state(BreakerState.HALF_OPEN)
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are rejected for now (unlike `allow_request`, no probe is claimed)."""
+        return self.state == BreakerState.OPEN
+
+    @property
+    def outage_seconds(self) -> float:
+        """Time since the breaker left CLOSED (0 when closed)."""
+        if self._outage_started_at is None:
+            return 0.0
+        return self.clock() - self._outage_started_at
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == BreakerState.CLOSED:
+            return True
+        if state == BreakerState.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self._n_failures = 0
+        self._probe_in_flight = False
+        if self._state != BreakerState.CLOSED:
+            self._set_state(BreakerState.CLOSED)
+
+    def record_failure(self) -> None:
+        self._n_failures += 1
+        self._probe_in_flight = False
+        if self._state == BreakerState.HALF_OPEN or self._n_failures >= self.failure_threshold:
+            self._opened_at = self.clock()
+            if self._state != BreakerState.OPEN:
+                self._set_state(BreakerState.OPEN)
+
+    def _set_state(self, state: BreakerState) -> None:
+        logger.warning("Circuit breaker `%s`: %s -> %s", self.name, self._state.value, state.value)
+        if state == BreakerState.CLOSED:
+            self._outage_started_at = None
+        elif self._outage_started_at is None:
+            self._outage_started_at = self.clock()
+        self._state = state
+
+
+class PayloadSpool:
+    """Durable local FIFO queue of JSON payloads (one JSON document per line)."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+
+    def __len__(self) -> int:
+        return len(self.read_all())
+
+    def append(self, payload: dict) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def read_all(self) -> list[dict]:
+        if not self.path.exists():
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def rewrite(self, payloads: list[dict]) -> None:
+        """Atomically replace the spooled payloads (e.g. with the ones not delivered yet)."""
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for payload in payloads:
+                f.write(json.dumps(payload) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
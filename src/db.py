@@ -1,33 +1,47 @@
+# pylint: disable=too-many-lines
+import json
 import os
+from collections.abc import Iterable, Iterator
+from datetime import date, timedelta
 
 import psycopg2.extensions
 from psycopg2 import sql
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 
 from src.config.logger import logger
 from src.models import (
+    Alert,
+    AlertRule,
     Badge,
     Category,
+    CategoryPriceDaily,
+    CategoryPriceTrend,
     HtmlCategoryDB,
     NutritionInformation,
     Photo,
+    PriceChangeStats,
     PriceInstruction,
     Product,
     ProductCategory,
     ScannedProduct,
     Supplier,
 )
+from src.price_sketch import PriceSketch
 
 if os.getenv("DATABASE_NEON_URL") is None:
     raise ValueError("DATABASE_NEON_URL environment variable not set.")
 
-# Create a connection pool
-connection_pool = SimpleConnectionPool(
+# Create a connection pool, thread-safe since the async pipelines query it from worker threads
+connection_pool = ThreadedConnectionPool(
     minconn=1,
     maxconn=20,
     dsn=os.getenv("DATABASE_NEON_URL"),
 )
 
+# Rows per statement when loading a whole scan in bulk
+MERGE_PAGE_SIZE = 10000
+
 
 def is_connection_valid(connection: psycopg2.extensions.connection) -> bool:
     try:
@@ -561,12 +575,149 @@ def insert_scanned_product(scanned_product: ScannedProduct) -> int:
         connection_pool.putconn(conn)
 
 
-def get_all_scanned_product_ids() -> list[float]:
+def insert_scanned_products(scanned_products: list[ScannedProduct]) -> int:
+    """Insert the scanned products in one statement, skipping those already in the table.
+
+    Returns:
+        int: The number of products inserted.
+    """
+    if not scanned_products:
+        return 0
+
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        rows = execute_values(
+            cursor,
+            """
+            INSERT INTO scanned_products (product_id, category_name, subcategory_name, scanned_at)
+            VALUES %s
+            ON CONFLICT (product_id) DO NOTHING
+            RETURNING product_id
+            """,
+            [
+                (p.product_id, p.category_name, p.subcategory_name, p.scanned_at)
+                for p in scanned_products
+            ],
+            fetch=True,
+        )
+        conn.commit()
+        logger.info("Inserted %s scanned products", len(rows))
+        return len(rows)
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def merge_scanned_products(
+    scanned_products: Iterable[ScannedProduct], delist: bool = True
+) -> dict[str, int]:
+    """Merge the result of a scan into `scanned_products`, with a few round trips.
+
+    The scan is loaded in bulk into a temporary table, then a single statement inserts the new
+    products, refreshes the scan time and the category fields of those seen again (listing them
+    again, if they were delisted), and marks the products not seen as delisted. Only the products
+    of the categories in the scan are delisted, so partial scans (e.g. a quarter) leave the rest
+    alone. Scans which may have stopped in the middle of a category must not `delist`.
+
+    Returns:
+        dict[str, int]: The number of `new`, `seen` and `delisted` products.
+    """
+    # A product can be listed in several categories, the first one is kept
+    rows: dict[float, tuple] = {}
+    for product in scanned_products:
+        rows.setdefault(
+            product.product_id,
+            (
+                product.product_id,
+                product.category_name,
+                product.subcategory_name,
+                product.scanned_at,
+            ),
+        )
+    if not rows:
+        return {"new": 0, "seen": 0, "delisted": 0}
+
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            CREATE TEMP TABLE scan_result (
+                product_id NUMERIC(10,3) PRIMARY KEY,
+                category_name VARCHAR(255),
+                subcategory_name VARCHAR(255),
+                scanned_at TIMESTAMP
+            ) ON COMMIT DROP
+            """
+        )
+        execute_values(
+            cursor,
+            "INSERT INTO scan_result VALUES %s",
+            list(rows.values()),
+            page_size=MERGE_PAGE_SIZE,
+        )
+        # Both statements of the merge touch different rows (those in the scan and those not)
+        cursor.execute(
+            """
+            WITH upserted AS (
+                INSERT INTO scanned_products
+                    (product_id, category_name, subcategory_name, scanned_at)
+                SELECT product_id, category_name, subcategory_name, scanned_at
+                FROM scan_result
+                ON CONFLICT (product_id) DO UPDATE SET
+                    category_name = EXCLUDED.category_name,
+                    subcategory_name = EXCLUDED.subcategory_name,
+                    scanned_at = EXCLUDED.scanned_at,
+                    delisted_at = NULL
+                RETURNING (xmax = 0) AS is_new
+            ),
+            delisted AS (
+                UPDATE scanned_products
+                SET delisted_at = CURRENT_TIMESTAMP
+                WHERE %s
+                AND delisted_at IS NULL
+                AND category_name IN (SELECT DISTINCT category_name FROM scan_result)
+                AND NOT EXISTS (
+                    SELECT 1
+                    FROM scan_result
+                    WHERE scan_result.product_id = scanned_products.product_id
+                )
+                RETURNING product_id
+            )
+            SELECT
+                (SELECT COUNT(*) FROM upserted WHERE is_new),
+                (SELECT COUNT(*) FROM upserted WHERE NOT is_new),
+                (SELECT COUNT(*) FROM delisted)
+            """,
+            (delist,),
+        )
+        result = cursor.fetchone()
+        if not result:
+            raise ValueError("No counts returned by the merge of `scanned_products`")
+        conn.commit()
+
+        stats = {"new": int(result[0]), "seen": int(result[1]), "delisted": int(result[2])}
+        logger.info("Merged scanned products: %s", stats)
+        return stats
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def get_all_scanned_product_ids(include_delisted: bool = True) -> list[float]:
     conn = get_valid_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute("SELECT product_id FROM scanned_products")
+        if include_delisted:
+            cursor.execute("SELECT product_id FROM scanned_products")
+        else:
+            cursor.execute("SELECT product_id FROM scanned_products WHERE delisted_at IS NULL")
         product_ids = [float(row[0]) for row in cursor.fetchall()]
         return product_ids
 
@@ -598,6 +749,536 @@ def get_scanned_non_stored_product_ids() -> list[float]:
         connection_pool.putconn(conn)
 
 
+def get_price_change_stats() -> dict[float, PriceChangeStats]:
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            SELECT
+                pi.product_id,
+                COUNT(*),
+                COUNT(*) FILTER (WHERE pi.price_decreased),
+                COUNT(*) FILTER (
+                    WHERE pi.previous_unit_price IS NOT NULL
+                    AND pi.previous_unit_price <> pi.unit_price
+                ),
+                MIN(pi.created_at),
+                MAX(pi.created_at),
+                MAX(pr.refreshed_at)
+            FROM price_instruction pi
+            LEFT JOIN product_refresh pr ON pr.product_id = pi.product_id
+            GROUP BY pi.product_id
+            """
+        )
+        stats = {}
+        for row in cursor.fetchall():
+            product_id = float(row[0])
+            stats[product_id] = PriceChangeStats(
+                product_id=product_id,
+                n_prices=row[1],
+                n_decreases=row[2],
+                n_previous_price_changes=row[3],
+                first_seen_at=row[4],
+                last_seen_at=row[5],
+                last_refreshed_at=row[6],
+            )
+        return stats
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def mark_products_refreshed(product_ids: list[float]) -> None:
+    if not product_ids:
+        return
+
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO product_refresh (product_id, refreshed_at)
+            VALUES %s
+            ON CONFLICT (product_id) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at
+            """,
+            [(product_id,) for product_id in product_ids],
+            template="(%s, CURRENT_TIMESTAMP)",
+        )
+        conn.commit()
+        logger.info("Marked %s products as refreshed", len(product_ids))
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def enqueue_store_products(product_ids: list[float], requeue_after_seconds: int = 43200) -> int:
+    """Add products to the `store_queue`, in priority order.
+
+    Products already queued keep their state, unless they were completed (or failed) more than
+    `requeue_after_seconds` ago, so workers starting the same run do not redo each other's work.
+
+    Returns:
+        int: The number of products (re)queued.
+    """
+    if not product_ids:
+        return 0
+
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        insert_query = sql.SQL(
+            """
+            INSERT INTO store_queue (product_id, priority)
+            VALUES %s
+            ON CONFLICT (product_id) DO UPDATE SET
+                status = 'pending',
+                priority = EXCLUDED.priority,
+                n_tries = 0,
+                worker_id = NULL,
+                lease_expires_at = NULL,
+                enqueued_at = CURRENT_TIMESTAMP,
+                completed_at = NULL
+            WHERE store_queue.status IN ('done', 'failed')
+            AND store_queue.completed_at < CURRENT_TIMESTAMP - make_interval(secs => {requeue})
+            RETURNING product_id
+            """
+        ).format(requeue=sql.Literal(requeue_after_seconds))
+        queued = execute_values(
+            cursor,
+            insert_query,
+            [(product_id, priority) for priority, product_id in enumerate(product_ids)],
+            template="(%s, %s)",
+            page_size=1000,
+            fetch=True,
+        )
+        n_queued = len(queued)
+        conn.commit()
+        logger.info("Queued %s products to store", n_queued)
+        return int(n_queued)
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def claim_store_batch(worker_id: str, batch_size: int, lease_seconds: int = 600) -> list[float]:
+    """Lease a batch of pending products of the `store_queue` to `worker_id`.
+
+    Rows locked by other workers are skipped (`FOR UPDATE SKIP LOCKED`), so concurrent workers
+    never claim the same product. Claims whose lease expired (e.g. a crashed worker) are pending
+    again.
+    """
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            WITH batch AS (
+                SELECT product_id
+                FROM store_queue
+                WHERE status = 'pending'
+                OR (status = 'claimed' AND lease_expires_at < CURRENT_TIMESTAMP)
+                ORDER BY priority, product_id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            )
+            UPDATE store_queue q
+            SET
+                status = 'claimed',
+                worker_id = %s,
+                lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                n_tries = q.n_tries + 1
+            FROM batch
+            WHERE q.product_id = batch.product_id
+            RETURNING q.product_id
+            """,
+            (batch_size, worker_id, lease_seconds),
+        )
+        product_ids = [float(row[0]) for row in cursor.fetchall()]
+        conn.commit()
+        logger.info("Worker %s claimed %s products", worker_id, len(product_ids))
+        return product_ids
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def ack_store_batch(
+    worker_id: str,
+    succeeded_ids: list[float],
+    failed_ids: list[float],
+    max_tries: int = 3,
+) -> None:
+    """Complete a claimed batch of the `store_queue`.
+
+    Succeeded products are done. Failed products are released to be claimed again, or marked as
+    failed after `max_tries` claims. Only the products still leased to `worker_id` are updated.
+    """
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            UPDATE store_queue
+            SET status = 'done', completed_at = CURRENT_TIMESTAMP, lease_expires_at = NULL
+            WHERE worker_id = %s AND status = 'claimed' AND product_id = ANY(%s::numeric[])
+            """,
+            (worker_id, succeeded_ids),
+        )
+        cursor.execute(
+            """
+            UPDATE store_queue
+            SET
+                status = CASE WHEN n_tries >= %s THEN 'failed' ELSE 'pending' END,
+                completed_at = CASE WHEN n_tries >= %s THEN CURRENT_TIMESTAMP END,
+                lease_expires_at = NULL
+            WHERE worker_id = %s AND status = 'claimed' AND product_id = ANY(%s::numeric[])
+            """,
+            (max_tries, max_tries, worker_id, failed_ids),
+        )
+        conn.commit()
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def count_store_queue() -> dict[str, int]:
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("SELECT status, COUNT(*) FROM store_queue GROUP BY status")
+        return {str(row[0]): int(row[1]) for row in cursor.fetchall()}
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+CATEGORY_PRICE_DAILY_INSERT = """
+    INSERT INTO category_price_daily
+        (category_id, day, n_prices, sum_price, min_price, max_price, sketch)
+    VALUES %s
+"""
+
+
+def _category_price_daily_values(aggregates: list[CategoryPriceDaily]) -> list[tuple]:
+    return [
+        (
+            aggregate.category_id,
+            aggregate.day,
+            aggregate.n_prices,
+            aggregate.sum_price,
+            aggregate.min_price,
+            aggregate.max_price,
+            json.dumps(aggregate.sketch),
+        )
+        for aggregate in aggregates
+    ]
+
+
+def merge_category_price_daily(aggregates: list[CategoryPriceDaily]) -> None:
+    """Add partial daily aggregates to `category_price_daily`.
+
+    Counts and sums are added, min/max combined and the sketch buckets summed in the same
+    statement, so concurrent store workers can merge their aggregates safely.
+    """
+    if not aggregates:
+        return
+
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        execute_values(
+            cursor,
+            CATEGORY_PRICE_DAILY_INSERT + """
+            ON CONFLICT (category_id, day) DO UPDATE SET
+                n_prices = category_price_daily.n_prices + EXCLUDED.n_prices,
+                sum_price = category_price_daily.sum_price + EXCLUDED.sum_price,
+                min_price = LEAST(category_price_daily.min_price, EXCLUDED.min_price),
+                max_price = GREATEST(category_price_daily.max_price, EXCLUDED.max_price),
+                sketch = (
+                    SELECT COALESCE(jsonb_object_agg(key, total), '{}'::jsonb)
+                    FROM (
+                        SELECT key, SUM(value::bigint) AS total
+                        FROM (
+                            SELECT * FROM jsonb_each_text(category_price_daily.sketch)
+                            UNION ALL
+                            SELECT * FROM jsonb_each_text(EXCLUDED.sketch)
+                        ) buckets
+                        GROUP BY key
+                    ) merged
+                ),
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            _category_price_daily_values(aggregates),
+            template="(%s, %s, %s, %s, %s, %s, %s::jsonb)",
+        )
+        conn.commit()
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def replace_category_price_daily(aggregates: list[CategoryPriceDaily]) -> None:
+    """Replace all the `category_price_daily` rows, in a single transaction."""
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("DELETE FROM category_price_daily")
+        execute_values(
+            cursor,
+            CATEGORY_PRICE_DAILY_INSERT,
+            _category_price_daily_values(aggregates),
+            template="(%s, %s, %s, %s, %s, %s, %s::jsonb)",
+            page_size=1000,
+        )
+        conn.commit()
+        logger.info("Rebuilt %s daily category aggregates", len(aggregates))
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def iter_category_daily_prices() -> Iterator[tuple[int, date, float]]:
+    """Yield the (category ID, day, unit price) of the product prices recorded in the history.
+
+    Same observations as `CategoryAggregator` (one price per product and day it was stored), as
+    far as the history keeps them: the days a price was first stored (`price_instruction`) and
+    the day of the last refresh. Days a product was stored again at the same price (other than
+    the last one) are not recorded, so a rebuild counts fewer prices than the store path for
+    them. Rows are streamed through a server side cursor, ordered by category and day.
+    """
+    conn = get_valid_connection()
+    cursor = conn.cursor(name="category_daily_prices")
+
+    try:
+        cursor.itersize = 10000
+        cursor.execute(
+            """
+            WITH observed AS (
+                SELECT
+                    pi.product_id,
+                    pi.created_at::date AS day,
+                    pi.unit_price,
+                    pi.created_at,
+                    pi.id
+                FROM price_instruction pi
+                WHERE pi.unit_price IS NOT NULL
+                UNION ALL (
+                    -- The price in effect at the last refresh
+                    SELECT DISTINCT ON (pi.product_id)
+                        pi.product_id,
+                        pr.refreshed_at::date,
+                        pi.unit_price,
+                        pr.refreshed_at,
+                        pi.id
+                    FROM price_instruction pi
+                    JOIN product_refresh pr ON pr.product_id = pi.product_id
+                    WHERE pi.unit_price IS NOT NULL AND pi.created_at <= pr.refreshed_at
+                    ORDER BY pi.product_id, pi.created_at DESC, pi.id DESC
+                )
+            ),
+            daily AS (
+                -- The last price of each product and day
+                SELECT DISTINCT ON (product_id, day) product_id, day, unit_price
+                FROM observed
+                ORDER BY product_id, day, created_at DESC, id DESC
+            )
+            SELECT pc.category_id, d.day, d.unit_price
+            FROM daily d
+            JOIN product_category pc ON pc.product_id = d.product_id
+            ORDER BY pc.category_id, d.day
+            """
+        )
+        for row in cursor:
+            yield int(row[0]), row[1], float(row[2])
+
+    finally:
+        cursor.close()
+        # Ends the transaction of the server side cursor
+        conn.commit()
+        connection_pool.putconn(conn)
+
+
+def get_refreshed_product_ids(product_ids: list[float], since: date) -> set[float]:
+    """The products (of `product_ids`) refreshed since the start of the day `since`."""
+    if not product_ids:
+        return set()
+
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            SELECT product_id
+            FROM product_refresh
+            WHERE product_id = ANY(%s::numeric[]) AND refreshed_at >= %s
+            """,
+            (product_ids, since),
+        )
+        return {float(row[0]) for row in cursor.fetchall()}
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def get_category_price_trends(category_id: int, days: int = 30) -> list[CategoryPriceTrend]:
+    """Daily unit price trend of a category over the last `days` days, oldest first."""
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            SELECT day, n_prices, sum_price, min_price, max_price, sketch
+            FROM category_price_daily
+            WHERE category_id = %s AND day > %s
+            ORDER BY day
+            """,
+            (category_id, date.today() - timedelta(days=days)),
+        )
+        trends = []
+        for day, n_prices, sum_price, min_price, max_price, sketch in cursor.fetchall():
+            price_sketch = PriceSketch({int(key): count for key, count in sketch.items()})
+            trends.append(
+                CategoryPriceTrend(
+                    category_id=category_id,
+                    day=day,
+                    n_prices=n_prices,
+                    mean_price=float(sum_price) / n_prices if n_prices else None,
+                    min_price=min_price,
+                    max_price=max_price,
+                    median_price=price_sketch.quantile(0.5),
+                    p10_price=price_sketch.quantile(0.1),
+                    p90_price=price_sketch.quantile(0.9),
+                )
+            )
+        return trends
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def get_alert_rules() -> list[AlertRule]:
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            SELECT id, name, product_id, category_id, below_price, min_change_pct
+            FROM alert_rule
+            WHERE active
+            """
+        )
+        return [
+            AlertRule(
+                id=row[0],
+                name=row[1] or "",
+                product_id=row[2],
+                category_id=row[3],
+                below_price=row[4],
+                min_change_pct=row[5],
+            )
+            for row in cursor.fetchall()
+        ]
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def get_refreshed_unit_prices(product_ids: list[float]) -> dict[float, float]:
+    """Unit price of each of the products at its last refresh (if any).
+
+    Products stored in the current batch are not marked as refreshed yet, so these are the prices
+    before the batch, even if the storage endpoint already recorded the new ones.
+    """
+    if not product_ids:
+        return {}
+
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            SELECT DISTINCT ON (pi.product_id) pi.product_id, pi.unit_price
+            FROM price_instruction pi
+            JOIN product_refresh pr ON pr.product_id = pi.product_id
+            WHERE
+                pi.product_id = ANY(%s::numeric[])
+                AND pi.unit_price IS NOT NULL
+                AND pi.created_at <= pr.refreshed_at
+            ORDER BY pi.product_id, pi.created_at DESC, pi.id DESC
+            """,
+            (product_ids,),
+        )
+        return {float(row[0]): float(row[1]) for row in cursor.fetchall()}
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
+def insert_alerts(alerts: list[Alert]) -> None:
+    """Write fired alerts to the `alert_outbox`, at most once per rule, product and day."""
+    if not alerts:
+        return
+
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        execute_values(
+            cursor,
+            """
+            INSERT INTO alert_outbox
+                (rule_id, product_id, old_price, new_price, pct_change, message, fired_at)
+            VALUES %s
+            ON CONFLICT (rule_id, product_id, (fired_at::date)) DO NOTHING
+            """,
+            [
+                (
+                    alert.rule_id,
+                    alert.product_id,
+                    alert.old_price,
+                    alert.new_price,
+                    alert.pct_change,
+                    alert.message,
+                    alert.fired_at,
+                )
+                for alert in alerts
+            ],
+            template="(%s, %s, %s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP))",
+        )
+        conn.commit()
+        logger.info("Fired %s alerts", len(alerts))
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
 def count_scanned_products() -> int:
     conn = get_valid_connection()
     cursor = conn.cursor()
@@ -617,23 +1298,22 @@ def count_scanned_products() -> int:
 
 
 def insert_html_category(html_category: HtmlCategoryDB) -> int:
+    """Store the fingerprint of a subcategory listing walked, with the IDs of its products.
+
+    A listing already stored gets the new product IDs and its `walked_at` is reset.
+    """
     conn = get_valid_connection()
     cursor = conn.cursor()
 
     try:
-        # Return existing ID if hash_value already exists
-        cursor.execute(
-            "SELECT id FROM html_category WHERE hash_value = %s", (html_category.hash_value,)
-        )
-        existing_id = cursor.fetchone()
-        if existing_id:
-            return int(existing_id[0])
-
-        # If hash_value doesn't exist, perform insert
         insert_query = sql.SQL(
             """
-            INSERT INTO html_category (html, category_name, subcategory_name, hash_value)
-            VALUES (%s, %s, %s, %s)
+            INSERT INTO html_category
+                (html, category_name, subcategory_name, hash_value, product_ids)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (hash_value) DO UPDATE SET
+                product_ids = EXCLUDED.product_ids,
+                walked_at = CURRENT_TIMESTAMP
             RETURNING id
         """
         )
@@ -644,6 +1324,7 @@ def insert_html_category(html_category: HtmlCategoryDB) -> int:
                 html_category.category_name,
                 html_category.subcategory_name,
                 html_category.hash_value,
+                html_category.product_ids,
             ),
         )
 
@@ -667,6 +1348,34 @@ def insert_html_category(html_category: HtmlCategoryDB) -> int:
         connection_pool.putconn(conn)
 
 
+def get_known_listings(max_age_days: int) -> dict[str, list[float]]:
+    """Product IDs of the subcategory listings already scanned, by their fingerprint.
+
+    Only the listings walked in the last `max_age_days` are known, so every subcategory is walked
+    again from time to time (e.g. to find out the products gone from it).
+    """
+    conn = get_valid_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(
+            """
+            SELECT hash_value, product_ids
+            FROM html_category
+            WHERE walked_at > CURRENT_TIMESTAMP - make_interval(days => %s)
+            """,
+            (max_age_days,),
+        )
+        return {
+            hash_value: [float(product_id) for product_id in product_ids]
+            for hash_value, product_ids in cursor.fetchall()
+        }
+
+    finally:
+        cursor.close()
+        connection_pool.putconn(conn)
+
+
 def count_elements_in_table(table_name: str) -> int:
     """
     Count the number of elements in a PostgreSQL table.
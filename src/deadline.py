@@ -0,0 +1,35 @@
+import time
+from typing import Callable
+
+# Time kept in reserve to flush the last writes and shut down the VPN
+DEFAULT_SAFETY_MARGIN_SECONDS = 120.0
+
+
+class Deadline:
+    """Time budget of a run which is killed after a hard time limit (e.g. a CI job timeout).
+
+    The duration of each unit of work (a batch) is recorded, and a new batch is only started when
+    the slowest batch observed so far still fits in the remaining time.
+    """
+
+    def __init__(
+        self,
+        seconds: float,
+        safety_margin: float = DEFAULT_SAFETY_MARGIN_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.clock = clock
+        self.expires_at = clock() + seconds
+        self.safety_margin = safety_margin
+        self.slowest_batch_seconds = 0.0
+        self.n_batches = 0
+
+    def remaining(self) -> float:
+        return self.expires_at - self.clock()
+
+    def can_fit_batch(self) -> bool:
+        return self.remaining() - self.safety_margin >= self.slowest_batch_seconds
+
+    def record_batch(self, seconds: float) -> None:
+        self.n_batches += 1
+        self.slowest_batch_seconds = max(self.slowest_batch_seconds, seconds)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 
 from pydantic import BaseModel
@@ -23,6 +23,7 @@ class HtmlCategoryDB(BaseModel):
     category_name: str
     subcategory_name: str
     hash_value: str
+    product_ids: list[float] = []
     created_at: Optional[datetime] = None
 
 
@@ -159,3 +160,70 @@ class FullInfo(BaseModel):
     categories: list[Category]
     price_instruction: PriceInstruction
     nutrition_information: NutritionInformation
+
+
+class PriceChangeStats(BaseModel):
+    """Aggregated price history of a product, as recorded in `price_instruction`.
+
+    A new `price_instruction` row is only inserted when the unit or bulk price changes, so the
+    number of rows is the number of distinct prices observed for the product.
+    """
+
+    product_id: float
+    n_prices: int = 0
+    n_decreases: int = 0
+    n_previous_price_changes: int = 0
+    first_seen_at: Optional[datetime] = None
+    last_seen_at: Optional[datetime] = None
+    last_refreshed_at: Optional[datetime] = None
+
+
+class CategoryPriceDaily(BaseModel):
+    """Unit prices of a category observed in a day, aggregated (see `PriceSketch`)."""
+
+    category_id: int
+    day: date
+    n_prices: int = 0
+    sum_price: float = 0.0
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    # Bucket counts of a `PriceSketch`
+    sketch: dict[int, int] = {}
+
+
+class CategoryPriceTrend(BaseModel):
+    category_id: int
+    day: date
+    n_prices: int
+    mean_price: Optional[float] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    median_price: Optional[float] = None
+    p10_price: Optional[float] = None
+    p90_price: Optional[float] = None
+
+
+class AlertRule(BaseModel):
+    """Fire when a watched product (or any product of a category) changes its unit price.
+
+    The rule fires when the new price is below `below_price`, or when it changed by at least
+    `min_change_pct` percent (in absolute value). Rules without a product nor a category watch
+    every product.
+    """
+
+    id: Optional[int] = None
+    name: str = ""
+    product_id: Optional[float] = None
+    category_id: Optional[int] = None
+    below_price: Optional[float] = None
+    min_change_pct: Optional[float] = None
+
+
+class Alert(BaseModel):
+    rule_id: Optional[int] = None
+    product_id: float
+    old_price: Optional[float] = None
+    new_price: float
+    pct_change: Optional[float] = None
+    message: str
+    fired_at: Optional[datetime] = None
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Protocol
+
+from pydantic import ValidationError
+
+from src.config.logger import logger
+from src.scraper.extractor import extract_full_info
+
+# Responses per task sent to a worker process, to amortize the inter-process overhead
+CHUNK_SIZE = 64
+
+
+def parse_response(raw: bytes) -> dict | None:
+    """Parse a raw product API response into its storage record (None if it is not valid)."""
+    try:
+        return extract_full_info(json.loads(raw)).model_dump()
+    except (ValueError, TypeError, AttributeError, ValidationError) as exc:
+        logger.debug("Invalid product response: %s", exc)
+        return None
+
+
+def parse_responses(raws: list[bytes]) -> list[dict | None]:
+    return [parse_response(raw) for raw in raws]
+
+
+class RecordSink(Protocol):
+    """Consumer of the parsed storage records of a store run (e.g. `SnapshotWriter`)."""
+
+    def add(self, records: list[dict]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class ParsePool:
+    """Parse and validate product responses in a pool of worker processes.
+
+    Parsing (JSON decoding, walking the nested category tree and the pydantic validation) is CPU
+    bound, so running it on the event loop thread caps the throughput of large replays and
+    backfills. With `workers=0` the responses are parsed inline, and with `workers=None` (or a
+    negative number) there is one worker per core.
+    """
+
+    def __init__(self, workers: int | None = None) -> None:
+        if workers is None or workers < 0:
+            # One worker per core
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(self.workers) if self.workers > 0 else None
+        logger.info("Parse pool with %s workers", self.workers)
+
+    def __enter__(self) -> "ParsePool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def parse(self, raws: list[bytes]) -> list[dict | None]:
+        """Parse the responses, returning the records in the same order."""
+        if self._executor is None:
+            return parse_responses(raws)
+
+        chunks = [raws[i : i + CHUNK_SIZE] for i in range(0, len(raws), CHUNK_SIZE)]
+        return [record for chunk in self._executor.map(parse_responses, chunks) for record in chunk]
+
+    async def parse_async(self, raws: list[bytes]) -> list[dict | None]:
+        """Like `parse`, without blocking the event loop while the workers are busy."""
+        if self._executor is None:
+            return parse_responses(raws)
+
+        loop = asyncio.get_running_loop()
+        chunks = [raws[i : i + CHUNK_SIZE] for i in range(0, len(raws), CHUNK_SIZE)]
+        parsed_chunks = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, parse_responses, chunk) for chunk in chunks)
+        )
+        return [record for chunk in parsed_chunks for record in chunk]
@@ -0,0 +1,173 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Price differences below this are float noise, not price changes
+PRICE_EPSILON = 1e-6
+
+
+class PriceArrays:
+    """Columnar prices of a snapshot, as NumPy arrays sorted by (unique) product ID."""
+
+    def __init__(
+        self,
+        product_ids: np.ndarray,
+        prices: np.ndarray,
+        category_ids: np.ndarray,
+        category_names: dict[int, str] | None = None,
+    ) -> None:
+        order = np.argsort(product_ids, kind="stable")
+        self.product_ids = product_ids[order]
+        self.prices = prices[order]
+        self.category_ids = category_ids[order]
+        self.category_names = category_names or {}
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    @classmethod
+    def from_table(cls, table: pa.Table, price_column: str = "unit_price") -> "PriceArrays":
+        """Build the arrays from a snapshot table (see `src.snapshot.read_snapshot`).
+
+        A product observed several times (e.g. by several runs of the same day) keeps its last
+        observation. Missing prices become NaN.
+        """
+        product_ids = table.column("product_id").to_numpy()
+        prices = pc.fill_null(table.column(price_column), np.nan).to_numpy()
+        category_ids = table.column("category_id").to_numpy()
+        rows = np.arange(len(product_ids))
+
+        # Last observation of each product
+        if "observed_at" in table.column_names and len(product_ids):
+            observed_at = table.column("observed_at").cast(pa.int64()).to_numpy()
+            order = np.lexsort((observed_at, product_ids))
+            sorted_ids = product_ids[order]
+            is_last = np.append(sorted_ids[1:] != sorted_ids[:-1], True)
+            rows = order[is_last]
+            product_ids, prices, category_ids = product_ids[rows], prices[rows], category_ids[rows]
+
+        category_names: dict[int, str] = {}
+        if "category" in table.column_names:
+            unique_ids, first_index = np.unique(category_ids, return_index=True)
+            names = table.column("category").take(rows[first_index]).to_pylist()
+            category_names = dict(zip(unique_ids.tolist(), names))
+
+        return cls(product_ids, prices, category_ids, category_names)
+
+
+class CategoryChanges:
+    """Per top-level category aggregates of a change set, one array element per category."""
+
+    def __init__(
+        self,
+        category_ids: np.ndarray,
+        n_changed: np.ndarray,
+        n_increases: np.ndarray,
+        n_decreases: np.ndarray,
+        mean_pct_change: np.ndarray,
+    ) -> None:
+        self.category_ids = category_ids
+        self.n_changed = n_changed
+        self.n_increases = n_increases
+        self.n_decreases = n_decreases
+        self.mean_pct_change = mean_pct_change
+
+
+class ChangeSet:
+    """Price changes between two snapshots: the changed products, and those in only one of them.
+
+    Snapshots only hold the products fetched by the runs of their day, which may be partial
+    (budget, deadline, shard). So a product in only one snapshot is not necessarily new or
+    delisted, it may just not have been fetched on the other day (see `scanned_products` for the
+    products actually delisted).
+    """
+
+    def __init__(
+        self,
+        product_ids: np.ndarray,
+        category_ids: np.ndarray,
+        old_prices: np.ndarray,
+        new_prices: np.ndarray,
+        only_new_ids: np.ndarray,
+        only_old_ids: np.ndarray,
+        category_names: dict[int, str] | None = None,
+    ) -> None:
+        self.product_ids = product_ids
+        self.category_ids = category_ids
+        self.old_prices = old_prices
+        self.new_prices = new_prices
+        self.deltas = new_prices - old_prices
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.pct_changes = np.where(old_prices > 0, 100 * self.deltas / old_prices, np.nan)
+        self.only_new_ids = only_new_ids
+        self.only_old_ids = only_old_ids
+        self.category_names = category_names or {}
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def by_category(self) -> CategoryChanges:
+        category_ids, inverse = np.unique(self.category_ids, return_inverse=True)
+        n_changed = np.bincount(inverse, minlength=len(category_ids))
+        n_increases = np.bincount(inverse, weights=self.deltas > 0, minlength=len(category_ids))
+        n_decreases = np.bincount(inverse, weights=self.deltas < 0, minlength=len(category_ids))
+        pct_changes = np.nan_to_num(self.pct_changes)
+        pct_sums = np.bincount(inverse, weights=pct_changes, minlength=len(category_ids))
+        return CategoryChanges(
+            category_ids,
+            n_changed,
+            n_increases.astype(np.int64),
+            n_decreases.astype(np.int64),
+            pct_sums / np.maximum(n_changed, 1),
+        )
+
+    def top_movers(self, k: int = 5) -> np.ndarray:
+        """Indices of the `k` largest relative changes (in absolute value) of each category."""
+        magnitude = np.nan_to_num(np.abs(self.pct_changes), nan=-1.0)
+        order = np.lexsort((-magnitude, self.category_ids))
+        sorted_categories = self.category_ids[order]
+        is_group_start = np.append(True, sorted_categories[1:] != sorted_categories[:-1])
+        group_starts = np.flatnonzero(is_group_start)
+        group_of = np.cumsum(is_group_start) - 1
+        rank = np.arange(len(order)) - group_starts[group_of]
+        top: np.ndarray = order[rank < k]
+        return top
+
+    def to_table(self) -> pa.Table:
+        return pa.table(
+            {
+                "product_id": self.product_ids,
+                "category_id": self.category_ids,
+                "old_price": self.old_prices,
+                "new_price": self.new_prices,
+                "delta": self.deltas,
+                "pct_change": self.pct_changes,
+            }
+        )
+
+
+def compute_changes(old: PriceArrays, new: PriceArrays) -> ChangeSet:
+    """Join two snapshots by product ID and keep the products whose price changed.
+
+    Only the products fetched in both snapshots are compared, the others are kept apart (not
+    fetched on one of the days, see `ChangeSet`). Products without a price in one of the
+    snapshots are not considered changed.
+    """
+    _, old_index, new_index = np.intersect1d(
+        old.product_ids, new.product_ids, assume_unique=True, return_indices=True
+    )
+    old_prices = old.prices[old_index]
+    new_prices = new.prices[new_index]
+    with np.errstate(invalid="ignore"):
+        changed = np.abs(new_prices - old_prices) > PRICE_EPSILON
+
+    changed_index = new_index[changed]
+    return ChangeSet(
+        product_ids=new.product_ids[changed_index],
+        category_ids=new.category_ids[changed_index],
+        old_prices=old_prices[changed],
+        new_prices=new_prices[changed],
+        only_new_ids=np.setdiff1d(new.product_ids, old.product_ids, assume_unique=True),
+        only_old_ids=np.setdiff1d(old.product_ids, new.product_ids, assume_unique=True),
+        category_names={**old.category_names, **new.category_names},
+    )
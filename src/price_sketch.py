@@ -0,0 +1,50 @@
+import math
+
+# Quantiles are estimated within 1% of the actual price
+RELATIVE_ACCURACY = 0.01
+
+
+class PriceSketch:
+    """Mergeable quantile sketch of prices (logarithmic buckets, as in DDSketch).
+
+    A price `p` is counted in bucket `ceil(log(p) / log(gamma))`, so any quantile is estimated
+    within `RELATIVE_ACCURACY` of the actual price. Two sketches are merged by adding their bucket
+    counts, which is what allows aggregating them incrementally (and in SQL, see
+    `db.merge_category_price_daily`). Non positive prices are ignored.
+    """
+
+    def __init__(self, buckets: dict[int, int] | None = None) -> None:
+        self.gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: dict[int, int] = dict(buckets or {})
+
+    @property
+    def count(self) -> int:
+        return sum(self.buckets.values())
+
+    def add(self, price: float) -> None:
+        if price <= 0:
+            return
+        key = math.ceil(math.log(price) / self._log_gamma)
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+
+    def merge(self, other: "PriceSketch") -> None:
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+    def quantile(self, q: float) -> float | None:
+        count = self.count
+        if count == 0:
+            return None
+
+        rank = q * (count - 1)
+        seen = 0
+        keys = sorted(self.buckets)
+        for key in keys:
+            seen += self.buckets[key]
+            if seen > rank:
+                break
+        else:
+            key = keys[-1]
+        # Middle of the bucket (in relative terms)
+        return float(2 * self.gamma**key / (self.gamma + 1))
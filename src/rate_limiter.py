@@ -0,0 +1,29 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+
+class RateLimiter:
+    """Space out requests to at most `rate` per second, across concurrent tasks.
+
+    Every `wait` reserves the next free slot (one per `1 / rate` seconds) and sleeps until it, so
+    tasks started together are released one at a time instead of in a burst.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable[None]] = asyncio.sleep,
+    ) -> None:
+        self.interval = 1.0 / rate
+        self._clock = clock
+        self._sleep = sleep
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        now = self._clock()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await self._sleep(slot - now)
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from src.models import PriceChangeStats
+
+MIN_REFRESH_INTERVAL = timedelta(hours=12)
+MAX_REFRESH_INTERVAL = timedelta(days=14)
+# Minimum observation window, so a product seen twice in the same run does not look hyper-volatile
+MIN_OBSERVATION_DAYS = 1.0
+
+
+class RefreshScheduler:
+    """Decide which products to refresh first given their observed price history.
+
+    Each product gets a refresh interval derived from how often its price changed in the past:
+    volatile products (e.g. fresh produce) are refreshed often, while stable ones (e.g. pantry
+    staples) are refreshed rarely. Products without any history are always due.
+    """
+
+    def __init__(self, stats: dict[float, PriceChangeStats], now: datetime | None = None) -> None:
+        self.stats = stats
+        self.now = now or datetime.now()
+
+    def volatility(self, product_id: float) -> float:
+        """Observed price changes per day."""
+        stats = self.stats.get(product_id)
+        if stats is None or stats.first_seen_at is None or stats.last_seen_at is None:
+            return 0.0
+
+        # The `price_decreased` and `previous_unit_price` fields also reveal changes that happened
+        # before the first observation, so take the largest of the three estimates
+        n_changes = max(stats.n_prices - 1, stats.n_decreases, stats.n_previous_price_changes)
+        # `last_seen_at` is the last price change, the price was observed (unchanged) until the
+        # last refresh, or up to now when the refreshes are unknown
+        observed_until = max(stats.last_refreshed_at or self.now, stats.last_seen_at)
+        observed_days = (observed_until - stats.first_seen_at).total_seconds() / 86400
+        return n_changes / max(observed_days, MIN_OBSERVATION_DAYS)
+
+    def refresh_interval(self, product_id: float) -> timedelta:
+        volatility = self.volatility(product_id)
+        if volatility <= 0:
+            return MAX_REFRESH_INTERVAL
+
+        interval = timedelta(days=1 / volatility)
+        return max(MIN_REFRESH_INTERVAL, min(interval, MAX_REFRESH_INTERVAL))
+
+    def staleness(self, product_id: float) -> float:
+        """Time since the last refresh, relative to the refresh interval (>= 1 means due)."""
+        stats = self.stats.get(product_id)
+        if stats is None or stats.last_refreshed_at is None:
+            return float("inf")
+
+        elapsed = self.now - stats.last_refreshed_at
+        return elapsed / self.refresh_interval(product_id)
+
+    def is_due(self, product_id: float) -> bool:
+        return self.staleness(product_id) >= 1
+
+    def order(self, product_ids: list[float], budget: int | None = None) -> list[float]:
+        """Order the products to refresh, keeping at most `budget` of them.
+
+        Due products go first, the most volatile ones at the front (never refreshed products lead
+        the queue). The remaining budget is filled with the stalest products that are not due yet.
+        """
+        due = [pid for pid in product_ids if self.is_due(pid)]
+        not_due = [pid for pid in product_ids if not self.is_due(pid)]
+
+        due.sort(key=lambda pid: (self.staleness(pid) != float("inf"), -self.volatility(pid)))
+        not_due.sort(key=self.staleness, reverse=True)
+
+        ordered = due + not_due
+        if budget is not None:
+            ordered = ordered[:budget]
+        return ordered
@@ -0,0 +1,194 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+
+from src import db, scan_products
+from src.alerts import AlertEngine
+from src.category_aggregates import CategoryAggregator
+from src.config.logger import logger
+from src.deadline import Deadline
+from src.models import ScannedProduct
+from src.parse_pool import ParsePool, RecordSink
+from src.rate_limiter import RateLimiter
+from src.scanned_products import ScannedProducts
+from src.scraper import async_scan
+from src.sharding import Shard
+from src.snapshot import SnapshotWriter
+from src.store_products_remote import (
+    BATCH_SIZE,
+    ProductStoringStatus,
+    StoringState,
+    store_product_details,
+    warm_up_endpoint,
+)
+from src.vpn import Vpn
+
+# New products waiting to be stored, the scan waits when the store stage is this far behind
+QUEUE_SIZE = 1000
+# A partial batch is stored when no new product is found for this long
+FLUSH_SECONDS = 30.0
+N_TRIES_STORE = 3
+BATCH_PAUSE_SECONDS = 10.0
+# Navigations and clicks of the scan, the store stage is paced by `BATCH_PAUSE_SECONDS`
+SCAN_ACTIONS_PER_SECOND = 2.0
+
+
+async def main(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+    deadline_minutes: float | None = None,
+    parse_workers: int = 0,
+    snapshot_dir: str | None = None,
+) -> None:
+    """Scan the products and store the new ones as they are found.
+
+    The async scan (see `async_scan.scan_products`) and the store pipeline run on the same event
+    loop, connected by a bounded queue: each new product is inserted in `scanned_products` (in
+    batches) and handed to the store stage, which fetches its details in batches while the scan
+    goes on. The products already scanned are left to the `store` operation, except the delisted
+    ones found again. Once the scan ends, its result is merged into `scanned_products` (see
+    `db.merge_scanned_products`), without delisting anything if the deadline may have cut it.
+    """
+    deadline = Deadline(deadline_minutes * 60) if deadline_minutes else None
+    parse_pool = ParsePool(parse_workers)
+    record_sinks: list[RecordSink] = [CategoryAggregator(), AlertEngine(db.get_alert_rules())]
+    if snapshot_dir is not None:
+        record_sinks.append(SnapshotWriter(snapshot_dir))
+    # Rotated once, both stages go through the same tunnel
+    vpn = Vpn(configs_folder=scan_products.VPN_CFG_FOLDER_PATH)
+    try:
+        vpn.rotate()
+        warm_up_endpoint()
+        stored_ids = set(db.get_all_scanned_product_ids(include_delisted=False))
+        logger.info("Number of stored products: %s", len(stored_ids))
+
+        pending: "asyncio.Queue[float | None]" = asyncio.Queue(maxsize=QUEUE_SIZE)
+        limiter = RateLimiter(SCAN_ACTIONS_PER_SECOND)
+        products = async_scan.scan_products(partial_scan, shard, limiter, deadline)
+        scanned_products, n_stored = await asyncio.gather(
+            scan_new_products(products, pending, stored_ids),
+            store_new_products(pending, parse_pool, deadline, record_sinks),
+        )
+        scanned_products.dump(scan_products.SCANNED_PRODUCTS_PATH)
+        logger.info("Scanned %s products, stored %s new ones", len(scanned_products), n_stored)
+
+        # The scan stops when a batch no longer fits before the deadline
+        is_complete = deadline is None or deadline.can_fit_batch()
+        merge_stats = db.merge_scanned_products(scanned_products, delist=is_complete)
+        logger.info("Number of delisted products: %s", merge_stats["delisted"])
+    finally:
+        for sink in record_sinks:
+            sink.close()
+        parse_pool.close()
+        vpn.kill()
+
+
+async def scan_new_products(
+    products: AsyncIterator[ScannedProduct],
+    pending: "asyncio.Queue[float | None]",
+    stored_ids: set[float],
+) -> ScannedProducts:
+    """Scan stage: hand the IDs of the new products to the store stage, and insert them.
+
+    New products are inserted in `scanned_products` by batches of `BATCH_SIZE`, in a thread so the
+    scan is not blocked. `None` is queued when the scan ends (even if it fails), so the store stage
+    finishes too.
+    """
+    scanned_products = ScannedProducts()
+    new_products: list[ScannedProduct] = []
+    try:
+        async for product in products:
+            scanned_products.append(product)
+            if product.product_id in stored_ids:
+                continue
+            stored_ids.add(product.product_id)
+            new_products.append(product)
+            await pending.put(product.product_id)
+            if len(new_products) >= BATCH_SIZE:
+                await asyncio.to_thread(db.insert_scanned_products, new_products)
+                new_products = []
+    finally:
+        try:
+            if new_products:
+                await asyncio.to_thread(db.insert_scanned_products, new_products)
+        finally:
+            await pending.put(None)
+    return scanned_products
+
+
+async def store_new_products(
+    pending: "asyncio.Queue[float | None]",
+    parse_pool: ParsePool,
+    deadline: Deadline | None = None,
+    record_sinks: list[RecordSink] | None = None,
+) -> int:
+    """Store stage: store the details of the products handed by the scan stage, in batches.
+
+    Products which fail are tried again with the next batch (up to `N_TRIES_STORE`). When the
+    deadline is reached, the rest of the queue is drained without storing it: those products are
+    already in `scanned_products`, so the next `store` run picks them.
+
+    Returns:
+        int: The number of products stored.
+    """
+    n_stored = 0
+    is_scan_finished = False
+    batch: list[StoringState] = []
+    while not is_scan_finished or batch:
+        if not is_scan_finished:
+            is_scan_finished = await _fill_batch(pending, batch)
+        if not batch:
+            continue
+        if deadline is not None and not deadline.can_fit_batch():
+            logger.warning("Stopping the store stage before the deadline: %s pending", len(batch))
+            while not is_scan_finished:
+                is_scan_finished = await pending.get() is None
+            break
+
+        batch_start = time.monotonic()
+        await store_product_details(batch, parse_pool, record_sinks)
+        succeeded_ids = [
+            state.product_id for state in batch if state.status == ProductStoringStatus.SUCCESS
+        ]
+        await asyncio.to_thread(db.mark_products_refreshed, succeeded_ids)
+        n_stored += len(succeeded_ids)
+        for state in batch:
+            if state.status == ProductStoringStatus.PENDING and state.n_tries >= N_TRIES_STORE:
+                logger.warning(
+                    "Product %s failed to store after %s tries", state.product_id, N_TRIES_STORE
+                )
+        batch = [
+            state
+            for state in batch
+            if state.status == ProductStoringStatus.PENDING and state.n_tries < N_TRIES_STORE
+        ]
+        logger.info("Stored: %s -- Queued: %s", n_stored, pending.qsize())
+        await asyncio.sleep(BATCH_PAUSE_SECONDS)
+        if deadline is not None:
+            deadline.record_batch(time.monotonic() - batch_start)
+    return n_stored
+
+
+async def _fill_batch(pending: "asyncio.Queue[float | None]", batch: list[StoringState]) -> bool:
+    """Add the IDs handed by the scan stage to `batch`, up to `BATCH_SIZE`.
+
+    Once the batch has a product, new ones are only awaited for `FLUSH_SECONDS`, so the products
+    of a slow scan are not held back.
+
+    Returns:
+        bool: Whether the scan stage is finished.
+    """
+    loop = asyncio.get_running_loop()
+    flush_at = loop.time() + FLUSH_SECONDS if batch else None
+    while len(batch) < BATCH_SIZE:
+        timeout = None if flush_at is None else flush_at - loop.time()
+        try:
+            product_id = await asyncio.wait_for(pending.get(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        if product_id is None:
+            return True
+        batch.append(StoringState(product_id=product_id))
+        if flush_at is None:
+            flush_at = loop.time() + FLUSH_SECONDS
+    return False
@@ -1,30 +1,53 @@
-import pickle
+import asyncio
+import queue
+import threading
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+import httpx
+from playwright.sync_api import Error as pw_Error
+
 from src import db
 from src.config.logger import logger
 from src.models import ScannedProduct
-from src.scraper import get_product_basic
+from src.scanned_products import ScannedProducts
+from src.scraper import async_scan, exceptions, get_product_basic, http_scan
 from src.scraper.get_product_basic import ProductsState
+from src.sharding import Shard
 from src.vpn import Vpn
 
 N_TRIES = 250
+# Tries of each category when scanning in parallel
+N_TRIES_CATEGORY = 25
+
+# Subcategories are walked again after this long, even if their listing did not change
+KNOWN_LISTING_MAX_DAYS = 7
 
 VPN_CFG_FOLDER_PATH: Path | None = Path("vpn_configs")
 
+SCANNED_PRODUCTS_PATH = Path("scanned_products.bin")
+
 
-def get_scanned_products(partial_scan: str | None = None) -> list[ScannedProduct]:
-    products_state = ProductsState()
+def get_scanned_products(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+) -> ScannedProducts:
+    products_state = ProductsState(db.get_known_listings(KNOWN_LISTING_MAX_DAYS))
     tries = 0
     vpn = Vpn(configs_folder=VPN_CFG_FOLDER_PATH)
     try:
-        while tries < N_TRIES:
-            logger.debug("Try number: %s", tries)
-            vpn.rotate()
-            products_state = get_product_basic.compute(products_state, partial_scan)
-            tries += 1
-            if products_state.is_finished:
-                break
+        # The browser outlives the tries, a failed one only drops its context
+        with get_product_basic.ScannerSession() as session:
+            while tries < N_TRIES:
+                logger.debug("Try number: %s", tries)
+                vpn.rotate()
+                products_state = get_product_basic.compute(
+                    products_state, partial_scan, shard, session=session
+                )
+                tries += 1
+                if products_state.is_finished:
+                    break
     finally:
         vpn.kill()
 
@@ -32,24 +55,184 @@ def get_scanned_products(partial_scan: str | None = None) -> list[ScannedProduct
         logger.error("Reached maximum number of tries")
         raise ValueError("Reached maximum number of tries when trying to get product IDs")
 
-    return products_state.get_scanned_products()
+    _store_new_listings(products_state)
+    return ScannedProducts(products_state.get_scanned_products())
+
+
+def _store_new_listings(products_state: ProductsState) -> None:
+    """Store the fingerprints of the subcategories walked, so the next scan can skip them."""
+    listings = products_state.get_new_listings()
+    for listing in listings:
+        db.insert_html_category(listing)
+    logger.info("Stored %s new subcategory listings", len(listings))
+
+
+class SharedVpn:
+    """VPN shared by the workers of a parallel scan.
+
+    Rotating drops the connections of every worker, so a failure wave (e.g. the exit IP was
+    blocked) must only cause one rotation: a worker asks for it with the generation it was
+    running on, and the VPN is only rotated if no other worker rotated it since.
+    """
+
+    def __init__(self, vpn: Vpn) -> None:
+        self.vpn = vpn
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def rotate(self, generation: int) -> None:
+        with self._lock:
+            if generation == self.generation:
+                self.vpn.rotate()
+                self.generation += 1
+
+
+def _get_category_names(vpn: Vpn, partial_scan: str | None, shard: Shard | None) -> list[str]:
+    """Names of the categories to scan, rotating the VPN before every try."""
+    for n_try in range(N_TRIES_CATEGORY):
+        vpn.rotate()
+        try:
+            return get_product_basic.get_category_names(partial_scan, shard)
+        except (pw_Error, exceptions.ScraperException) as exc:
+            logger.warning("Getting the categories failed, try number %s: %s", n_try, exc)
+    raise ValueError("Reached maximum number of tries when getting the categories")
+
+
+def _scan_category_worker(
+    pending: "queue.Queue[str]",
+    partial_scan: str | None,
+    shard: Shard | None,
+    known_listings: dict[str, list[float]],
+    vpn: SharedVpn,
+    failed: threading.Event,
+) -> list[ProductsState]:
+    """Scan the categories claimed from `pending` until it is empty, one at a time.
+
+    The VPN is rotated after a failed try, unless another worker already did it meanwhile. A
+    worker that runs out of tries sets `failed`, which stops the other workers after their current
+    try, since the scan cannot finish anyway.
+    """
+    states: list[ProductsState] = []
+    with get_product_basic.ScannerSession() as session:
+        while not failed.is_set():
+            try:
+                category_name = pending.get_nowait()
+            except queue.Empty:
+                return states
+
+            products_state = ProductsState(known_listings)
+            for n_try in range(N_TRIES_CATEGORY):
+                if failed.is_set():
+                    return states
+                logger.debug("Category %s, try number: %s", category_name, n_try)
+                generation = vpn.generation
+                products_state = get_product_basic.compute(
+                    products_state, partial_scan, shard, [category_name], session
+                )
+                if products_state.is_finished:
+                    break
+                vpn.rotate(generation)
+            else:
+                failed.set()
+                raise ValueError(f"Reached maximum number of tries when scanning `{category_name}`")
+            states.append(products_state)
+    return states
+
 
+def get_scanned_products_parallel(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+    workers: int = 2,
+) -> ScannedProducts:
+    """Scan the categories with `workers` browsers at once.
 
-def main(partial_scan: str | None = None):
-    products = get_scanned_products(partial_scan=partial_scan)
-    with open("scanned_prodcts.pkl", "wb") as f:
-        pickle.dump(products, f)
+    Each worker runs its own Playwright (the sync API is bound to the thread that started it) and
+    claims the pending categories from a shared work list, so a slow category does not hold back
+    the rest. The states of the categories are merged once all of them are finished, and the scan
+    fails as soon as a category runs out of tries.
+    """
+    vpn = Vpn(configs_folder=VPN_CFG_FOLDER_PATH)
+    try:
+        pending: "queue.Queue[str]" = queue.Queue()
+        for category_name in _get_category_names(vpn, partial_scan, shard):
+            pending.put(category_name)
+        logger.info("Scanning %s categories with %s workers", pending.qsize(), workers)
+
+        known_listings = db.get_known_listings(KNOWN_LISTING_MAX_DAYS)
+        shared_vpn = SharedVpn(vpn)
+        failed = threading.Event()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    _scan_category_worker,
+                    pending,
+                    partial_scan,
+                    shard,
+                    known_listings,
+                    shared_vpn,
+                    failed,
+                )
+                for _ in range(workers)
+            ]
+            products_state = ProductsState()
+            for future in as_completed(futures):
+                for category_state in future.result():
+                    products_state.merge(category_state)
+    finally:
+        vpn.kill()
+
+    _store_new_listings(products_state)
+    return ScannedProducts(products_state.get_scanned_products())
+
+
+def get_scanned_products_http(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+) -> ScannedProducts:
+    """Scan through the JSON API, falling back to the browser scan if the API fails."""
+    try:
+        return ScannedProducts(asyncio.run(http_scan.get_scanned_products(partial_scan, shard)))
+    except (httpx.HTTPError, ValueError, KeyError, exceptions.ScraperException) as exc:
+        logger.exception("HTTP scan failed, falling back to the browser: %s", exc)
+        return get_scanned_products(partial_scan=partial_scan, shard=shard)
+
+
+async def _collect(products: AsyncIterator[ScannedProduct]) -> ScannedProducts:
+    scanned_products = ScannedProducts()
+    async for product in products:
+        scanned_products.append(product)
+    return scanned_products
+
+
+def get_scanned_products_async(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+) -> ScannedProducts:
+    """Scan with the async Playwright engine (see `async_scan.scan_products`)."""
+    vpn = Vpn(configs_folder=VPN_CFG_FOLDER_PATH)
+    try:
+        vpn.rotate()
+        return asyncio.run(_collect(async_scan.scan_products(partial_scan, shard)))
+    finally:
+        vpn.kill()
 
-    products_ids = [product.product_id for product in products]
 
-    stored_products_ids = db.get_all_scanned_product_ids()
-    num_products = db.count_scanned_products()
-    logger.info("Number of stored products: %s", num_products)
+def main(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+    engine: str = "browser",
+    workers: int = 1,
+):
+    if engine == "http":
+        products = get_scanned_products_http(partial_scan=partial_scan, shard=shard)
+    elif engine == "async":
+        products = get_scanned_products_async(partial_scan=partial_scan, shard=shard)
+    elif workers > 1:
+        products = get_scanned_products_parallel(partial_scan, shard, workers)
+    else:
+        products = get_scanned_products(partial_scan=partial_scan, shard=shard)
+    products.dump(SCANNED_PRODUCTS_PATH)
 
-    new_products_ids = set(products_ids) - set(stored_products_ids)
-    new_products = [product for product in products if product.product_id in new_products_ids]
-    logger.info("Number of new products: %s", len(new_products))
-    for new_product in new_products:
-        logger.debug("Parsing product: %s", new_product.product_id)
-        db.insert_scanned_product(new_product)
-        db.insert_scanned_product(new_product)
+    merge_stats = db.merge_scanned_products(products)
+    logger.info("Number of new products: %s", merge_stats["new"])
+    logger.info("Number of delisted products: %s", merge_stats["delisted"])
@@ -0,0 +1,107 @@
+import struct
+import sys
+from array import array
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+
+from src.models import ScannedProduct
+
+MAGIC = b"SCNP"
+VERSION = 1
+# Magic, version, number of names and number of products
+HEADER = struct.Struct("<4sHII")
+NAME_LENGTH = struct.Struct("<H")
+
+
+class ScannedProducts:
+    """Compact collection of scanned products.
+
+    Products are stored column-wise in arrays (ID, scan time and the indices of the category and
+    subcategory names), and the names are interned in a single table, since thousands of products
+    share a few hundred names. Items are materialized as `ScannedProduct` on access, so callers
+    can keep iterating over them as if it was a list.
+
+    `dump`/`load` use a binary format (header, name table and the raw little endian arrays)
+    instead of pickling the models.
+    """
+
+    __slots__ = ("names", "_name_index", "product_ids", "scanned_at", "categories", "subcategories")
+
+    def __init__(self, products: Iterable[ScannedProduct] = ()) -> None:
+        self.names: list[str] = []
+        self._name_index: dict[str, int] = {}
+        self.product_ids = array("d")
+        # Seconds since the epoch
+        self.scanned_at = array("d")
+        # Indices in `names`
+        self.categories = array("I")
+        self.subcategories = array("I")
+        self.extend(products)
+
+    def __len__(self) -> int:
+        return len(self.product_ids)
+
+    def __getitem__(self, index: int) -> ScannedProduct:
+        return ScannedProduct(
+            product_id=self.product_ids[index],
+            category_name=self.names[self.categories[index]],
+            subcategory_name=self.names[self.subcategories[index]],
+            scanned_at=datetime.fromtimestamp(self.scanned_at[index]),
+        )
+
+    def __iter__(self) -> Iterator[ScannedProduct]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def _intern(self, name: str) -> int:
+        index = self._name_index.get(name)
+        if index is None:
+            index = self._name_index[name] = len(self.names)
+            self.names.append(sys.intern(name))
+        return index
+
+    def append(self, product: ScannedProduct) -> None:
+        self.product_ids.append(product.product_id)
+        self.scanned_at.append(product.scanned_at.timestamp())
+        self.categories.append(self._intern(product.category_name))
+        self.subcategories.append(self._intern(product.subcategory_name))
+
+    def extend(self, products: Iterable[ScannedProduct]) -> None:
+        for product in products:
+            self.append(product)
+
+    def dump(self, path: str | Path) -> None:
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.names), len(self)))
+            for name in self.names:
+                encoded = name.encode("utf-8")
+                f.write(NAME_LENGTH.pack(len(encoded)))
+                f.write(encoded)
+            for column in (self.product_ids, self.scanned_at, self.categories, self.subcategories):
+                if sys.byteorder == "big":
+                    column = array(column.typecode, column)
+                    column.byteswap()
+                column.tofile(f)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "ScannedProducts":
+        products = cls()
+        with open(path, "rb") as f:
+            magic, version, n_names, n_products = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"`{path}` is not a scanned products file (version {VERSION})")
+
+            for _ in range(n_names):
+                (length,) = NAME_LENGTH.unpack(f.read(NAME_LENGTH.size))
+                products._intern(f.read(length).decode("utf-8"))
+            for column in (
+                products.product_ids,
+                products.scanned_at,
+                products.categories,
+                products.subcategories,
+            ):
+                column.fromfile(f, n_products)
+                if sys.byteorder == "big":
+                    column.byteswap()
+        return products
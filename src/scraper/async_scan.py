@@ -0,0 +1,160 @@
+import os
+from collections.abc import AsyncIterator, Awaitable, Callable
+from datetime import datetime
+from functools import partial
+from typing import TypeVar
+
+from playwright.async_api import Error as pw_Error
+from playwright.async_api import Page, async_playwright
+
+from src.config.logger import logger
+from src.deadline import Deadline
+from src.models import ScannedProduct
+from src.rate_limiter import RateLimiter
+from src.scraper import exceptions, utils
+from src.scraper.get_product_basic import (
+    CATEGORY_MENU_SELECTOR,
+    COOKIES,
+    NAV_TIMEOUT_MS,
+    PW_TIMEOUT_MS,
+    SUBCATEGORY_SELECTOR,
+)
+from src.scraper.listing_capture import CATEGORY_API_PATTERN, extract_listed_products
+from src.scraper.request_filter import RequestFilter
+from src.sharding import Shard
+
+# Tries of each step (opening a category or a subcategory)
+N_TRIES = 5
+
+T = TypeVar("T")
+
+
+async def _read_categories(page: Page, limiter: RateLimiter | None = None) -> list[str]:
+    """Go to the home page, and return the names of the (top-level) categories."""
+    if limiter is not None:
+        await limiter.wait()
+    await page.goto(
+        os.getenv("URL_SEED", "default_invalid_url"),
+        timeout=NAV_TIMEOUT_MS,
+        wait_until="domcontentloaded",
+    )
+    await page.locator(CATEGORY_MENU_SELECTOR).first.wait_for(state="visible")
+    return await page.locator(CATEGORY_MENU_SELECTOR).all_inner_texts()
+
+
+async def _open_category(page: Page, limiter: RateLimiter | None, category_name: str) -> list[str]:
+    """Open a category from the home page, and return the names of its subcategories."""
+    category_names = await _read_categories(page, limiter)
+    categories = page.locator(CATEGORY_MENU_SELECTOR)
+    if category_name not in category_names:
+        raise exceptions.ScraperException(f"Category `{category_name}` not found")
+
+    if limiter is not None:
+        await limiter.wait()
+    await categories.nth(category_names.index(category_name)).click()
+    await page.locator(SUBCATEGORY_SELECTOR).first.wait_for(state="attached")
+    return await page.locator(SUBCATEGORY_SELECTOR).all_inner_texts()
+
+
+async def _open_subcategory(
+    page: Page, limiter: RateLimiter | None, index: int
+) -> list[tuple[float, str]]:
+    """Open a subcategory of the open category, and return the products of its listing."""
+    if limiter is not None:
+        await limiter.wait()
+    async with page.expect_response(
+        lambda response: CATEGORY_API_PATTERN.search(response.url) is not None
+    ) as response_info:
+        await page.locator(SUBCATEGORY_SELECTOR).nth(index).click()
+    response = await response_info.value
+    await page.wait_for_url("**/categories/**")
+
+    match = CATEGORY_API_PATTERN.search(response.url)
+    if match is None or int(match.group(1)) != utils.extract_category_id_from_url(page.url):
+        raise exceptions.ScraperException(f"Unexpected listing {response.url} for {page.url}")
+    if response.status != 200:
+        raise exceptions.ScraperException(f"Listing {response.url} failed: {response.status}")
+    return extract_listed_products(await response.json())
+
+
+async def _with_tries(
+    name: str,
+    step: Callable[[], Awaitable[T]],
+    reset: Callable[[], Awaitable[object]] | None = None,
+) -> T:
+    """Run a step of the scan, `reset` the page before trying it again."""
+    for n_try in range(1, N_TRIES + 1):
+        try:
+            if n_try > 1 and reset is not None:
+                await reset()
+            return await step()
+        except (pw_Error, exceptions.ScraperException) as exc:
+            logger.warning("`%s` failed (try %s): %s", name, n_try, exc)
+            if n_try == N_TRIES:
+                raise
+    raise exceptions.ScraperException(f"Unreachable: {name}")
+
+
+async def scan_products(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+    limiter: RateLimiter | None = None,
+    deadline: Deadline | None = None,
+) -> AsyncIterator[ScannedProduct]:
+    """Scan the products (ID, category, subcategory) with the async Playwright API.
+
+    Products are yielded subcategory by subcategory, as they are found, so the scan can run on
+    the same event loop as the store pipeline (sharing its rate `limiter` and `deadline`). Same
+    records as `get_product_basic.compute`, but the IDs are only taken from the listing requested
+    by the web app when a subcategory is opened. Products listed in several subcategories are
+    yielded once.
+
+    A failed step is tried again (up to `N_TRIES`) from the home page, the subcategories already
+    yielded are not scanned again.
+    """
+    request_filter = RequestFilter()
+    seen: set[float] = set()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True, slow_mo=None, timeout=PW_TIMEOUT_MS)
+        try:
+            context = await browser.new_context()
+            await context.add_cookies(COOKIES)
+            page = await context.new_page()
+            page.set_default_timeout(PW_TIMEOUT_MS)
+            await page.route("**/*", request_filter.handle_async)
+
+            read_categories = partial(_read_categories, page, limiter)
+            category_names = utils.sample_categories(
+                await _with_tries("categories", read_categories), partial_scan, shard
+            )
+            if not category_names:
+                raise exceptions.ScraperException("No categories found")
+
+            for category_name in category_names:
+                open_category = partial(_open_category, page, limiter, category_name)
+                subcategory_names = await _with_tries(category_name, open_category)
+                for index, subcategory_name in enumerate(subcategory_names):
+                    if deadline is not None and not deadline.can_fit_batch():
+                        logger.warning("Scan stopped by the deadline in `%s`", subcategory_name)
+                        return
+
+                    listed = await _with_tries(
+                        subcategory_name,
+                        partial(_open_subcategory, page, limiter, index),
+                        reset=open_category,
+                    )
+                    scanned_at = datetime.now()
+                    for product_id, _ in listed:
+                        if product_id in seen:
+                            continue
+                        seen.add(product_id)
+                        yield ScannedProduct(
+                            product_id=product_id,
+                            category_name=category_name,
+                            subcategory_name=subcategory_name,
+                            scanned_at=scanned_at,
+                        )
+                    logger.info("Scanned %s products of `%s`", len(listed), subcategory_name)
+        finally:
+            request_filter.log_stats()
+            await browser.close()
@@ -0,0 +1,72 @@
+import json
+import os
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+from src.config.logger import logger
+
+N_STEPS = 50
+DIAGNOSTICS_DIR = Path(os.environ.get("SCAN_DIAGNOSTICS_DIR", "."))
+# Also record a Playwright trace (screenshots and DOM snapshots of every action), which is slower
+TRACE = os.environ.get("SCAN_TRACE", "").lower() in ("1", "true")
+
+
+class Diagnostics:
+    """Evidence of the last steps of a scan, written only when it fails.
+
+    Each `step` keeps its label, the URL and the time in a ring buffer of the last `n_steps`, so
+    normal runs pay nothing for it. When an exception escapes the `with` block, the steps are
+    written to `diagnostics_<time>.json`, along with a screenshot and the HTML of the page (and
+    the Playwright trace, with `SCAN_TRACE`).
+
+    Enter it after the Playwright context (`with sync_playwright() as p, Diagnostics() as d:`), so
+    the page is still open when the evidence is taken.
+    """
+
+    def __init__(
+        self,
+        n_steps: int = N_STEPS,
+        output_dir: Path = DIAGNOSTICS_DIR,
+        trace: bool = TRACE,
+    ) -> None:
+        self.steps: deque[dict] = deque(maxlen=n_steps)
+        self.output_dir = output_dir
+        self.trace = trace
+        self.page = None
+
+    def attach(self, page) -> None:
+        self.page = page
+        if self.trace:
+            page.context.tracing.start(screenshots=True, snapshots=True)
+
+    def step(self, label: str) -> None:
+        url = self.page.url if self.page is not None else None
+        self.steps.append({"at": datetime.now().isoformat(), "label": label, "url": url})
+
+    def __enter__(self) -> "Diagnostics":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc is None:
+            if self.trace and self.page is not None:
+                self.page.context.tracing.stop()
+        else:
+            self.dump(exc)
+
+    def dump(self, exc: BaseException) -> None:
+        prefix = self.output_dir / f"diagnostics_{datetime.now():%Y%m%d_%H%M%S_%f}"
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        with open(f"{prefix}.json", "w", encoding="utf-8") as f:
+            json.dump({"error": repr(exc), "steps": list(self.steps)}, f, indent=2)
+
+        # The page may be gone (e.g. the browser crashed), the steps are still written
+        if self.page is not None:
+            try:
+                self.page.screenshot(path=f"{prefix}.png", full_page=True)
+                Path(f"{prefix}.html").write_text(self.page.content(), encoding="utf-8")
+                if self.trace:
+                    self.page.context.tracing.stop(path=f"{prefix}.zip")
+            except Exception as capture_exc:
+                logger.warning("Cannot capture the page after the failure: %s", capture_exc)
+        logger.info("Diagnostics of the failure written to %s.*", prefix)
@@ -0,0 +1,125 @@
+from typing import Any
+
+from src.models import FullInfo
+from src.scraper.info_parser import sntz
+
+PRICE_INSTRUCTION_FIELDS = (
+    "iva",
+    "is_new",
+    "is_pack",
+    "pack_size",
+    "unit_name",
+    "unit_size",
+    "bulk_price",
+    "unit_price",
+    "approx_size",
+    "size_format",
+    "total_units",
+    "unit_selector",
+    "bunch_selector",
+    "drained_weight",
+    "selling_method",
+    "price_decreased",
+    "reference_price",
+    "min_bunch_amount",
+    "reference_format",
+    "increment_bunch_amount",
+)
+
+
+def extract_raw(data: dict) -> dict[str, Any]:
+    """Walk a product API response once and return the (unvalidated) `FullInfo` fields.
+
+    Equivalent to the `InfoParser` methods combined, with the product ID already set in the
+    photos, price instruction and nutrition information.
+    """
+    product_id = data.get("id")
+    details = data.get("details") or {}
+    badges = data.get("badges") or {}
+    suppliers = details.get("suppliers") or []
+
+    product = {
+        "id": product_id,
+        "ean": data.get("ean"),
+        "slug": data.get("slug"),
+        "brand": data.get("brand"),
+        "limit_value": data.get("limit"),
+        "origin": data.get("origin"),
+        "packaging": data.get("packaging"),
+        "published": data.get("published"),
+        "share_url": data.get("share_url"),
+        "thumbnail": data.get("thumbnail"),
+        "display_name": data.get("display_name"),
+        "unavailable_from": data.get("unavailable_from"),
+        "is_variable_weight": data.get("is_variable_weight"),
+        "legal_name": details.get("legal_name"),
+        "description": details.get("description"),
+        "counter_info": details.get("counter_info"),
+        "danger_mentions": details.get("danger_mentions"),
+        "alcohol_by_volume": sntz(details.get("alcohol_by_volume")),
+        "mandatory_mentions": details.get("mandatory_mentions"),
+        "product_variant": details.get("production_variant"),
+        "usage_instructions": details.get("usage_instructions"),
+        "storage_instructions": details.get("storage_instructions"),
+    }
+
+    photos = [
+        {
+            "product_id": product_id,
+            "zoom": photo.get("zoom"),
+            "regular": photo.get("regular"),
+            "thumbnail": photo.get("thumbnail"),
+            "perspective": photo.get("perspective"),
+        }
+        for photo in data.get("photos") or []
+    ]
+
+    categories: list[dict] = []
+    stack = list(reversed(data.get("categories") or []))
+    while stack:
+        # Depth-first, in the same order as the recursive `InfoParser.category`
+        category = stack.pop()
+        categories.append(
+            {
+                "id": category.get("id"),
+                "name": category.get("name"),
+                "level": category.get("level"),
+                "order_value": category.get("order"),
+            }
+        )
+        stack.extend(reversed(category.get("categories") or []))
+
+    price_instruction: dict[str, Any] = {"product_id": product_id}
+    if "price_instructions" in data:
+        price_data = data["price_instructions"]
+        for field in PRICE_INSTRUCTION_FIELDS:
+            price_instruction[field] = price_data.get(field)
+        price_instruction["previous_unit_price"] = sntz(price_data.get("previous_unit_price"))
+
+    nutrition_information: dict[str, Any] = {"product_id": product_id}
+    if "nutrition_information" in data:
+        nutrition_data = data["nutrition_information"] or {}
+        nutrition_information["allergens"] = nutrition_data.get("allergens")
+        nutrition_information["ingredients"] = nutrition_data.get("ingredients")
+
+    return {
+        "product": product,
+        "badge": {
+            "is_water": badges.get("is_water"),
+            "requires_age_check": badges.get("requires_age_check"),
+        },
+        "supplier": {"name": suppliers[0].get("name") if suppliers else None},
+        "photos": photos,
+        "categories": categories,
+        "price_instruction": price_instruction,
+        "nutrition_information": nutrition_information,
+    }
+
+
+def extract_full_info(data: dict) -> FullInfo:
+    """Extract and validate (coercing e.g. the string prices) all the info of a product.
+
+    The models are validated once, here. Downstream code should reuse them (e.g. `model_copy`,
+    which does not validate again) instead of building new ones from dicts.
+    """
+    return FullInfo.model_validate(extract_raw(data))
@@ -1,19 +1,26 @@
 import os
 import time
 from asyncio.exceptions import InvalidStateError
+from collections.abc import Iterator
+from contextlib import contextmanager, suppress
 from datetime import datetime
 
 from playwright._impl._api_structures import SetCookieParam
 from playwright._impl._errors import Error as pw_Error
+from playwright.sync_api import Browser, BrowserContext, Page, Playwright
 from playwright.sync_api import TimeoutError as pw_TimeoutError
 from playwright.sync_api import sync_playwright
-from playwright.sync_api._generated import Locator
+from playwright.sync_api._generated import ElementHandle, Locator
 from pydantic import BaseModel
 
 from src.config.logger import logger
 from src.models import ScannedProduct
 from src.scraper import exceptions, utils
+from src.scraper.diagnostics import Diagnostics
+from src.scraper.listing_capture import ListingCapture
 from src.scraper.product_state import ProductsState
+from src.scraper.request_filter import RequestFilter
+from src.sharding import Shard
 
 if os.getenv("URL_SEED") is None:
     raise ValueError("URL_SEED environment variable not set.")
@@ -22,6 +29,29 @@ SLEEP_TIME_SECONDS = 1
 PW_TIMEOUT_MS = 15000
 NAV_TIMEOUT_MS = 30000
 CATEGORY_MENU_SELECTOR = "css=span.category-menu__header"
+SUBCATEGORY_SELECTOR = "css=li.open li"
+PRODUCT_CELL_SELECTOR = "css=button.product-cell__content-link"
+
+COOKIES = [
+    SetCookieParam(
+        {
+            "name": "__mo_da",
+            "value": '{"warehouse":"vlc1","postalCode":"46001"}',
+            "domain": ".mercadona.es",
+            "path": "/",
+            "secure": True,
+        }
+    ),
+    SetCookieParam(
+        {
+            "name": "__mo_ca",
+            "value": '{"thirdParty":true,"necessary":true,"version":1}',
+            "domain": ".mercadona.es",
+            "path": "/",
+            "secure": True,
+        }
+    ),
+]
 
 
 class ScanState(BaseModel):
@@ -34,41 +64,92 @@ class ScanState(BaseModel):
     done_products: list[str] = []
 
 
-def compute(products_state: ProductsState, partial_scan: str | None = None) -> ProductsState:
+class ScannerSession:
+    """Browser kept alive across the tries of a scan.
+
+    Starting Chromium is the slowest part of a try, so it is launched once and each try only
+    opens a new page (see `page`). When a try fails, its context (cookies, connections) is closed,
+    so the next one starts clean, e.g. after the VPN is rotated. The browser is only launched
+    again if it is gone.
+    """
+
+    def __init__(self) -> None:
+        self._playwright: Playwright | None = None
+        self._browser: Browser | None = None
+        self._context: BrowserContext | None = None
+
+    def __enter__(self) -> "ScannerSession":
+        self._playwright = sync_playwright().start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._close_context()
+        if self._browser is not None:
+            with suppress(pw_Error):
+                self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    @contextmanager
+    def page(self) -> Iterator[Page]:
+        if self._playwright is None:
+            raise RuntimeError("The scanner session is not started")
+        if self._browser is None or not self._browser.is_connected():
+            self._browser = self._playwright.chromium.launch(
+                headless=True, slow_mo=None, timeout=PW_TIMEOUT_MS
+            )
+            self._context = None
+        if self._context is None:
+            self._context = self._browser.new_context()
+            self._context.add_cookies(COOKIES)
+
+        page = self._context.new_page()
+        page.set_default_timeout(PW_TIMEOUT_MS)
+        page.set_default_navigation_timeout(PW_TIMEOUT_MS)
+        try:
+            yield page
+        except BaseException:
+            self._close_context()
+            raise
+        with suppress(pw_Error):
+            page.close()
+
+    def _close_context(self) -> None:
+        if self._context is not None:
+            with suppress(pw_Error):
+                self._context.close()
+            self._context = None
+
+
+def compute(
+    products_state: ProductsState,
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+    category_names: list[str] | None = None,
+    session: ScannerSession | None = None,
+) -> ProductsState:
     """Scrapes the website to get basic information the products (ID, category, subcategory).
 
+    With `category_names`, only those (top-level) categories are scanned, e.g. by each of the
+    workers of a parallel scan. With a `session`, its browser is reused (e.g. by all the tries of
+    a scan), otherwise one is started for this call. A try resuming a scan goes straight to the
+    page of the pending subcategory.
+
     Main steps:
     -
     """
-
-    cookies = [
-        SetCookieParam(
-            {
-                "name": "__mo_da",
-                "value": '{"warehouse":"vlc1","postalCode":"46001"}',
-                "domain": ".mercadona.es",
-                "path": "/",
-                "secure": True,
-            }
-        ),
-        SetCookieParam(
-            {
-                "name": "__mo_ca",
-                "value": '{"thirdParty":true,"necessary":true,"version":1}',
-                "domain": ".mercadona.es",
-                "path": "/",
-                "secure": True,
-            }
-        ),
-    ]
+    if session is None:
+        with ScannerSession() as new_session:
+            return compute(products_state, partial_scan, shard, category_names, new_session)
 
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True, slow_mo=None, timeout=PW_TIMEOUT_MS)
-            page = browser.new_page()
-            page.set_default_timeout(PW_TIMEOUT_MS)
-            page.set_default_navigation_timeout(PW_TIMEOUT_MS)
-            page.context.add_cookies(cookies)
+        # Evidence of the last steps is only written when an exception escapes
+        with session.page() as page, Diagnostics() as diagnostics:
+            diagnostics.attach(page)
+            request_filter = RequestFilter()
+            page.route("**/*", request_filter.handle)
 
             pending_requests: dict[int, str] = {}
 
@@ -82,19 +163,27 @@ def compute(products_state: ProductsState, partial_scan: str | None = None) -> P
             page.on("requestfinished", _untrack_request)
             page.on("requestfailed", _untrack_request)
 
+            # Product IDs are taken from the listings requested by the web app, opening each
+            # product is only the fallback for those which cannot be matched
+            listing_capture = ListingCapture()
+            page.on("response", listing_capture.on_response)
+
             url_seed = os.getenv("URL_SEED", "default_invalid_url")
-            logger.info("Navigating to URL_SEED")
-            response = page.goto(url_seed, timeout=NAV_TIMEOUT_MS, wait_until="domcontentloaded")
+            resume_url = products_state.pop_resume_url()
+            logger.info("Navigating to %s", "the pending subcategory" if resume_url else "URL_SEED")
+            response = page.goto(
+                resume_url or url_seed, timeout=NAV_TIMEOUT_MS, wait_until="domcontentloaded"
+            )
             status = response.status if response is not None else None
             logger.info("goto done: status=%s, final_url=%s", status, page.url)
-            page.screenshot(path="screenshot_00_after_goto.png", full_page=True)
+            diagnostics.step(f"goto: status={status}")
 
             try:
                 page.locator(CATEGORY_MENU_SELECTOR).first.wait_for(
                     state="visible", timeout=PW_TIMEOUT_MS
                 )
             except pw_TimeoutError:
-                page.screenshot(path="screenshot_01_wait_timeout.png", full_page=True)
+                diagnostics.step("category menu timeout")
                 logger.error(
                     "Category menu not visible within %dms. Page title=%r, url=%s. "
                     "Pending requests (%d): %s",
@@ -106,57 +195,78 @@ def compute(products_state: ProductsState, partial_scan: str | None = None) -> P
                 )
                 raise
 
-            page.screenshot(path="screenshot_02_categories_visible.png", full_page=True)
+            diagnostics.step("categories visible")
             logger.debug("Fresh start")
             # Add/sync categories
-            categories_all = page.locator(CATEGORY_MENU_SELECTOR).all()
-            categories_ = _sample_categories(categories_all, partial_scan)
-            products_state.add_categories(categories_)
+            categories_all = list(zip(*_all_with_texts(page.locator(CATEGORY_MENU_SELECTOR))))
+            categories_ = _sample_categories(categories_all, partial_scan, shard)
+            if category_names is not None:
+                categories_ = [c for c in categories_ if c[1] in category_names]
+            products_state.add_categories([c[0] for c in categories_], [c[1] for c in categories_])
             logger.debug("Found %s categories", len(categories_))
             if len(categories_) == 0:
                 raise exceptions.ScraperException("No categories found")
 
-            # Add/sync subcategories
+            # Add/sync subcategories (already open when resuming from the subcategory page)
             pending_cats = products_state.get_pending_categories()
-            pending_cats[0].click()
-            _ = check_too_much_requests(page)
-            page.locator("css=li.open li").first.wait_for(state="attached")
-
-            subcategories = page.locator("css=li.open").locator("li").all()
-            products_state.add_subcategories(pending_cats[0], subcategories)
+            if resume_url is None:
+                pending_cats[0].click()
+                _ = check_too_much_requests(page)
+            else:
+                # Redirected, e.g. if the subcategory is gone
+                resumed_id = utils.extract_category_id_from_url(page.url)
+                if resumed_id != utils.extract_category_id_from_url(resume_url):
+                    raise exceptions.ScraperException(f"Not resumed from {resume_url}: {page.url}")
+            page.locator(SUBCATEGORY_SELECTOR).first.wait_for(state="attached")
+
+            subcategories, subcategory_names = _all_with_texts(page.locator(SUBCATEGORY_SELECTOR))
+            products_state.add_subcategories(pending_cats[0], subcategories, subcategory_names)
             pending_subcats = products_state.get_pending_subcategories(pending_cats[0])
 
             # Add/sync products
-            pending_subcats[0].click()
-            _ = check_too_much_requests(page)
-            page.wait_for_url("**/categories/**")
-            buttons_products = get_products_locators(page)
-
-            products_state.add_products(pending_cats[0], pending_subcats[0], buttons_products)
+            if resume_url is None:
+                pending_subcats[0].click()
+                _ = check_too_much_requests(page)
+                page.wait_for_url("**/categories/**")
+            products_state.set_subcategory_url(pending_cats[0], pending_subcats[0], page.url)
+            products_state.add_products(
+                pending_cats[0],
+                pending_subcats[0],
+                *_read_product_cells(page, diagnostics),
+                listed_ids=_listed_ids(page, listing_capture),
+            )
+            _scan_from_listing(
+                page, products_state, listing_capture, pending_cats[0], pending_subcats[0]
+            )
             pending_products = products_state.get_pending_products(
                 pending_cats[0], pending_subcats[0]
             )
 
-            while pending_products:
-                logger.debug("Iter to the next product")
-                pending_products[0].click()
-                _ = check_too_much_requests(page)
-                page.wait_for_url("**/product/**")
-                product_id = utils.extract_product_id_from_url(page.url)
-                page.locator("css=button.modal-content__close").click()
-
-                products_state.add_scanned_product(
-                    pending_cats[0],
-                    pending_subcats[0],
-                    pending_products[0],
-                    ScannedProduct(
-                        product_id=product_id,
-                        category_name=pending_cats[0].inner_text(),
-                        subcategory_name=pending_subcats[0].inner_text(),
-                        scanned_at=datetime.now(),
-                    ),
-                )
-                logger.info("Official product ID: %s", product_id)
+            while True:
+                if pending_products:
+                    logger.debug("Iter to the next product")
+                    diagnostics.step("open product")
+                    pending_products[0].click()
+                    _ = check_too_much_requests(page)
+                    page.wait_for_url("**/product/**")
+                    product_id = utils.extract_product_id_from_url(page.url)
+                    page.locator("css=button.modal-content__close").click()
+
+                    category_name, subcategory_name = products_state.get_names(
+                        pending_cats[0], pending_subcats[0]
+                    )
+                    products_state.add_scanned_product(
+                        pending_cats[0],
+                        pending_subcats[0],
+                        pending_products[0],
+                        ScannedProduct(
+                            product_id=product_id,
+                            category_name=category_name,
+                            subcategory_name=subcategory_name,
+                            scanned_at=datetime.now(),
+                        ),
+                    )
+                    logger.info("Official product ID: %s", product_id)
 
                 current_cat = pending_cats[0]
                 current_subcat = pending_subcats[0]
@@ -178,9 +288,13 @@ def compute(products_state: ProductsState, partial_scan: str | None = None) -> P
                     logger.debug("Load next category")
                     pending_cats[0].click()
                     _ = check_too_much_requests(page)
-                    _wait_until_load(page, last_category=False)
-                    subcategories = page.locator("css=li.open").locator("li").all()
-                    products_state.add_subcategories(pending_cats[0], subcategories)
+                    _wait_until_load(page, diagnostics, last_category=False)
+                    subcategories, subcategory_names = _all_with_texts(
+                        page.locator(SUBCATEGORY_SELECTOR)
+                    )
+                    products_state.add_subcategories(
+                        pending_cats[0], subcategories, subcategory_names
+                    )
                     pending_subcats = products_state.get_pending_subcategories(pending_cats[0])
 
                 if current_subcat != pending_subcats[0]:
@@ -189,15 +303,27 @@ def compute(products_state: ProductsState, partial_scan: str | None = None) -> P
                     logger.debug("Load next subcategory")
                     pending_subcats[0].click()
                     _ = check_too_much_requests(page)
-                    _wait_until_load(page, last_category=False)
+                    _wait_until_load(page, diagnostics, last_category=False)
                     page.wait_for_url("**/categories/**")
-                    buttons_products = get_products_locators(page)
+                    products_state.set_subcategory_url(
+                        pending_cats[0], pending_subcats[0], page.url
+                    )
                     products_state.add_products(
-                        pending_cats[0], pending_subcats[0], buttons_products
+                        pending_cats[0],
+                        pending_subcats[0],
+                        *_read_product_cells(page, diagnostics),
+                        listed_ids=_listed_ids(page, listing_capture),
+                    )
+                    _scan_from_listing(
+                        page, products_state, listing_capture, pending_cats[0], pending_subcats[0]
                     )
                     pending_products = products_state.get_pending_products(
                         pending_cats[0], pending_subcats[0]
                     )
+                elif not pending_products:
+                    raise exceptions.ScraperException("Pending subcategory without products")
+
+            request_filter.log_stats()
 
     except pw_TimeoutError:
         time.sleep(SLEEP_TIME_SECONDS)
@@ -221,13 +347,58 @@ def compute(products_state: ProductsState, partial_scan: str | None = None) -> P
     return products_state
 
 
-def _wait_until_load(page, last_category: bool = False) -> None:
+def get_category_names(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+) -> list[str]:
+    """Names of the (top-level) categories to scan."""
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True, slow_mo=None, timeout=PW_TIMEOUT_MS)
+        page = browser.new_page()
+        page.context.add_cookies(COOKIES)
+        page.route("**/*", RequestFilter().handle)
+        page.goto(
+            os.getenv("URL_SEED", "default_invalid_url"),
+            timeout=NAV_TIMEOUT_MS,
+            wait_until="domcontentloaded",
+        )
+        page.locator(CATEGORY_MENU_SELECTOR).first.wait_for(state="visible", timeout=PW_TIMEOUT_MS)
+        categories_all = list(zip(*_all_with_texts(page.locator(CATEGORY_MENU_SELECTOR))))
+        names = [name for _, name in _sample_categories(categories_all, partial_scan, shard)]
+        browser.close()
+    return names
+
+
+def _listed_ids(page, listing_capture: ListingCapture) -> dict[str, float]:
+    """IDs of the products captured from the listing of the current subcategory, by name."""
+    category_id = utils.extract_category_id_from_url(page.url)
+    if category_id is None:
+        return {}
+    return listing_capture.products_by_name(category_id)
+
+
+def _scan_from_listing(
+    page,
+    products_state: ProductsState,
+    listing_capture: ListingCapture,
+    category_loc: Locator,
+    subcategory_loc: Locator,
+) -> None:
+    ids_by_name = _listed_ids(page, listing_capture)
+    if not ids_by_name:
+        return
+
+    category_name, subcategory_name = products_state.get_names(category_loc, subcategory_loc)
+    n_scanned = products_state.scan_listed_products(category_name, subcategory_name, ids_by_name)
+    logger.info("Scanned %s products of `%s` from its listing", n_scanned, subcategory_name)
+
+
+def _wait_until_load(page, diagnostics: Diagnostics, last_category: bool = False) -> None:
     # Waiting logic
-    page.screenshot(path="screenshot_20_wait.png")
     tries = 0
     selector = "button.category-detail__next-subcategory"
     while tries < 3:
-        page.screenshot(path=f"screenshot_23_{tries}_wait.png")
+        diagnostics.step(f"wait until load, try {tries}")
         tries += 1
         try:
             # This is the last element to load ("Next subcategory" button)
@@ -242,19 +413,38 @@ def _wait_until_load(page, last_category: bool = False) -> None:
             page.wait_for_timeout(1000)
 
 
-def get_products_locators(page) -> list[Locator]:
-    page.screenshot(path="screenshot_30_before_locate.png")
-    selector = "css=button.product-cell__content-link"
+def _all_with_texts(locator: Locator) -> tuple[list[Locator], list[str]]:
+    """Locators of all the elements matched, with their texts read in a single round trip."""
+    texts = locator.all_inner_texts()
+    locators = locator.all()
+    if len(locators) != len(texts):
+        raise exceptions.ScraperException(f"`{locator}` changed while reading it")
+    return locators, texts
+
+
+def _read_product_cells(
+    page, diagnostics: Diagnostics
+) -> tuple[list[Locator], list[str], list[ElementHandle]]:
+    """Product cells of a subcategory page, with their names and handles (one round trip each)."""
+    buttons_products = get_products_locators(page, diagnostics)
+    cells = page.locator(PRODUCT_CELL_SELECTOR)
+    names = cells.all_inner_texts()
+    handles = cells.element_handles()
+    if not len(buttons_products) == len(names) == len(handles):
+        raise exceptions.ScraperException("Product cells changed while reading them")
+    return buttons_products, names, handles
+
+
+def get_products_locators(page, diagnostics: Diagnostics) -> list[Locator]:
+    selector = PRODUCT_CELL_SELECTOR
     buttons_products = page.locator(selector).all()
-    page.screenshot(path="screenshot_31_after_locate.png")
+    diagnostics.step(f"located {len(buttons_products)} products")
     tries = 0
     while not buttons_products and tries < 3:
         tries += 1
-        page.screenshot(path="screenshot_32_before_wait.png")
         _ = check_too_much_requests(page)
         logger.debug("Waiting for `%s`", selector)
         page.wait_for_timeout(1000)
-        page.screenshot(path="screenshot_33_after_wait.png")
         buttons_products = page.locator(selector).all()
 
     if not buttons_products:
@@ -281,28 +471,11 @@ def check_too_much_requests(page) -> bool:
 
 
 def _sample_categories(
-    categories_all: list[Locator],
+    categories_all: list[tuple[Locator, str]],
     partial_scan: str | None = None,
-) -> list[Locator]:
-    if partial_scan is None:
-        return categories_all
-
-    total_len = len(categories_all)
-    quarter_size = total_len // 4
-
-    if partial_scan == "first_quarter":
-        return categories_all[:quarter_size]
-    if partial_scan == "second_quarter":
-        return categories_all[quarter_size:2 * quarter_size]
-    if partial_scan == "third_quarter":
-        return categories_all[2 * quarter_size:3 * quarter_size]
-    if partial_scan == "fourth_quarter":
-        return categories_all[3 * quarter_size:]
-
-    # Keep backward compatibility with old two-part system
-    if partial_scan == "first_half":
-        return categories_all[:total_len // 2]
-    if partial_scan == "second_half":
-        return categories_all[total_len // 2:]
-
-    raise ValueError("Invalid value for `partial_scan`")
+    shard: Shard | None = None,
+) -> list[tuple[Locator, str]]:
+    """Sample the (locator, name) pairs of the categories."""
+    return utils.sample_categories(
+        categories_all, partial_scan, shard, name=lambda category: category[1]
+    )
@@ -0,0 +1,97 @@
+import asyncio
+import os
+from datetime import datetime
+
+import httpx
+
+from src.config.logger import logger
+from src.models import ScannedProduct
+from src.rate_limiter import RateLimiter
+from src.scraper import exceptions, utils
+from src.scraper.listing_capture import extract_listed_products
+from src.sharding import Shard
+from src.vpn import AsyncCustomHost, NameSolver
+
+API_URL_TEMPLATE = str(os.environ.get("API_URL_TEMPLATE"))
+# Category tree and listings (`<url><id>/`), next to the products endpoint by default
+CATEGORIES_API_URL = os.environ.get("CATEGORIES_API_URL") or (
+    API_URL_TEMPLATE.split("/products/", maxsplit=1)[0] + "/categories/"
+)
+# Same warehouse as the cookie of the browser scan
+API_PARAMS = {"lang": "es", "wh": "vlc1"}
+
+REQUESTS_PER_SECOND = 10.0
+N_TRIES = 3
+
+
+async def _get_json(session: httpx.AsyncClient, limiter: RateLimiter, url: str) -> dict:
+    for n_try in range(1, N_TRIES + 1):
+        await limiter.wait()
+        try:
+            response = await session.get(url, params=API_PARAMS)
+            response.raise_for_status()
+            data: dict = response.json()
+            return data
+        except (httpx.HTTPError, ValueError) as exc:
+            logger.warning("Request %s failed (try %s): %s", url, n_try, exc)
+            if n_try == N_TRIES:
+                raise
+            await asyncio.sleep(2**n_try)
+    raise exceptions.ScraperException(f"Unreachable: {url}")
+
+
+async def _scan_subcategory(
+    session: httpx.AsyncClient,
+    limiter: RateLimiter,
+    category_name: str,
+    subcategory: dict,
+) -> list[ScannedProduct]:
+    listing = await _get_json(session, limiter, f"{CATEGORIES_API_URL}{subcategory['id']}/")
+    scanned_at = datetime.now()
+    return [
+        ScannedProduct(
+            product_id=product_id,
+            category_name=category_name,
+            subcategory_name=subcategory["name"],
+            scanned_at=scanned_at,
+        )
+        for product_id, _ in extract_listed_products(listing)
+    ]
+
+
+async def get_scanned_products(
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+    requests_per_second: float = REQUESTS_PER_SECOND,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> list[ScannedProduct]:
+    """Scan the products (ID, category, subcategory) through the JSON category API.
+
+    Same records as the browser scan (`get_product_basic.compute`), with one request for the
+    category tree and one per subcategory. Products listed in several subcategories are kept
+    once, in the first one.
+    """
+    limiter = RateLimiter(requests_per_second)
+    transport = transport or AsyncCustomHost(NameSolver())
+    async with httpx.AsyncClient(transport=transport, timeout=10.0) as session:
+        tree = await _get_json(session, limiter, CATEGORIES_API_URL)
+        categories = utils.sample_categories(
+            tree.get("results", []), partial_scan, shard, name=lambda category: category["name"]
+        )
+        if not categories:
+            raise exceptions.ScraperException("No categories found")
+
+        listings = await asyncio.gather(
+            *(
+                _scan_subcategory(session, limiter, category["name"], subcategory)
+                for category in categories
+                for subcategory in category.get("categories", [])
+            )
+        )
+
+    products: dict[float, ScannedProduct] = {}
+    for listing in listings:
+        for product in listing:
+            products.setdefault(product.product_id, product)
+    logger.info("Scanned %s products of %s categories", len(products), len(categories))
+    return list(products.values())
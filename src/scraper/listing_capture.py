@@ -0,0 +1,60 @@
+import re
+
+from src.config.logger import logger
+
+# Listing of a (sub)category requested by the web app, e.g. `/api/categories/112/?lang=es`
+CATEGORY_API_PATTERN = re.compile(r"/api/categories/(\d+)/")
+
+
+def extract_listed_products(data: dict) -> list[tuple[float, str]]:
+    """(ID, display name) of every product of a category listing response.
+
+    Products are nested in sections (`categories`), at any depth.
+    """
+    listed = []
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        for product in node.get("products") or []:
+            display_name = product.get("display_name")
+            if product.get("id") is not None and display_name:
+                listed.append((float(product["id"]), str(display_name).strip()))
+        stack.extend(reversed(node.get("categories") or []))
+    return listed
+
+
+class ListingCapture:
+    """Collect the products of the category listings received by a Playwright page.
+
+    Register `on_response` with `page.on("response", ...)`. The products of each listing are kept
+    by (sub)category ID, so the whole subcategory can be scanned at once instead of opening each
+    product.
+    """
+
+    def __init__(self) -> None:
+        self.listings: dict[int, list[tuple[float, str]]] = {}
+
+    def on_response(self, response) -> None:
+        match = CATEGORY_API_PATTERN.search(response.url)
+        if match is None or response.status != 200:
+            return
+
+        try:
+            data = response.json()
+        except Exception as exc:
+            logger.debug("Unreadable listing %s: %s", response.url, exc)
+            return
+        listed = extract_listed_products(data)
+        self.listings[int(match.group(1))] = listed
+        logger.debug("Captured %s products of category %s", len(listed), match.group(1))
+
+    def products_by_name(self, category_id: int) -> dict[str, float]:
+        """IDs of the captured products of a category, by display name.
+
+        Names shared by several products of the listing are left out, since the product cell
+        they belong to is ambiguous.
+        """
+        ids_by_name: dict[str, set[float]] = {}
+        for product_id, name in self.listings.get(category_id, []):
+            ids_by_name.setdefault(name, set()).add(product_id)
+        return {name: ids.pop() for name, ids in ids_by_name.items() if len(ids) == 1}
@@ -1,55 +1,95 @@
+from datetime import datetime
+
 from playwright.sync_api._generated import ElementHandle, Locator
-from pydantic import BaseModel, Field
 
 from src.config.logger import logger
-from src.models import ScannedProduct
-
+from src.models import HtmlCategoryDB, ScannedProduct
+from src.scraper import utils
 
-class ProductState(BaseModel):
-    """State of a product being scraped.
 
-    A product state can have:
-    - Only category (locator and name). Then all subcategories and products belonging to the
-    category are pending.
-    - A category (locator and name) and a subcategory (locator and name), then all products
-    belonging to that category-subcategory are pending.
-    - A category, a subcategory and a product (locator, handle and name), then the product is
-    pending.
-    - A category, a subcategory and a product with a scanned product, then the product is scanned.
+class ProductState:
+    """State of a product being scraped: its cell in the subcategory page and, once scanned, its
+    scanned product.
 
     Notice that `Locator`s become stale between pages reloads, so they need to be refreshed before
     used. On the other hand, `ElementHandle`s are not stale, so they can be used directly.
     """
 
-    category_locator: Locator = Field(repr=False)
-    category_name: str
-    subcategory_locator: Locator | None = Field(default=None, repr=False)
-    subcategory_name: str | None = None
-    product_locator: Locator | None = Field(default=None, repr=False)
-    product_handle: ElementHandle | None = Field(default=None, repr=False)
-    product_name: str | None = None
-    scanned_product: ScannedProduct | None = Field(default=None, repr=False)
-
-    class Config:
-        arbitrary_types_allowed = True
-
-    def __eq__(self, other):
-        if not isinstance(other, ProductState):
-            return NotImplemented
-        return (
-            self.category_name == other.category_name
-            and str(self.category_locator) == str(other.category_locator)
-            and self.subcategory_name == other.subcategory_name
-            and str(self.subcategory_locator) == str(other.subcategory_locator)
-            and self.product_name == other.product_name
-            and str(self.product_handle) == str(other.product_handle)
-            and self.scanned_product == other.scanned_product
-        )
+    __slots__ = ("name", "locator", "handle", "scanned_product")
 
-    def __hash__(self):
-        return hash(
-            (self.category_name, self.subcategory_name, self.product_name, self.scanned_product)
-        )
+    def __init__(self, name: str, locator: Locator, handle: ElementHandle | None) -> None:
+        self.name = name
+        self.locator = locator
+        self.handle = handle
+        self.scanned_product: ScannedProduct | None = None
+
+    def __repr__(self) -> str:
+        return f"ProductState(name={self.name!r}, scanned={self.scanned_product is not None})"
+
+
+class SubcategoryState:
+    """Products of a subcategory, with the pending ones (in page order) kept apart.
+
+    Until its products are added (`is_loaded`), the whole subcategory is pending. When its listing
+    is known (same `fingerprint` as a previous scan), its products are `reused` instead.
+    """
+
+    __slots__ = (
+        "name",
+        "locator",
+        "url",
+        "products",
+        "pending",
+        "is_loaded",
+        "listing",
+        "fingerprint",
+        "reused",
+    )
+
+    def __init__(self, name: str, locator: Locator) -> None:
+        self.name = name
+        self.locator = locator
+        # Page of the subcategory, to resume the scan straight from it
+        self.url: str | None = None
+        self.products: list[ProductState] = []
+        # Used as an ordered set
+        self.pending: dict[ProductState, None] = {}
+        self.is_loaded = False
+        # Texts of all the product cells, and their fingerprint (see `utils.listing_fingerprint`)
+        self.listing: list[str] = []
+        self.fingerprint: str | None = None
+        self.reused: list[ScannedProduct] = []
+
+    @property
+    def is_pending(self) -> bool:
+        return not self.is_loaded or bool(self.pending)
+
+    def __repr__(self) -> str:
+        return f"SubcategoryState(name={self.name!r}, pending={len(self.pending)})"
+
+
+class CategoryState:
+    """Subcategories of a category, by name.
+
+    Until its subcategories are added (`is_loaded`), the whole category is pending.
+    """
+
+    __slots__ = ("name", "locator", "subcategories", "scanned_names", "is_loaded")
+
+    def __init__(self, name: str, locator: Locator) -> None:
+        self.name = name
+        self.locator = locator
+        self.subcategories: dict[str, SubcategoryState] = {}
+        # Products already scanned in any of the subcategories
+        self.scanned_names: set[str] = set()
+        self.is_loaded = False
+
+    @property
+    def is_pending(self) -> bool:
+        return not self.is_loaded or any(s.is_pending for s in self.subcategories.values())
+
+    def __repr__(self) -> str:
+        return f"CategoryState(name={self.name!r}, subcategories={len(self.subcategories)})"
 
 
 class ProductsState:
@@ -57,10 +97,19 @@ class ProductsState:
 
     Allow to keep track of the products being scraped and resume the scraping process after a
     failure.
+
+    Products are indexed by category and subcategory, with their names read once (when they are
+    added), so pending lookups only go through the categories and subcategories, and the pending
+    products of one subcategory.
+
+    `known_listings` are the product IDs of the subcategory listings already scanned, by their
+    fingerprint (see `db.get_known_listings`). A subcategory whose listing did not change is not
+    walked: its known products are reused.
     """
 
-    def __init__(self):
-        self.products = []
+    def __init__(self, known_listings: dict[str, list[float]] | None = None) -> None:
+        self.categories: dict[str, CategoryState] = {}
+        self.known_listings = known_listings or {}
         self._is_finished = False
 
     @property
@@ -71,138 +120,89 @@ class ProductsState:
     def is_finished(self, value: bool) -> None:
         self._is_finished = value
 
-    def add_categories(self, categories_locs: list[Locator]) -> None:
-        """Add/sync the categories to the products state."""
-
-        # Sync if categories already exist
-        if len(self.products) > 0:
-            self._sync_categories(categories_locs)
-            return
-
-        # Otherwise, add the categories
-        for category_loc in categories_locs:
-            new_prod_state = ProductState(
-                category_locator=category_loc,
-                category_name=category_loc.inner_text(),
-            )
-            self.products.append(new_prod_state)
-            logger.debug("Added: %s", new_prod_state)
-
-    def add_subcategories(self, category_loc: Locator, subcategories_locs: list[Locator]) -> None:
-        category_name = category_loc.inner_text()
-        index_product_cat_tuples = [
-            p for p in enumerate(self.products) if p[1].category_name == category_name
-        ]
-        if len(index_product_cat_tuples) == 0:
-            raise ValueError(f"Category `{category_name}` not found")
-
-        if len(index_product_cat_tuples) > 1:
-            # Subcategories already added, sync them
-            self._sync_subcategories(category_loc, subcategories_locs)
-            return
+    def add_categories(
+        self, categories_locs: list[Locator], names: list[str] | None = None
+    ) -> None:
+        """Add the categories, or sync the locators of those already added.
 
-        product_cat = index_product_cat_tuples[0][1]
-        index = index_product_cat_tuples[0][0]
-        # Remove the category without subcategories, since we are going to add them
-        self.products.pop(index)
-        for subcategory_loc in subcategories_locs:
-            new_prod_state = ProductState(
-                category_locator=product_cat.category_locator,
-                category_name=product_cat.category_name,
-                subcategory_locator=subcategory_loc,
-                subcategory_name=subcategory_loc.inner_text(),
-            )
-            self.products.append(new_prod_state)
-            logger.debug("Added: %s", new_prod_state)
+        `names` are the texts of the locators, if they were already read (otherwise each locator
+        is read).
+        """
+        if names is None:
+            names = [category_loc.inner_text() for category_loc in categories_locs]
+        for category_loc, name in zip(categories_locs, names):
+            category = self.categories.get(name)
+            if category is None:
+                category = self.categories[name] = CategoryState(name, category_loc)
+                logger.debug("Added: %s", category)
+            else:
+                category.locator = category_loc
+                logger.debug("Synced categ: %s", category)
+
+    def add_subcategories(
+        self,
+        category_loc: Locator,
+        subcategories_locs: list[Locator],
+        names: list[str] | None = None,
+    ) -> None:
+        """Add the subcategories of a category, or sync the locators of those already added."""
+        category = self._get_category(category_loc)
+        if names is None:
+            names = [subcategory_loc.inner_text() for subcategory_loc in subcategories_locs]
+        for subcategory_loc, name in zip(subcategories_locs, names):
+            subcategory = category.subcategories.get(name)
+            if subcategory is None:
+                subcategory = category.subcategories[name] = SubcategoryState(name, subcategory_loc)
+                logger.debug("Added: %s", subcategory)
+            else:
+                subcategory.locator = subcategory_loc
+                logger.debug("Synced subcateg: %s", subcategory)
+        category.is_loaded = True
 
     def add_products(
         self,
         category_loc: Locator,
         subcategory_loc: Locator,
         products_locs: list[Locator],
+        names: list[str] | None = None,
+        handles: list[ElementHandle] | None = None,
+        listed_ids: dict[str, float] | None = None,
     ) -> None:
-        category_name = category_loc.inner_text()
-
-        # Ensure the category exists
-        products_cat = [p for p in self.products if p.category_name == category_name]
-        if len(products_cat) == 0:
-            raise ValueError(f"Category `{category_name}` not found")
-
-        # 1.- Search products with the same category and subcategory
-        subcategory_name = subcategory_loc.inner_text()
-        index_product_subcat_tuples = []
-        for i, p in enumerate(self.products):
-            # Only check subcategories of the belonging to the given category
-            if p.category_name == category_name and p.subcategory_name == subcategory_name:
-                index_product_subcat_tuples.append((i, p))
-
-        if len(index_product_subcat_tuples) == 0:
-            raise ValueError(f"Subcategory `{subcategory_name}` not found")
-
-        # 2.- Two scenarios: (i) only the subcategory has been added or (ii) the subcategory and
-        # product has been previously added.
-        # 2.1.- In the first case, we need to remove the subcategory (which has no products), since
-        # we are going to add them
-        if len(index_product_subcat_tuples) == 1:
-            assert index_product_subcat_tuples[0][1].product_handle is None
-            index = index_product_subcat_tuples[0][0]
-            self.products.pop(index)
-
-            product_subcat = index_product_subcat_tuples[0][1]
-
-            # Ensure the subcategory product locator is not stale
-            product_subcat.subcategory_locator.inner_text()
-
-        # 2.2.- In the second case, we need to take the subcategory info of a non-stale product
-        elif len(index_product_subcat_tuples) > 1:
-            # Take a non stale product (those with scanned_product are not synced anymore, so they
-            # are stale)
-            products_subcat = [
-                ipc[1]
-                for ipc in index_product_subcat_tuples
-                if ipc[1].product_handle and not ipc[1].scanned_product
-            ]
-            product_subcat = products_subcat[0]
-
-        else:
-            raise ValueError("Unexpected state while adding products")
-
-        # Create new products
-        new_prods_state = []
-        for product_loc in products_locs:
-            logger.debug("URL checked for: %s", product_loc)
-            new_prods_state.append(
-                ProductState(
-                    category_locator=product_subcat.category_locator,
-                    category_name=product_subcat.category_name,
-                    subcategory_locator=product_subcat.subcategory_locator,
-                    subcategory_name=product_subcat.subcategory_name,
-                    product_locator=product_loc,
-                    product_handle=product_loc.element_handle(),
-                    product_name=product_loc.inner_text(),
-                )
-            )
+        """Add the products listed in a subcategory page.
 
-        # Remove pending products in self.products which are going to be added/synced
-        for product in self.products[:]:
-            if product in new_prods_state:
-                self.products.remove(product)
+        The pending products of a previous load are replaced, since their handles belong to a page
+        which is gone. Since the same product can be in different subcategories (e.g, Carnes ->
+        Carne congelada and Congelados -> Carne), those already scanned in the category are
+        skipped.
 
-        # Remove products which are already scanned. Since the same product can be in different
-        # categories/subcategories (e.g, Carnes -> Carne congelada and Congelados -> Carne), we
-        # need to check the product name and the category/subcategory
-        products_scanned = [p for p in self.products if p.scanned_product]
-        products_scanned_names = [f"{p.category_name}_{p.product_name}" for p in products_scanned]
-        for product in new_prods_state[:]:
-            cat_and_name = f"{product.category_name}_{product.product_name}"
-            if cat_and_name in products_scanned_names:
-                new_prods_state.remove(product)
+        `names` and `handles` are those of `products_locs`, if they were already read.
+        `listed_ids` are the IDs of the products by name, if they were captured from the listing:
+        a known listing is not reused if they show other products behind the same names.
+        """
+        category = self._get_category(category_loc)
+        subcategory = self._get_subcategory(category, subcategory_loc)
+
+        if names is None:
+            names = [product_loc.inner_text() for product_loc in products_locs]
+        subcategory.listing = names
+        subcategory.fingerprint = utils.listing_fingerprint(category.name, subcategory.name, names)
+        known_ids = self.known_listings.get(subcategory.fingerprint)
+        if known_ids is not None and self._is_known_listing(names, known_ids, listed_ids or {}):
+            self._reuse_listing(category, subcategory, known_ids)
+            return
 
-        # Add the new products
-        self.products.extend(new_prods_state)
+        new_products = []
+        for i, (product_loc, name) in enumerate(zip(products_locs, names)):
+            if name in category.scanned_names:
+                continue
+            handle = handles[i] if handles is not None else product_loc.element_handle()
+            new_products.append(ProductState(name, product_loc, handle))
 
-        for new_prod_state in new_prods_state:
-            logger.debug("Added: %s, %s", new_prod_state, new_prod_state.product_handle)
+        subcategory.products = [p for p in subcategory.products if p.scanned_product is not None]
+        subcategory.products.extend(new_products)
+        subcategory.pending = dict.fromkeys(new_products)
+        subcategory.is_loaded = True
+        logger.debug("Added %s products to %s", len(new_products), subcategory)
 
     def add_scanned_product(
         self,
@@ -211,79 +211,65 @@ class ProductsState:
         product_handle: ElementHandle,
         scanned_product: ScannedProduct,
     ) -> None:
-        category_name = category_loc.inner_text()
-        products_cat = [p for p in self.products if p.category_name == category_name]
-        if len(products_cat) == 0:
-            raise ValueError(f"Category `{category_name}` not found")
-
-        subcategory_name = subcategory_loc.inner_text()
-        products_subcat = []
-        for p in products_cat:
-            # Only check subcategories of the belonging to the given category
-            if p.subcategory_name == subcategory_name:
-                products_subcat.append((p))
-
-        if len(products_subcat) == 0:
-            raise ValueError(f"Subcategory `{subcategory_name}` not found")
-
-        input_product_name = product_handle.inner_text()
-        for p in products_subcat:
-            if (
-                p.scanned_product is None
-                and p.product_handle is not None
-                and p.product_handle.inner_text() == input_product_name
-            ):
-                p.scanned_product = scanned_product
-                logger.debug("Scanned: %s", p)
-                return
+        category = self._get_category(category_loc)
+        subcategory = self._get_subcategory(category, subcategory_loc)
+
+        # The handle is usually one of `get_pending_products`, otherwise match it by its name
+        product = next((p for p in subcategory.pending if p.handle is product_handle), None)
+        if product is None:
+            name = product_handle.inner_text()
+            product = next((p for p in subcategory.pending if p.name == name), None)
+        if product is not None:
+            self._set_scanned(category, subcategory, product, scanned_product)
+
+    def scan_listed_products(
+        self,
+        category_name: str,
+        subcategory_name: str,
+        ids_by_name: dict[str, float],
+    ) -> int:
+        """Scan the pending products of a subcategory whose ID is known from its listing.
 
-    def get_pending_categories(self) -> list[Locator]:
-        pending_categories_set = set()
-        for product in self.products:
-            if product.scanned_product is None:
-                # Add only the category information
-                pending_categories_set.add(
-                    ProductState(
-                        category_locator=product.category_locator,
-                        category_name=product.category_locator.inner_text(),
-                    )
-                )
+        Product cells are matched by their name (the first line of their text). Products which
+        are not matched stay pending, to be scanned by opening them.
 
-        # Sort pending categories by the alphabetical order of the category name
-        pending_categories = list(pending_categories_set)
-        pending_categories = sorted(pending_categories, key=lambda x: x.category_name)
-        for pc in pending_categories:
-            logger.debug("Pending categs: %s", pc)
-        pending_categories_locs = [p.category_locator for p in pending_categories]
-        return pending_categories_locs
+        Returns:
+            int: The number of products scanned.
+        """
+        category = self.categories.get(category_name)
+        subcategory = category.subcategories.get(subcategory_name) if category else None
+        if category is None or subcategory is None:
+            return 0
+
+        n_scanned = 0
+        scanned_at = datetime.now()
+        for product in list(subcategory.pending):
+            product_id = ids_by_name.get(utils.listing_name(product.name))
+            if product_id is None:
+                continue
+            scanned_product = ScannedProduct(
+                product_id=product_id,
+                category_name=category_name,
+                subcategory_name=subcategory_name,
+                scanned_at=scanned_at,
+            )
+            self._set_scanned(category, subcategory, product, scanned_product)
+            n_scanned += 1
+        return n_scanned
 
-    def get_pending_subcategories(self, category_loc: Locator) -> list[Locator]:
-        pending_subcategories_set = set()
-        for product in self.products:
-            if (
-                product.subcategory_name is not None
-                and product.scanned_product is None
-                and product.category_locator == category_loc
-            ):
-                # Add only the category and subcategory information
-                pending_subcategories_set.add(
-                    ProductState(
-                        category_locator=product.category_locator,
-                        category_name=product.category_locator.inner_text(),
-                        subcategory_locator=product.subcategory_locator,
-                        subcategory_name=product.subcategory_locator.inner_text(),
-                    )
-                )
+    def get_pending_categories(self) -> list[Locator]:
+        pending_categories = self._pending_categories()
+        logger.debug("Pending categs: %s", pending_categories)
+        return [c.locator for c in pending_categories]
 
-        # Sort pending subcategories by the alphabetical order of the subcategory name
-        pending_subcategories = list(pending_subcategories_set)
-        pending_subcategories = sorted(pending_subcategories, key=lambda x: str(x.subcategory_name))
-        for ps in pending_subcategories:
-            logger.debug("Pending subcategs: %s", ps)
-        pending_subcategories_locs = [p.subcategory_locator for p in pending_subcategories]
-        pending_subcategories_locs_clean = [p for p in pending_subcategories_locs if p is not None]
+    def get_pending_subcategories(self, category_loc: Locator) -> list[Locator]:
+        category = self._find_category(category_loc)
+        if category is None:
+            return []
 
-        return pending_subcategories_locs_clean
+        pending_subcategories = self._pending_subcategories(category)
+        logger.debug("Pending subcategs: %s", pending_subcategories)
+        return [s.locator for s in pending_subcategories]
 
     def get_pending_products(
         self,
@@ -293,63 +279,196 @@ class ProductsState:
         if subcategory_loc is None:
             raise ValueError("Subcategory locator cannot be None")
 
-        pending_products_set = set()
-        for product in self.products:
-            if (
-                product.scanned_product is None
-                and product.category_locator == category_loc
-                and product.subcategory_locator == subcategory_loc
-            ):
-                pending_products_set.add(product)
+        category = self._find_category(category_loc)
+        subcategory = self._find_subcategory(category, subcategory_loc) if category else None
+        if subcategory is None:
+            return []
+        return [p.handle for p in subcategory.pending if p.handle is not None]
 
-        # Sort pending products by the alphabetical order of the product locator
-        pending_products = list(pending_products_set)
-        pending_products = sorted(pending_products, key=lambda x: str(x.product_locator))
+    def set_subcategory_url(
+        self, category_loc: Locator, subcategory_loc: Locator, url: str
+    ) -> None:
+        category = self._get_category(category_loc)
+        self._get_subcategory(category, subcategory_loc).url = url
 
-        pending_products_handles = [p.product_handle for p in pending_products]
-        pending_products_handles = [p for p in pending_products_handles if p is not None]
-        for pending_product_handle in pending_products_handles:
-            pending_product_handle.inner_text()
+    def pop_resume_url(self) -> str | None:
+        """URL of the next pending subcategory, if it was loaded before.
 
-        return pending_products_handles
+        The URL is only given once: if the scan fails again before the subcategory is loaded,
+        the next try starts from the home page.
+        """
+        pending_categories = self._pending_categories()
+        if not pending_categories:
+            return None
+        pending_subcategories = self._pending_subcategories(pending_categories[0])
+        if not pending_subcategories:
+            return None
+
+        subcategory = pending_subcategories[0]
+        url, subcategory.url = subcategory.url, None
+        return url
+
+    def get_names(self, category_loc: Locator, subcategory_loc: Locator) -> tuple[str, str]:
+        """Names of a category and one of its subcategories, without reading the page."""
+        category = self._get_category(category_loc)
+        return category.name, self._get_subcategory(category, subcategory_loc).name
+
+    def merge(self, other: "ProductsState") -> None:
+        """Add the products of another state, e.g. of a category scanned by another worker."""
+        for name, other_category in other.categories.items():
+            category = self.categories.setdefault(name, other_category)
+            if category is other_category:
+                continue
+
+            category.is_loaded |= other_category.is_loaded
+            category.scanned_names |= other_category.scanned_names
+            for subcategory_name, other_subcategory in other_category.subcategories.items():
+                subcategory = category.subcategories.setdefault(subcategory_name, other_subcategory)
+                if subcategory is not other_subcategory:
+                    subcategory.is_loaded |= other_subcategory.is_loaded
+                    subcategory.products.extend(other_subcategory.products)
+                    subcategory.pending.update(other_subcategory.pending)
+                    subcategory.reused.extend(other_subcategory.reused)
+                    if other_subcategory.fingerprint is not None:
+                        subcategory.listing = other_subcategory.listing
+                        subcategory.fingerprint = other_subcategory.fingerprint
 
     def get_scanned_products(self) -> list[ScannedProduct]:
         scanned_products = [
-            p.scanned_product for p in self.products if p.scanned_product is not None
+            p.scanned_product
+            for category in self.categories.values()
+            for subcategory in category.subcategories.values()
+            for p in subcategory.products
+            if p.scanned_product is not None
         ]
+        scanned_products.extend(
+            p
+            for category in self.categories.values()
+            for subcategory in category.subcategories.values()
+            for p in subcategory.reused
+        )
         for sp in scanned_products:
             logger.debug("Scanned product: %s", sp)
         return scanned_products
 
-    def _sync_categories(self, categories_locs: list[Locator]) -> None:
-        """
-        Sync the *pending* categories with the provided new locators.
-        Notice that all elements containing those categories will be synced, which may include
-        categories, subcategories and products.
-        """
-        for product in self.products:
-            if product.scanned_product:
-                continue
-
-            for categories_loc in categories_locs:
-                if product.category_name == categories_loc.inner_text():
-                    product.category_locator = categories_loc
-                    logger.debug("Synced categ: %s", product)
+    def get_new_listings(self) -> list[HtmlCategoryDB]:
+        """Fingerprints of the subcategories walked in full, with the IDs of their products.
 
-    def _sync_subcategories(self, category_loc: Locator, subcategories_locs: list[Locator]) -> None:
-        """
-        Sync the *pending* subcategories with the provided new locators.
-        Notice that all elements containing those subcategories will be synced, which may include
-        subcategories and products.
+        Products skipped in a subcategory (already scanned in another one of the category) take
+        their ID from there. Subcategories with a product without ID are left out, so they are
+        walked again by the next scan.
         """
-        category_name = category_loc.inner_text()
-        products_cat = [p for p in self.products if p.category_name == category_name]
+        listings = []
+        for category in self.categories.values():
+            ids_by_name = {
+                p.name: p.scanned_product.product_id
+                for subcategory in category.subcategories.values()
+                for p in subcategory.products
+                if p.scanned_product is not None
+            }
+            for subcategory in category.subcategories.values():
+                if subcategory.fingerprint is None or subcategory.reused or subcategory.is_pending:
+                    continue
+                if any(name not in ids_by_name for name in subcategory.listing):
+                    logger.debug("Listing without all the IDs: %s", subcategory)
+                    continue
+                product_ids = [ids_by_name[name] for name in subcategory.listing]
+                listings.append(
+                    HtmlCategoryDB(
+                        html="\n".join(subcategory.listing),
+                        category_name=category.name,
+                        subcategory_name=subcategory.name,
+                        hash_value=subcategory.fingerprint,
+                        product_ids=product_ids,
+                    )
+                )
+        return listings
 
-        for product in products_cat:
-            if product.scanned_product:
-                continue
+    def _pending_categories(self) -> list[CategoryState]:
+        # Sort pending categories by the alphabetical order of the category name
+        return sorted((c for c in self.categories.values() if c.is_pending), key=lambda c: c.name)
 
-            for subcategory_loc in subcategories_locs:
-                if product.subcategory_name == subcategory_loc.inner_text():
-                    product.subcategory_locator = subcategory_loc
-                    logger.debug("Synced subcateg: %s", product)
+    @staticmethod
+    def _pending_subcategories(category: CategoryState) -> list[SubcategoryState]:
+        # Sort pending subcategories by the alphabetical order of the subcategory name
+        return sorted(
+            (s for s in category.subcategories.values() if s.is_pending), key=lambda s: s.name
+        )
+
+    @staticmethod
+    def _is_known_listing(
+        names: list[str], known_ids: list[float], listed_ids: dict[str, float]
+    ) -> bool:
+        # A product may be replaced by a new one with the same name (and a new ID)
+        known = set(known_ids)
+        for name in names:
+            product_id = listed_ids.get(utils.listing_name(name))
+            if product_id is not None and product_id not in known:
+                logger.info("Known listing with a new product: %s (%s)", name, product_id)
+                return False
+        return True
+
+    @staticmethod
+    def _reuse_listing(
+        category: CategoryState, subcategory: SubcategoryState, product_ids: list[float]
+    ) -> None:
+        # Products walked by a previous try are dropped too, the known ones are the whole listing.
+        # Their names are not added to the scanned ones of the category, so a subcategory walked
+        # still scans the products it shares with this one (and gets the IDs of its listing).
+        scanned_at = datetime.now()
+        subcategory.reused = [
+            ScannedProduct(
+                product_id=product_id,
+                category_name=category.name,
+                subcategory_name=subcategory.name,
+                scanned_at=scanned_at,
+            )
+            for product_id in product_ids
+        ]
+        subcategory.products = []
+        subcategory.pending = {}
+        subcategory.is_loaded = True
+        logger.info("Unchanged listing, reused %s products of %s", len(product_ids), subcategory)
+
+    @staticmethod
+    def _set_scanned(
+        category: CategoryState,
+        subcategory: SubcategoryState,
+        product: ProductState,
+        scanned_product: ScannedProduct,
+    ) -> None:
+        product.scanned_product = scanned_product
+        del subcategory.pending[product]
+        category.scanned_names.add(product.name)
+        logger.debug("Scanned: %s", product)
+
+    def _find_category(self, category_loc: Locator) -> CategoryState | None:
+        # Locators are usually those returned by `get_pending_categories`, so their text is only
+        # read when they are not
+        for category in self.categories.values():
+            if category.locator is category_loc:
+                return category
+        return self.categories.get(category_loc.inner_text())
+
+    @staticmethod
+    def _find_subcategory(
+        category: CategoryState, subcategory_loc: Locator
+    ) -> SubcategoryState | None:
+        for subcategory in category.subcategories.values():
+            if subcategory.locator is subcategory_loc:
+                return subcategory
+        return category.subcategories.get(subcategory_loc.inner_text())
+
+    def _get_category(self, category_loc: Locator) -> CategoryState:
+        category = self._find_category(category_loc)
+        if category is None:
+            raise ValueError(f"Category `{category_loc.inner_text()}` not found")
+        return category
+
+    def _get_subcategory(
+        self, category: CategoryState, subcategory_loc: Locator
+    ) -> SubcategoryState:
+        subcategory = self._find_subcategory(category, subcategory_loc)
+        if subcategory is None:
+            raise ValueError(f"Subcategory `{subcategory_loc.inner_text()}` not found")
+        return subcategory
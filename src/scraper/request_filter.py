@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from playwright._impl._errors import Error as pw_Error
+
+from src.config.logger import logger
+
+# Only text and URLs are read, so these are never needed
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media"})
+# Third-party analytics and tracking
+DENY_PATTERNS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "hotjar.com",
+    "nr-data.net",
+    "newrelic.com",
+    "clarity.ms",
+    "onetrust.com",
+)
+# Static assets of the web app, kept on disk between runs
+CACHED_RESOURCE_TYPES = frozenset({"script", "stylesheet"})
+CACHE_DIR = Path(os.environ.get("SCAN_CACHE_DIR", ".scan_cache"))
+CACHE_MAX_AGE_SECONDS = 24 * 60 * 60
+# Not valid anymore once the body is stored decoded
+DROPPED_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding"})
+
+
+def _env_patterns(name: str) -> tuple[str, ...]:
+    return tuple(p.strip() for p in os.environ.get(name, "").split(",") if p.strip())
+
+
+class RequestFilter:
+    """Route handler of the scanner pages: block what is not needed and cache what is.
+
+    Register it with `page.route("**/*", request_filter.handle)` (`handle_async` for pages of the
+    async API). Requests are aborted when their
+    resource type is blocked or their URL matches a deny pattern, unless it matches an allow
+    pattern. Scripts and stylesheets are served from a cache on disk (`CACHE_DIR`) that survives
+    between runs, since Playwright disables the browser HTTP cache for routed pages.
+
+    Extra patterns can be set with `SCAN_ALLOW` and `SCAN_DENY` (comma separated).
+    """
+
+    def __init__(
+        self,
+        blocked_types: frozenset[str] = BLOCKED_RESOURCE_TYPES,
+        allow: tuple[str, ...] = (),
+        deny: tuple[str, ...] = DENY_PATTERNS,
+        cache_dir: Path | None = CACHE_DIR,
+    ) -> None:
+        self.blocked_types = blocked_types
+        self.allow = allow + _env_patterns("SCAN_ALLOW")
+        self.deny = deny + _env_patterns("SCAN_DENY")
+        self.cache_dir = cache_dir
+        # Blocked requests by resource type
+        self.n_blocked: Counter[str] = Counter()
+        self.n_cache_hits = 0
+        self.cache_hit_bytes = 0
+        self.n_fetched = 0
+        self.fetched_bytes = 0
+
+    def is_blocked(self, url: str, resource_type: str) -> bool:
+        if any(pattern in url for pattern in self.allow):
+            return False
+        return resource_type in self.blocked_types or any(pattern in url for pattern in self.deny)
+
+    def handle(self, route) -> None:
+        request = route.request
+        if self._count_blocked(request):
+            route.abort()
+            return
+
+        paths = self._cache_paths(request)
+        if paths is None:
+            route.continue_()
+            return
+
+        cached = self._read(*paths)
+        if cached is not None:
+            headers, body = cached
+            self._count_cache_hit(body)
+            route.fulfill(status=200, headers=headers, body=body)
+            return
+
+        try:
+            response = route.fetch()
+        except pw_Error as exc:
+            logger.debug("Fetch of %s failed, let the browser retry: %s", request.url, exc)
+            route.continue_()
+            return
+        body = response.body()
+        self._count_fetched(body)
+        if response.ok:
+            self._write(*paths, self._cached_headers(response.headers), body)
+        route.fulfill(response=response, body=body)
+
+    async def handle_async(self, route) -> None:
+        """Same as `handle`, for pages of the async Playwright API.
+
+        The cache on disk is read and written in a thread, so the event loop is not blocked.
+        """
+        request = route.request
+        if self._count_blocked(request):
+            await route.abort()
+            return
+
+        paths = self._cache_paths(request)
+        if paths is None:
+            await route.continue_()
+            return
+
+        cached = await asyncio.to_thread(self._read, *paths)
+        if cached is not None:
+            headers, body = cached
+            self._count_cache_hit(body)
+            await route.fulfill(status=200, headers=headers, body=body)
+            return
+
+        try:
+            response = await route.fetch()
+        except pw_Error as exc:
+            logger.debug("Fetch of %s failed, let the browser retry: %s", request.url, exc)
+            await route.continue_()
+            return
+        body = await response.body()
+        self._count_fetched(body)
+        if response.ok:
+            headers = self._cached_headers(response.headers)
+            await asyncio.to_thread(self._write, *paths, headers, body)
+        await route.fulfill(response=response, body=body)
+
+    def _count_blocked(self, request) -> bool:
+        if not self.is_blocked(request.url, request.resource_type):
+            return False
+        self.n_blocked[request.resource_type] += 1
+        return True
+
+    def _cache_paths(self, request) -> tuple[Path, Path] | None:
+        """Where the request is cached, None if it is not cached."""
+        if (
+            self.cache_dir is None
+            or request.method != "GET"
+            or request.resource_type not in CACHED_RESOURCE_TYPES
+        ):
+            return None
+        body_path = self.cache_dir / hashlib.sha256(request.url.encode()).hexdigest()
+        return body_path, body_path.with_suffix(".json")
+
+    def _count_cache_hit(self, body: bytes) -> None:
+        self.n_cache_hits += 1
+        self.cache_hit_bytes += len(body)
+
+    def _count_fetched(self, body: bytes) -> None:
+        self.n_fetched += 1
+        self.fetched_bytes += len(body)
+
+    @staticmethod
+    def _cached_headers(headers: dict[str, str]) -> dict[str, str]:
+        return {k: v for k, v in headers.items() if k not in DROPPED_HEADERS}
+
+    @staticmethod
+    def _read(body_path: Path, headers_path: Path) -> tuple[dict[str, str], bytes] | None:
+        try:
+            if time.time() - body_path.stat().st_mtime > CACHE_MAX_AGE_SECONDS:
+                return None
+            return json.loads(headers_path.read_text(encoding="utf-8")), body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, body_path: Path, headers_path: Path, headers: dict, body: bytes) -> None:
+        # Written aside and renamed, so parallel scanners never read a partial entry
+        try:
+            body_path.parent.mkdir(parents=True, exist_ok=True)
+            suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+            for path, content in (
+                (headers_path, json.dumps(headers).encode()),
+                (body_path, body),
+            ):
+                tmp_path = path.with_name(path.name + suffix)
+                tmp_path.write_bytes(content)
+                os.replace(tmp_path, path)
+        except OSError as exc:
+            logger.debug("Cannot cache %s: %s", body_path, exc)
+
+    def log_stats(self) -> None:
+        logger.info(
+            "Requests blocked: %s (%s). From the disk cache: %s (%.1f KB). Fetched: %s (%.1f KB)",
+            sum(self.n_blocked.values()),
+            dict(self.n_blocked),
+            self.n_cache_hits,
+            self.cache_hit_bytes / 1024,
+            self.n_fetched,
+            self.fetched_bytes / 1024,
+        )
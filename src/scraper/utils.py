@@ -1,7 +1,13 @@
+import hashlib
 import re
+from typing import Callable, TypeVar
 
 import validators
 
+from src.sharding import Shard
+
+T = TypeVar("T")
+
 
 def extract_product_id_from_url(url: str) -> float:
     if not validators.url(url):
@@ -15,3 +21,58 @@ def extract_product_id_from_url(url: str) -> float:
         return float(match.group(1))
     else:
         raise ValueError(f"Product ID not found in URL: {url}")
+
+
+def extract_category_id_from_url(url: str) -> int | None:
+    match = re.search(r"/categories/(\d+)", url)
+    return int(match.group(1)) if match else None
+
+
+def listing_name(cell_text: str) -> str:
+    """Name of a product from the text of its cell (the first line, the rest is its price)."""
+    return cell_text.split("\n")[0].strip()
+
+
+def listing_fingerprint(category_name: str, subcategory_name: str, cell_texts: list[str]) -> str:
+    """Hash of a subcategory listing: its product names and their count.
+
+    Names are sorted, so the listing is only considered changed when products are added or
+    removed, not when they are shown in another order or their prices change.
+    """
+    names = sorted(listing_name(text) for text in cell_texts)
+    content = "\n".join([category_name, subcategory_name, str(len(names)), *names])
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def sample_categories(
+    categories_all: list[T],
+    partial_scan: str | None = None,
+    shard: Shard | None = None,
+    name: Callable[[T], str] = str,
+) -> list[T]:
+    """Keep the part of the (top-level) categories to scan, identified by their `name`."""
+    if shard is not None:
+        return [category for category in categories_all if shard.contains(name(category))]
+
+    if partial_scan is None:
+        return categories_all
+
+    total_len = len(categories_all)
+    quarter_size = total_len // 4
+
+    if partial_scan == "first_quarter":
+        return categories_all[:quarter_size]
+    if partial_scan == "second_quarter":
+        return categories_all[quarter_size : 2 * quarter_size]
+    if partial_scan == "third_quarter":
+        return categories_all[2 * quarter_size : 3 * quarter_size]
+    if partial_scan == "fourth_quarter":
+        return categories_all[3 * quarter_size :]
+
+    # Keep backward compatibility with old two-part system
+    if partial_scan == "first_half":
+        return categories_all[: total_len // 2]
+    if partial_scan == "second_half":
+        return categories_all[total_len // 2 :]
+
+    raise ValueError("Invalid value for `partial_scan`")
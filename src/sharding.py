@@ -0,0 +1,48 @@
+import hashlib
+
+from pydantic import BaseModel, model_validator
+
+
+class Shard(BaseModel):
+    """One of `count` shards (`index` is 1-based, as in `--shard 2/4`).
+
+    Keys are assigned with rendezvous (highest random weight) hashing: every key picks the shard
+    with the highest hash of `(key, shard)`. The assignment is stable across processes and
+    machines, balanced for any number of shards and, when a shard is added, only the keys moving
+    to the new shard (~1/N) change owner.
+    """
+
+    index: int
+    count: int
+
+    @model_validator(mode="after")
+    def _check_bounds(self) -> "Shard":
+        if self.count < 1 or not 1 <= self.index <= self.count:
+            raise ValueError(f"Invalid shard {self.index}/{self.count}")
+        return self
+
+    @classmethod
+    def parse(cls, value: str) -> "Shard":
+        """Parse a shard from its `i/N` representation."""
+        try:
+            index, count = value.split("/")
+            return cls(index=int(index), count=int(count))
+        except ValueError as exc:
+            raise ValueError(f"Invalid shard `{value}`, expected `i/N` (e.g. `1/4`)") from exc
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    def contains(self, key: str) -> bool:
+        return shard_of(key, self.count) == self.index
+
+
+def shard_of(key: str, count: int) -> int:
+    """Return the 1-based shard that owns `key` among `count` shards."""
+    weights = [_weight(key, index) for index in range(1, count + 1)]
+    return weights.index(max(weights)) + 1
+
+
+def _weight(key: str, index: int) -> int:
+    digest = hashlib.blake2b(f"{key}/{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
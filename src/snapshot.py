@@ -0,0 +1,95 @@
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.config.logger import logger
+
+# Low cardinality strings are dictionary encoded (in memory and in the Parquet files)
+DICT_STRING = pa.dictionary(pa.int32(), pa.string())
+
+SNAPSHOT_SCHEMA = pa.schema(
+    [
+        ("product_id", pa.float64()),
+        ("unit_price", pa.float64()),
+        ("bulk_price", pa.float64()),
+        ("reference_price", pa.float64()),
+        ("reference_format", DICT_STRING),
+        ("category", DICT_STRING),
+        ("subcategory", DICT_STRING),
+        ("supplier", DICT_STRING),
+        ("observed_at", pa.timestamp("s")),
+        # Partition columns
+        ("date", pa.string()),
+        ("category_id", pa.int32()),
+    ]
+)
+PARTITION_COLS = ["date", "category_id"]
+PARTITIONING = ds.partitioning(
+    pa.schema([SNAPSHOT_SCHEMA.field(name) for name in PARTITION_COLS]), flavor="hive"
+)
+
+
+def snapshot_row(record: dict, observed_at: datetime) -> dict:
+    """Flatten a parsed storage record (a `FullInfo` dump) into a snapshot row."""
+    categories = record["categories"]
+    top_category = next((c for c in categories if c["level"] == 0), None)
+    subcategory = next((c for c in categories if c["level"] == 1), None)
+    price = record["price_instruction"]
+    return {
+        "product_id": record["product"]["id"],
+        "unit_price": price.get("unit_price"),
+        "bulk_price": price.get("bulk_price"),
+        "reference_price": price.get("reference_price"),
+        "reference_format": price.get("reference_format"),
+        "category": top_category["name"] if top_category else None,
+        "subcategory": subcategory["name"] if subcategory else None,
+        "supplier": record["supplier"]["name"],
+        "observed_at": observed_at,
+        "date": observed_at.date().isoformat(),
+        "category_id": top_category["id"] if top_category else -1,
+    }
+
+
+class SnapshotWriter:
+    """Collect the prices observed in a run and write them as a columnar Parquet snapshot.
+
+    The snapshot is a Hive partitioned dataset (`<root>/date=YYYY-MM-DD/category_id=N/`), one
+    partition per day and top-level category, so analysts can read a day or a category without
+    touching the database. Each run writes its own files, so several runs of the same day (e.g.
+    different shards) add up.
+    """
+
+    def __init__(self, root_dir: str | Path) -> None:
+        self.root_dir = Path(root_dir)
+        self.rows: list[dict] = []
+
+    def add(self, records: list[dict]) -> None:
+        observed_at = datetime.now().replace(microsecond=0)
+        self.rows.extend(snapshot_row(record, observed_at) for record in records)
+
+    def to_table(self) -> pa.Table:
+        return pa.Table.from_pylist(self.rows, schema=SNAPSHOT_SCHEMA)
+
+    def close(self) -> None:
+        if not self.rows:
+            return
+
+        pq.write_to_dataset(
+            self.to_table(),
+            root_path=str(self.root_dir),
+            partition_cols=PARTITION_COLS,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        logger.info("Wrote snapshot of %s prices to %s", len(self.rows), self.root_dir)
+        self.rows = []
+
+
+def read_snapshot(root_dir: str | Path, date: str | None = None) -> pa.Table:
+    """Read a snapshot (all the days, or only `date` as YYYY-MM-DD)."""
+    filters = [("date", "=", date)] if date is not None else None
+    return pq.read_table(str(root_dir), filters=filters, partitioning=PARTITIONING)
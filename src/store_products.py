@@ -5,18 +5,8 @@ import httpx
 
 from src import db
 from src.config.logger import logger
-from src.models import (
-    Badge,
-    Category,
-    FullInfo,
-    NutritionInformation,
-    Photo,
-    PriceInstruction,
-    Product,
-    ProductCategory,
-    Supplier,
-)
-from src.scraper.info_parser import InfoParser
+from src.models import ProductCategory
+from src.scraper.extractor import extract_full_info
 
 API_URL_TEMPLATE = os.environ.get("API_URL_TEMPLATE", "empty_url")
 if not API_URL_TEMPLATE or API_URL_TEMPLATE == "empty_url":
@@ -39,26 +29,22 @@ def main():
 
 
 def store_product(item: dict) -> None:
-    badge_data = InfoParser.badge(item)
-    bagde_id = db.insert_badge(Badge(**badge_data))
+    full_info = extract_full_info(item)
 
-    supplier_data = InfoParser.supplier(item)
-    supplier_id = db.insert_supplier(Supplier(**supplier_data))
+    bagde_id = db.insert_badge(full_info.badge)
+    supplier_id = db.insert_supplier(full_info.supplier)
 
-    product_data = InfoParser.product(item)
-    product_data["badge_id"] = bagde_id
-    product_data["supplier_id"] = supplier_id
-    product_id = db.insert_product(Product(**product_data))
+    product = full_info.product.model_copy(
+        update={"badge_id": bagde_id, "supplier_id": supplier_id}
+    )
+    product_id = db.insert_product(product)
 
-    photos_data = InfoParser.photo(item)
-    for photo_data in photos_data:
-        photo_data["product_id"] = product_id
-        db.insert_photo(Photo(**photo_data))
+    for photo in full_info.photos:
+        db.insert_photo(photo)
 
-    categories_data = InfoParser.category(item)
     categories_ids = []
-    for category_data in categories_data:
-        categories_ids.append(db.insert_category(Category(**category_data)))
+    for category in full_info.categories:
+        categories_ids.append(db.insert_category(category))
 
     for category_id in categories_ids:
         db.insert_product_category(
@@ -68,20 +54,5 @@ def store_product(item: dict) -> None:
             )
         )
 
-    price_data = InfoParser.price_instruction(item)
-    price_data["product_id"] = product_id
-    db.insert_price_instruction(PriceInstruction(**price_data))
-
-    nutrition_data = InfoParser.nutrition_information(item)
-    nutrition_data["product_id"] = product_id
-    db.insert_nutrition_information(NutritionInformation(**nutrition_data))
-
-    _ = FullInfo(
-        product=Product(**product_data),
-        badge=Badge(**badge_data),
-        supplier=Supplier(**supplier_data),
-        photos=[Photo(**photo_data) for photo_data in photos_data],
-        categories=[Category(**category_data) for category_data in categories_data],
-        price_instruction=PriceInstruction(**price_data),
-        nutrition_information=NutritionInformation(**nutrition_data),
-    )
+    db.insert_price_instruction(full_info.price_instruction)
+    db.insert_nutrition_information(full_info.nutrition_information)
@@ -1,26 +1,24 @@
 import asyncio
 import os
+import socket
 import time
+from array import array
 from enum import Enum
 from pathlib import Path
 from typing import Any
 
 import httpx
-from pydantic import BaseModel
 
 from src import db
+from src.alerts import AlertEngine
+from src.category_aggregates import CategoryAggregator
+from src.circuit_breaker import CircuitBreaker, PayloadSpool
 from src.config.logger import logger
-from src.models import (
-    Badge,
-    Category,
-    FullInfo,
-    NutritionInformation,
-    Photo,
-    PriceInstruction,
-    Product,
-    Supplier,
-)
-from src.scraper.info_parser import InfoParser
+from src.deadline import Deadline
+from src.parse_pool import ParsePool, RecordSink, parse_responses
+from src.refresh_scheduler import RefreshScheduler
+from src.sharding import Shard
+from src.snapshot import SnapshotWriter
 from src.vpn import AsyncCustomHost, NameSolver, Vpn
 
 VPN_CFG_FOLDER_PATH: Path | None = Path("vpn_configs")
@@ -34,22 +32,67 @@ CF_URL = os.environ.get("CF_URL")
 if not CF_URL:
     raise ValueError("CF_URL environment variable must be provided")
 
+BATCH_SIZE = 35
+QUEUE_LEASE_SECONDS = 600
+# Worker of the `store_queue`, the products it claimed are acked under this ID
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+SPOOL_PATH = Path("cf_spool.jsonl")
+# Batches wait while the storage endpoint is down, without using a try of their products...
+PAUSE_WHILE_OPEN_SECONDS = 10.0
+# ...unless the outage lasts longer than this, so runs without a deadline end too
+MAX_OUTAGE_SECONDS = 1800.0
+
+# Shared by all the batches, so the health of the edge IPs is kept along the run
+name_solver = NameSolver()
+# Protect the API budget from storage endpoint outages
+cf_breaker = CircuitBreaker("CF_URL", failure_threshold=5, reset_timeout=60.0)
+payload_spool = PayloadSpool(SPOOL_PATH)
+
 
 class ProductStoringStatus(Enum):
     PENDING = "pending"
     SUCCESS = "success"
     FAILED = "failed"
+    # Fetched and waiting in the spool for the storage endpoint (see `drain_spool`)
+    SPOOLED = "spooled"
+
+
+class StoringState:
+    """Storing state of a product (plain slots, there is one per scheduled product)."""
+
+    __slots__ = ("product_id", "status", "n_tries")
+
+    def __init__(
+        self,
+        product_id: float,
+        status: ProductStoringStatus = ProductStoringStatus.PENDING,
+        n_tries: int = 0,
+    ) -> None:
+        self.product_id = product_id
+        self.status = status
+        self.n_tries = n_tries
 
+    def __repr__(self) -> str:
+        return f"StoringState({self.product_id}, {self.status.value}, n_tries={self.n_tries})"
 
-class StoringState(BaseModel):
-    product_id: float
-    status: ProductStoringStatus = ProductStoringStatus.PENDING
-    n_tries: int = 0
+
+_STATUSES = list(ProductStoringStatus)
+_STATUS_CODES = {status: code for code, status in enumerate(_STATUSES)}
 
 
 class StoringStates:
+    """Storing states of all the scheduled products, column-wise in arrays.
+
+    The `get_*` methods return `StoringState` items, and changes to them (e.g. made by
+    `store_product_details`) are written back with `update`.
+    """
+
     def __init__(self, storing_initial_state: list[StoringState]) -> None:
-        self.storing_states: list[StoringState] = storing_initial_state
+        self.product_ids = array("d", (state.product_id for state in storing_initial_state))
+        self.statuses = bytearray(_STATUS_CODES[state.status] for state in storing_initial_state)
+        self.n_tries = array("H", (state.n_tries for state in storing_initial_state))
+        self._index = {product_id: i for i, product_id in enumerate(self.product_ids)}
         self._is_finished = False
 
     @property
@@ -60,108 +103,358 @@ class StoringStates:
     def is_finished(self, value: bool) -> None:
         self._is_finished = value
 
+    def _get(self, status: ProductStoringStatus) -> list[StoringState]:
+        code = _STATUS_CODES[status]
+        return [
+            StoringState(self.product_ids[i], status, self.n_tries[i])
+            for i, status_code in enumerate(self.statuses)
+            if status_code == code
+        ]
+
+    def update(self, states: list[StoringState]) -> None:
+        for state in states:
+            i = self._index[state.product_id]
+            self.statuses[i] = _STATUS_CODES[state.status]
+            self.n_tries[i] = state.n_tries
+
     def get_pending(self) -> list[StoringState]:
         # Set failed states if necessary
-        for state in self.storing_states:
-            if state.n_tries >= 3:
-                state.status = ProductStoringStatus.FAILED
-                logger.warning("Product %s failed to store after 3 tries", state.product_id)
+        pending_code, failed_code = (
+            _STATUS_CODES[ProductStoringStatus.PENDING],
+            _STATUS_CODES[ProductStoringStatus.FAILED],
+        )
+        for i, status_code in enumerate(self.statuses):
+            if status_code == pending_code and self.n_tries[i] >= 3:
+                self.statuses[i] = failed_code
+                logger.warning("Product %s failed to store after 3 tries", self.product_ids[i])
 
-        return [
-            state for state in self.storing_states if state.status == ProductStoringStatus.PENDING
-        ]
+        return self._get(ProductStoringStatus.PENDING)
 
     def get_failed(self) -> list[StoringState]:
-        return [
-            state for state in self.storing_states if state.status == ProductStoringStatus.FAILED
-        ]
+        return self._get(ProductStoringStatus.FAILED)
 
     def get_success(self) -> list[StoringState]:
-        return [
-            state for state in self.storing_states if state.status == ProductStoringStatus.SUCCESS
-        ]
+        return self._get(ProductStoringStatus.SUCCESS)
 
+    def get_spooled(self) -> list[StoringState]:
+        return self._get(ProductStoringStatus.SPOOLED)
 
-async def main(partial_store: str | None = None):
+
+async def main(
+    partial_store: str | None = None,
+    budget: int | None = None,
+    shard: Shard | None = None,
+    use_queue: bool = False,
+    deadline_minutes: float | None = None,
+    parse_workers: int = 0,
+    snapshot_dir: str | None = None,
+):
+    deadline = Deadline(deadline_minutes * 60) if deadline_minutes else None
+    parse_pool = ParsePool(parse_workers)
+    record_sinks: list[RecordSink] = [CategoryAggregator(), AlertEngine(db.get_alert_rules())]
+    if snapshot_dir is not None:
+        record_sinks.append(SnapshotWriter(snapshot_dir))
     vpn = Vpn(configs_folder=VPN_CFG_FOLDER_PATH)
     try:
         warm_up_endpoint()
-        stored_products_ids = db.get_all_scanned_product_ids()
+        products_ids = _schedule_product_ids(partial_store, budget, shard)
 
-        store_product_states = [
-            StoringState(product_id=product_id) for product_id in stored_products_ids
-        ]
+        if use_queue:
+            await store_from_queue(vpn, products_ids, parse_pool, deadline, record_sinks)
+        else:
+            await store_products(vpn, products_ids, parse_pool, deadline, record_sinks)
 
-        store_product_states = _sample_storing_states(store_product_states, partial_store)
+        # Deliver the products spooled while the storage endpoint was down
+        async with _new_session() as session:
+            await drain_spool(session)
+    finally:
+        logger.info("Edge IPs: %s", name_solver.report())
+        # Also export what was observed by runs cut short
+        for sink in record_sinks:
+            sink.close()
+        parse_pool.close()
+        vpn.kill()
 
-        # Notice that states are mutated during the storing process
-        storing_states = StoringStates(store_product_states)
 
-        # For each `batch_size` products IDS
-        batch_size = 35
-        while storing_states.get_pending():
-            for i in range(0, len(storing_states.get_pending()), batch_size):
-                vpn.rotate()
+async def store_products(
+    vpn: Vpn,
+    products_ids: list[float],
+    parse_pool: ParsePool,
+    deadline: Deadline | None = None,
+    record_sinks: list[RecordSink] | None = None,
+) -> None:
+    store_product_states = [StoringState(product_id=product_id) for product_id in products_ids]
+
+    # Notice that states are updated after storing each batch
+    storing_states = StoringStates(store_product_states)
+
+    # For each `batch_size` products IDS
+    while storing_states.get_pending():
+        for i in range(0, len(storing_states.get_pending()), BATCH_SIZE):
+            if deadline is not None and not deadline.can_fit_batch():
+                _log_deadline_stop(deadline, len(storing_states.get_pending()))
+                return
+
+            batch_start = time.monotonic()
+            vpn.rotate()
+
+            storings_pending = storing_states.get_pending()
+            storings_batch = storings_pending[i : i + BATCH_SIZE]
+
+            await store_product_details(storings_batch, parse_pool, record_sinks)
+            storing_states.update(storings_batch)
+            db.mark_products_refreshed(
+                [
+                    state.product_id
+                    for state in storings_batch
+                    if state.status == ProductStoringStatus.SUCCESS
+                ]
+            )
+            n_pending = len(storing_states.get_pending())
+            n_failed = len(storing_states.get_failed())
+            n_success = len(storing_states.get_success())
+            n_spooled = len(storing_states.get_spooled())
+            logger.info(
+                "Pending: %s -- Failed: %s -- Success: %s -- Spooled: %s",
+                n_pending,
+                n_failed,
+                n_success,
+                n_spooled,
+            )
+            time.sleep(10)
+            if deadline is not None:
+                deadline.record_batch(time.monotonic() - batch_start)
+
+
+async def store_from_queue(
+    vpn: Vpn,
+    products_ids: list[float],
+    parse_pool: ParsePool,
+    deadline: Deadline | None = None,
+    record_sinks: list[RecordSink] | None = None,
+) -> None:
+    """Cooperatively drain the shared `store_queue` with any number of other workers.
+
+    Each worker claims leased batches until the queue is empty, so fast workers keep stealing
+    work while slow ones are still busy. Batches of crashed workers are claimed again once their
+    lease expires. Spooled products stay claimed until `drain_spool` delivers them.
+    """
+    db.enqueue_store_products(products_ids)
+
+    while True:
+        if deadline is not None and not deadline.can_fit_batch():
+            _log_deadline_stop(deadline, db.count_store_queue().get("pending", 0))
+            return
+
+        if cf_breaker.is_open and cf_breaker.outage_seconds <= MAX_OUTAGE_SECONDS:
+            # Claiming would use a try of the products, see `store_product_details`
+            await asyncio.sleep(PAUSE_WHILE_OPEN_SECONDS)
+            continue
+
+        claimed_ids = db.claim_store_batch(WORKER_ID, BATCH_SIZE, QUEUE_LEASE_SECONDS)
+        if not claimed_ids:
+            break
+
+        batch_start = time.monotonic()
+        vpn.rotate()
+        storings_batch = [StoringState(product_id=product_id) for product_id in claimed_ids]
+        await store_product_details(storings_batch, parse_pool, record_sinks)
+
+        succeeded_ids = [
+            state.product_id
+            for state in storings_batch
+            if state.status == ProductStoringStatus.SUCCESS
+        ]
+        failed_ids = [
+            state.product_id
+            for state in storings_batch
+            if state.status == ProductStoringStatus.PENDING
+        ]
+        db.mark_products_refreshed(succeeded_ids)
+        db.ack_store_batch(WORKER_ID, succeeded_ids, failed_ids)
+        logger.info("Queue: %s", db.count_store_queue())
+        time.sleep(10)
+        if deadline is not None:
+            deadline.record_batch(time.monotonic() - batch_start)
+
+
+def _log_deadline_stop(deadline: Deadline, n_pending: int) -> None:
+    # Completed batches are already stored and marked as refreshed, so the pending products are
+    # the stalest ones and will be the first of the next run
+    logger.warning(
+        "Stopping before the deadline (%.0fs left, slowest batch %.0fs): %s products pending",
+        deadline.remaining(),
+        deadline.slowest_batch_seconds,
+        n_pending,
+    )
 
-                storings_pending = storing_states.get_pending()
-                storings_batch = storings_pending[i : i + batch_size]
 
-                await store_product_details(storings_batch)
-                n_pending = len(storing_states.get_pending())
-                n_failed = len(storing_states.get_failed())
-                n_success = len(storing_states.get_success())
-                logger.info(
-                    "Pending: %s -- Failed: %s -- Success: %s", n_pending, n_failed, n_success
-                )
-                time.sleep(10)
-    finally:
-        vpn.kill()
+def _schedule_product_ids(
+    partial_store: str | None = None,
+    budget: int | None = None,
+    shard: Shard | None = None,
+) -> list[float]:
+    # Delisted products are gone from the site, their details cannot be fetched
+    stored_products_ids = db.get_all_scanned_product_ids(include_delisted=False)
+    stored_products_ids = _sample_product_ids(stored_products_ids, partial_store, shard)
+
+    scheduler = RefreshScheduler(db.get_price_change_stats())
+    # Most volatile products first, then fill the budget with the stalest ones. A deadline only
+    # stops the run: the products it leaves out are still due, so the next run schedules them
+    products_ids = scheduler.order(stored_products_ids, budget)
+    logger.info(
+        "Scheduled %s of %s products (%s due)",
+        len(products_ids),
+        len(stored_products_ids),
+        sum(1 for product_id in products_ids if scheduler.is_due(product_id)),
+    )
+    return products_ids
 
 
-async def make_request_get(session, product_id: float) -> Any:
-    # Get product details
+async def make_request_get(session, product_id: float) -> bytes:
+    # Get product details (parsed later, see `ParsePool`)
     response = await session.get(API_URL_TEMPLATE.format(id=transform_id(product_id)))
     logger.info("Request product %s: Status Code - %s", product_id, response.status_code)
-    return response.json()
+    return bytes(response.content)
 
 
-async def make_request_post(session, product_details: dict) -> Any:
+async def make_request_post(session, data: dict) -> Any:
     # Store product details
-    data = parse_product_data(product_details)
     response = await session.post(CF_URL, json=data)
+    if response.status_code >= 500:
+        # The storage endpoint is failing (not the payload), let the circuit breaker know
+        response.raise_for_status()
     logger.info("Stored with CF: %s", response.json())
     return response.json()
 
 
-async def store_product_details(products_state: list[StoringState]):
-    async with httpx.AsyncClient(transport=AsyncCustomHost(NameSolver()), timeout=5.0) as session:
+async def post_or_spool(session, data: dict) -> Any:
+    """Store the parsed product details, or spool them locally while the storage endpoint is down.
+
+    Spooled payloads are delivered by `drain_spool` once the endpoint recovers (in this run, since
+    the spool does not outlive the runner). The response is then marked `spooled`, so the product
+    is neither fetched again nor refreshed until it is delivered.
+    """
+    if not cf_breaker.allow_request():
+        payload_spool.append(data)
+        return {"productId": data["product"]["id"], "spooled": True}
+
+    try:
+        response = await make_request_post(session, data)
+    except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+        logger.warning("Storage endpoint failed, spooling product: %s", exc)
+        cf_breaker.record_failure()
+        payload_spool.append(data)
+        return {"productId": data["product"]["id"], "spooled": True}
+    except Exception:
+        # E.g. a 4xx without a JSON body: the product is tried again, but a half-open probe must
+        # be released whatever the outcome
+        cf_breaker.record_failure()
+        raise
+
+    cf_breaker.record_success()
+    return response
+
+
+async def drain_spool(session) -> None:
+    """Deliver the spooled payloads while the circuit breaker allows it.
+
+    Delivered products are marked as refreshed (and done, if claimed from the `store_queue`).
+    """
+    pending = payload_spool.read_all()
+    if not pending:
+        return
+
+    n_spooled = len(pending)
+    delivered_ids: list[float] = []
+    while pending and cf_breaker.allow_request():
+        try:
+            await make_request_post(session, pending[0])
+        except (httpx.TransportError, httpx.HTTPStatusError) as exc:
+            logger.warning("Storage endpoint failed while draining the spool: %s", exc)
+            cf_breaker.record_failure()
+            continue
+        except Exception as exc:
+            # The endpoint rejected the payload itself, retrying it would block the spool
+            logger.exception("Dropping spooled payload: %s", exc)
+            cf_breaker.record_failure()
+        else:
+            cf_breaker.record_success()
+            delivered_ids.append(pending[0]["product"]["id"])
+        pending.pop(0)
+
+    payload_spool.rewrite(pending)
+    if delivered_ids:
+        db.mark_products_refreshed(delivered_ids)
+        db.ack_store_batch(WORKER_ID, delivered_ids, [])
+    logger.info("Drained %s of %s spooled payloads", n_spooled - len(pending), n_spooled)
+
+
+def _new_session() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=AsyncCustomHost(name_solver), timeout=5.0)
+
+
+async def store_product_details(
+    products_state: list[StoringState],
+    parse_pool: ParsePool | None = None,
+    record_sinks: list[RecordSink] | None = None,
+):
+    async with _new_session() as session:
+        await drain_spool(session)
+        if cf_breaker.is_open:
+            # Fetched details could only be spooled, wait for the endpoint instead
+            logger.warning("Storage endpoint down, pausing the batch of %s", len(products_state))
+            await asyncio.sleep(PAUSE_WHILE_OPEN_SECONDS)
+            if cf_breaker.outage_seconds > MAX_OUTAGE_SECONDS:
+                for product_state in products_state:
+                    product_state.n_tries += 1
+            return []
+
         tasks_get = []
         for product_state in products_state:
             task = asyncio.create_task(make_request_get(session, product_state.product_id))
             tasks_get.append(task)
             await asyncio.sleep(0.1)  # To avoid sending requests too quickly
-        products_details = await asyncio.gather(*tasks_get, return_exceptions=True)
+        responses = await asyncio.gather(*tasks_get, return_exceptions=True)
+
+        raws = [response for response in responses if isinstance(response, bytes)]
+        if parse_pool is not None:
+            products_details = await parse_pool.parse_async(raws)
+        else:
+            products_details = parse_responses(raws)
+        parsed_records = [record for record in products_details if record is not None]
 
         tasks_post = []
-        for product_details in products_details:
-            if not isinstance(product_details, dict):
-                continue
-            task = asyncio.create_task(make_request_post(session, product_details))
+        for product_details in parsed_records:
+            task = asyncio.create_task(post_or_spool(session, product_details))
             tasks_post.append(task)
 
         posts_responses = await asyncio.gather(*tasks_post, return_exceptions=True)
-        success_ids = []
+        success_ids: list[float] = []
+        spooled_ids: list[float] = []
         for pr in posts_responses:
             try:
                 if not isinstance(pr, dict):
                     continue
-                success_ids.append(pr["productId"])
+                if pr.get("spooled"):
+                    spooled_ids.append(pr["productId"])
+                else:
+                    success_ids.append(pr["productId"])
             except Exception:
                 pass
 
+        # Only what was stored is observed, records are added before the products are refreshed
+        stored_records = [
+            record for record in parsed_records if record["product"]["id"] in success_ids
+        ]
+        for sink in record_sinks or []:
+            sink.add(stored_records)
+
         for product_state in products_state:
             if product_state.product_id in success_ids:
                 product_state.status = ProductStoringStatus.SUCCESS
+            elif product_state.product_id in spooled_ids:
+                product_state.status = ProductStoringStatus.SPOOLED
             else:
                 product_state.n_tries += 1
 
@@ -179,39 +472,6 @@ def warm_up_endpoint():
         time.sleep(1)
 
 
-def parse_product_data(item: dict) -> dict:
-    badge_data = InfoParser.badge(item)
-
-    supplier_data = InfoParser.supplier(item)
-
-    product_data = InfoParser.product(item)
-    product_id = float(product_data["id"])
-
-    photos_data = InfoParser.photo(item)
-    for photo_data in photos_data:
-        photo_data["product_id"] = product_id
-
-    categories_data = InfoParser.category(item)
-
-    price_data = InfoParser.price_instruction(item)
-    price_data["product_id"] = product_id
-
-    nutrition_data = InfoParser.nutrition_information(item)
-    nutrition_data["product_id"] = product_id
-
-    full_info = FullInfo(
-        product=Product(**product_data),
-        badge=Badge(**badge_data),
-        supplier=Supplier(**supplier_data),
-        photos=[Photo(**photo_data) for photo_data in photos_data],
-        categories=[Category(**category_data) for category_data in categories_data],
-        price_instruction=PriceInstruction(**price_data),
-        nutrition_information=NutritionInformation(**nutrition_data),
-    )
-
-    return full_info.model_dump()
-
-
 def transform_id(product_id: float) -> str:
     """Convert float ID to a suitable string ID, removing trailing zeros.
 
@@ -231,16 +491,20 @@ def transform_id(product_id: float) -> str:
     return id_str
 
 
-def _sample_storing_states(
-    storing_states: list[StoringState],
+def _sample_product_ids(
+    products_ids: list[float],
     partial_store: str | None = None,
-) -> list[StoringState]:
+    shard: Shard | None = None,
+) -> list[float]:
+    if shard is not None:
+        return [pid for pid in products_ids if shard.contains(transform_id(pid))]
+
     if partial_store is None:
-        return storing_states
+        return products_ids
 
     if partial_store == "first_half":
-        return storing_states[: len(storing_states) // 2]
+        return products_ids[: len(products_ids) // 2]
     if partial_store == "second_half":
-        return storing_states[len(storing_states) // 2 :]
+        return products_ids[len(products_ids) // 2 :]
 
     raise ValueError("Invalid value for `partial_store`")
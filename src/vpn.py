@@ -1,10 +1,11 @@
+import asyncio
 import os
 import random
 import socket
 import subprocess
 import time
 from pathlib import Path
-from threading import Thread
+from threading import Lock, Thread
 
 import httpx
 from httpx import AsyncHTTPTransport, HTTPTransport, Request, Response
@@ -233,12 +234,143 @@ def get_ovpn_files(folder_path: str | Path) -> list[Path]:
     return ovpn_files
 
 
+EDGE_HOST_SUFFIX = ".mercadona.es"
+# Known edge node, kept as a candidate in case DNS resolution fails (e.g. behind some VPN exits)
+DEFAULT_EDGE_IPS = ["96.16.88.179"]
+HTTPS_PORT = 443
+
+
+class IpHealth:
+    """Health of an IP, as exponentially weighted moving averages of latency and error rate.
+
+    The latency of the requests and the one of the TCP connect probes are kept apart, since they
+    cannot be compared with each other.
+    """
+
+    ALPHA = 0.2
+
+    def __init__(self) -> None:
+        self.latency: float | None = None
+        self.probe_latency: float | None = None
+        self.error_rate = 0.0
+        self.n_requests = 0
+        self.n_errors = 0
+
+    def record(self, latency: float | None, error: bool) -> None:
+        self.n_requests += 1
+        self.n_errors += int(error)
+        self.error_rate += self.ALPHA * (float(error) - self.error_rate)
+        if latency is not None:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.ALPHA * (latency - self.latency)
+
+    def record_probe(self, latency: float | None) -> None:
+        self.probe_latency = latency
+        self.n_errors += int(latency is None)
+        self.error_rate += self.ALPHA * (float(latency is None) - self.error_rate)
+
+    def score(self, by_requests: bool) -> float:
+        """Expected cost of using the IP (lower is better), by request or last probe latency."""
+        latency = self.latency if by_requests else self.probe_latency
+        if latency is None:
+            return float("inf")
+        return latency / max(1.0 - self.error_rate, 0.05)
+
+    def to_dict(self) -> dict:
+        return {
+            "latency": self.latency,
+            "probe_latency": self.probe_latency,
+            "error_rate": round(self.error_rate, 3),
+            "n_requests": self.n_requests,
+            "n_errors": self.n_errors,
+        }
+
+
 class NameSolver:
     # https://github.com/encode/httpx/issues/1444
+    """Pin the edge hosts to the healthiest of several candidate IPs.
+
+    Candidate IPs of a host (DNS answers plus the known edge nodes) are cached for `ttl_seconds`
+    and health-checked with a TCP connect each time they are resolved, so an IP which failed is
+    tried again once it recovers. Every request then feeds back its latency and outcome, so new
+    connections are routed to the IP with the lowest expected cost. IPs are compared by their
+    request latency once all of them have one, by their probe latency until then.
+
+    The async transport resolves and probes in a thread (see `prepare`), not on the event loop.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 300.0,
+        probe_timeout: float = 1.0,
+        fallback_ips: list[str] | None = None,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.probe_timeout = probe_timeout
+        self.fallback_ips = DEFAULT_EDGE_IPS if fallback_ips is None else fallback_ips
+        self._candidates: dict[str, tuple[float, list[str]]] = {}
+        self._health: dict[str, IpHealth] = {}
+        self._selections: dict[str, int] = {}
+        # Concurrent refreshes (e.g. from several threads) resolve and probe once
+        self._lock = Lock()
+
     def get(self, name: str) -> str:
-        if name.endswith(".mercadona.es"):
-            return "96.16.88.179"
-        return ""
+        if not name.endswith(EDGE_HOST_SUFFIX):
+            return ""
+
+        candidates = self.candidates(name)
+        if not candidates:
+            return ""
+
+        health = [self._health[candidate] for candidate in candidates]
+        by_requests = all(h.latency is not None for h in health)
+        ip = min(candidates, key=lambda candidate: self._health[candidate].score(by_requests))
+        self._selections[ip] = self._selections.get(ip, 0) + 1
+        return ip
+
+    def candidates(self, name: str) -> list[str]:
+        """Candidate IPs of the host, resolved (and probed) again when the cached ones expire."""
+        cached = self._get_cached(name)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            cached = self._get_cached(name)
+            if cached is not None:
+                return cached
+
+            ips = list(dict.fromkeys(resolve_ips(name) + self.fallback_ips))
+            for ip in ips:
+                latency = probe_ip(ip, HTTPS_PORT, self.probe_timeout)
+                self._health.setdefault(ip, IpHealth()).record_probe(latency)
+
+            self._candidates[name] = (time.monotonic() + self.ttl_seconds, ips)
+        logger.debug("Candidate IPs for %s: %s", name, ips)
+        return ips
+
+    async def prepare(self, name: str) -> None:
+        """Refresh the candidate IPs of the host in a thread, if they expired."""
+        if name.endswith(EDGE_HOST_SUFFIX) and self._get_cached(name) is None:
+            await asyncio.to_thread(self.candidates, name)
+
+    def _get_cached(self, name: str) -> list[str] | None:
+        cached = self._candidates.get(name)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        return None
+
+    def record(self, ip: str, latency: float | None, error: bool) -> None:
+        if ip in self._health:
+            self._health[ip].record(latency, error)
+
+    def report(self) -> dict[str, dict]:
+        """Selection count and health metrics per IP."""
+        return {
+            ip: {"selected": self._selections.get(ip, 0), **health.to_dict()}
+            for ip, health in self._health.items()
+        }
 
     def resolve(self, request: Request) -> Request:
         host = request.url.host
@@ -251,6 +383,25 @@ class NameSolver:
         return request
 
 
+def resolve_ips(hostname: str) -> list[str]:
+    """Resolve the IPv4 addresses of a hostname (empty list if it cannot be resolved)."""
+    try:
+        infos = socket.getaddrinfo(hostname, HTTPS_PORT, socket.AF_INET, socket.SOCK_STREAM)
+    except (socket.gaierror, OSError):
+        return []
+    return list(dict.fromkeys(str(info[4][0]) for info in infos))
+
+
+def probe_ip(ip: str, port: int, timeout: float) -> float | None:
+    """TCP connect latency (seconds) of an IP, or None if the connection fails."""
+    start = time.monotonic()
+    try:
+        with socket.create_connection((ip, port), timeout=timeout):
+            return time.monotonic() - start
+    except OSError:
+        return None
+
+
 class CustomHost(HTTPTransport):
     def __init__(self, solver: NameSolver, *args, **kwargs) -> None:
         self.solver = solver
@@ -267,5 +418,15 @@ class AsyncCustomHost(AsyncHTTPTransport):
         super().__init__(*args, **kwargs)
 
     async def handle_async_request(self, request: Request) -> Response:
+        await self.solver.prepare(request.url.host)
         request = self.solver.resolve(request)
-        return await super().handle_async_request(request)
+        ip = request.url.host
+        start = time.monotonic()
+        try:
+            response = await super().handle_async_request(request)
+        except httpx.TransportError:
+            self.solver.record(ip, latency=None, error=True)
+            raise
+
+        self.solver.record(ip, latency=time.monotonic() - start, error=response.status_code >= 500)
+        return response
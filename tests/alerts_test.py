@@ -0,0 +1,35 @@
+import json
+
+from src.alerts import AlertEngine, RuleIndex
+from src.models import AlertRule
+from src.scraper.extractor import extract_full_info
+
+
+def test_alert_engine():
+    # Arrange
+    with open("tests/fixtures/products_full.json", "r", encoding="utf-8") as json_file:
+        products_full_dict = json.load(json_file)
+    records = [extract_full_info(item).model_dump() for item in products_full_dict]
+    chocolate, water, nuts = records
+    rules = [
+        AlertRule(id=1, name="Chocolate", product_id=chocolate["product"]["id"], below_price=100),
+        AlertRule(id=2, name="Drinks", category_id=water["categories"][0]["id"], min_change_pct=10),
+        AlertRule(id=3, name="Unrelated", category_id=-1, below_price=100),
+    ]
+    engine = AlertEngine(rules)
+    last_prices = {
+        chocolate["product"]["id"]: chocolate["price_instruction"]["unit_price"] + 1,
+        water["product"]["id"]: water["price_instruction"]["unit_price"] * 1.05,
+        nuts["product"]["id"]: 0.01,
+    }
+
+    # Act
+    watched = engine.watched(records)
+    alerts = engine.evaluate(watched, last_prices)
+
+    # Assert
+    assert not RuleIndex([])
+    assert watched == [chocolate, water]
+    assert [alert.rule_id for alert in alerts] == [1]
+    assert alerts[0].old_price == last_prices[chocolate["product"]["id"]]
+    assert alerts[0].pct_change is not None and alerts[0].pct_change < 0
@@ -0,0 +1,32 @@
+from datetime import date
+
+from src import db
+from src.category_aggregates import CategoryAggregator
+from src.models import CategoryPriceDaily
+
+
+def record(product_id: float, unit_price: float) -> dict:
+    return {
+        "product": {"id": product_id},
+        "price_instruction": {"unit_price": unit_price},
+        "categories": [{"id": 7}, {"id": 70}],
+    }
+
+
+def test_category_aggregator(monkeypatch):
+    # Arrange
+    merged: list[CategoryPriceDaily] = []
+    # Product 1 was already stored today, e.g. by a worker whose lease expired
+    monkeypatch.setattr(db, "get_refreshed_product_ids", lambda *_: {1.0})
+    monkeypatch.setattr(db, "merge_category_price_daily", merged.extend)
+    aggregator = CategoryAggregator()
+
+    # Act
+    aggregator.add([record(1.0, 5.0), record(2.0, 2.0), record(3.0, 4.0)])
+
+    # Assert
+    assert aggregator.n_products == 2
+    assert [(a.category_id, a.day, a.n_prices, a.sum_price) for a in merged] == [
+        (7, date.today(), 2, 6.0),
+        (70, date.today(), 2, 6.0),
+    ]
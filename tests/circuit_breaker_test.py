@@ -0,0 +1,55 @@
+from src.circuit_breaker import BreakerState, CircuitBreaker, PayloadSpool
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_circuit_breaker():
+    # Arrange
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30, clock=clock)
+
+    # Act & Assert
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == BreakerState.CLOSED
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+    assert breaker.is_open
+    assert not breaker.allow_request()
+
+    # A single probe is allowed once the reset timeout elapses, its failure opens the breaker
+    clock.now = 30
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == BreakerState.OPEN
+
+    # A successful probe closes the breaker, ending the outage
+    clock.now = 60
+    assert breaker.outage_seconds == 60
+    assert breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.outage_seconds == 0
+    assert breaker.allow_request()
+
+
+def test_payload_spool(tmp_path):
+    # Arrange
+    spool = PayloadSpool(tmp_path / "spool.jsonl")
+
+    # Act & Assert
+    assert spool.read_all() == []
+    spool.append({"product": {"id": 1.0}})
+    spool.append({"product": {"id": 2.0}})
+    assert len(spool) == 2
+
+    spool.rewrite(spool.read_all()[1:])
+    assert spool.read_all() == [{"product": {"id": 2.0}}]
@@ -1,11 +1,15 @@
 import hashlib
 import json
+from datetime import date, datetime
 
 from src import db
+from src.alerts import AlertEngine
 from src.config.logger import logger
 from src.models import (
+    AlertRule,
     Badge,
     Category,
+    CategoryPriceDaily,
     HtmlCategoryDB,
     NutritionInformation,
     Photo,
@@ -17,6 +21,7 @@ from src.models import (
     ScannedProduct,
     Supplier,
 )
+from src.scraper.extractor import extract_full_info
 from src.scraper.info_parser import InfoParser
 
 # def test_db():
@@ -80,6 +85,32 @@ def test_insert_scanned_product():
     logger.info("Inserted %s products", len(scanned_products))
 
 
+def test_insert_scanned_products():
+    # Arrange
+    conn = db.get_valid_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM scanned_products WHERE product_id IN (9301.0, 9302.0)")
+    conn.commit()
+    db.connection_pool.putconn(conn)
+    products = [
+        ScannedProduct(
+            product_id=product_id,
+            category_name="Congelados",
+            subcategory_name="Pescado",
+            scanned_at=datetime(2024, 1, 1),
+        )
+        for product_id in (9301.0, 9302.0)
+    ]
+
+    # Act
+    n_first = db.insert_scanned_products(products[:1])
+    n_second = db.insert_scanned_products(products)
+
+    # Assert
+    assert (n_first, n_second) == (1, 1)
+    assert {9301.0, 9302.0} <= set(db.get_all_scanned_product_ids())
+
+
 def test_insert_product_full():
     # Arrange
     with open("tests/fixtures/products_full.json", "r", encoding="utf-8") as json_file:
@@ -127,3 +158,206 @@ def test_insert_product_full():
 
     # Act
     # Assert
+
+
+def test_store_queue():
+    # Arrange
+    product_ids = [9001.1, 9002.0, 9003.0, 9004.0, 9005.0]
+    conn = db.get_valid_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM store_queue")
+    conn.commit()
+    db.connection_pool.putconn(conn)
+    db.enqueue_store_products(product_ids, requeue_after_seconds=0)
+
+    # Act
+    claimed_a = db.claim_store_batch("worker-a", batch_size=2)
+    claimed_b = db.claim_store_batch("worker-b", batch_size=2)
+    db.ack_store_batch("worker-a", succeeded_ids=claimed_a[:1], failed_ids=claimed_a[1:])
+    # Acks from a worker which does not own the lease are ignored
+    db.ack_store_batch("worker-a", succeeded_ids=claimed_b, failed_ids=[])
+    # An expired lease can be claimed by another worker
+    claimed_c = db.claim_store_batch("worker-c", batch_size=10, lease_seconds=0)
+    claimed_d = db.claim_store_batch("worker-d", batch_size=10)
+
+    # Assert
+    assert claimed_a == product_ids[:2]
+    assert claimed_b == product_ids[2:4]
+    assert sorted(claimed_c) == sorted([product_ids[1], product_ids[4]])
+    assert sorted(claimed_d) == sorted(claimed_c)
+    assert db.enqueue_store_products(product_ids, requeue_after_seconds=0) == 1
+
+
+def test_merge_category_price_daily():
+    # Arrange
+    conn = db.get_valid_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM category_price_daily WHERE category_id = -1")
+    conn.commit()
+    db.connection_pool.putconn(conn)
+    today = date.today()
+    first = CategoryPriceDaily(
+        category_id=-1,
+        day=today,
+        n_prices=2,
+        sum_price=3.0,
+        min_price=1.0,
+        max_price=2.0,
+        sketch={0: 1, 70: 1},
+    )
+    second = CategoryPriceDaily(
+        category_id=-1,
+        day=today,
+        n_prices=1,
+        sum_price=0.5,
+        min_price=0.5,
+        max_price=0.5,
+        sketch={-34: 1, 0: 0},
+    )
+
+    # Act
+    db.merge_category_price_daily([first])
+    db.merge_category_price_daily([second])
+    trends = db.get_category_price_trends(-1, days=1)
+
+    # Assert
+    assert len(trends) == 1
+    assert trends[0].n_prices == 3
+    assert trends[0].min_price == 0.5
+    assert trends[0].max_price == 2.0
+    assert trends[0].median_price is not None
+    assert abs(trends[0].median_price - 1.0) < 0.02
+
+
+def test_known_listings():
+    # Arrange
+    listing = HtmlCategoryDB(
+        html="Merluza\nBacalao",
+        category_name="Congelados",
+        subcategory_name="Pescado",
+        hash_value=hashlib.sha256(b"test_known_listings").hexdigest(),
+        product_ids=[9001.1, 9002.0],
+    )
+
+    conn = db.get_valid_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM html_category WHERE hash_value = %s", (listing.hash_value,))
+    conn.commit()
+
+    # Act
+    listing_id = db.insert_html_category(listing)
+    listing.product_ids = [9001.1, 9003.0]
+    walked_again_id = db.insert_html_category(listing)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "UPDATE html_category SET walked_at = walked_at - interval '8 days' WHERE id = %s",
+            (listing_id,),
+        )
+    conn.commit()
+    db.connection_pool.putconn(conn)
+
+    # Assert
+    assert walked_again_id == listing_id
+    assert db.get_known_listings(10)[listing.hash_value] == [9001.1, 9003.0]
+    # Walked too long ago
+    assert listing.hash_value not in db.get_known_listings(7)
+
+
+def test_merge_scanned_products():
+    # Arrange
+    product_ids = (9101.0, 9102.0, 9103.0, 9104.0)
+    conn = db.get_valid_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM scanned_products WHERE product_id IN %s", (product_ids,))
+    conn.commit()
+
+    def scanned(product_id: float, category_name: str, subcategory_name: str) -> ScannedProduct:
+        return ScannedProduct(
+            product_id=product_id,
+            category_name=category_name,
+            subcategory_name=subcategory_name,
+            scanned_at=datetime(2024, 1, 1),
+        )
+
+    first_scan = [
+        scanned(9101.0, "Merge A", "Pescado"),
+        scanned(9102.0, "Merge A", "Pescado"),
+        scanned(9103.0, "Merge B", "Carne"),
+    ]
+    # Product 9101 moved to another subcategory and 9102 is gone, category B was not scanned
+    second_scan = [
+        scanned(9101.0, "Merge A", "Marisco"),
+        scanned(9104.0, "Merge A", "Marisco"),
+        scanned(9104.0, "Merge A", "Pescado"),
+    ]
+
+    # Act
+    first_stats = db.merge_scanned_products(first_scan)
+    second_stats = db.merge_scanned_products(second_scan)
+
+    # Assert
+    assert first_stats == {"new": 3, "seen": 0, "delisted": 0}
+    assert second_stats == {"new": 1, "seen": 1, "delisted": 1}
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT product_id, subcategory_name, delisted_at IS NOT NULL
+            FROM scanned_products
+            WHERE product_id IN %s
+            ORDER BY product_id
+            """,
+            (product_ids,),
+        )
+        rows = [(float(row[0]), row[1], row[2]) for row in cursor.fetchall()]
+    db.connection_pool.putconn(conn)
+    assert rows == [
+        (9101.0, "Marisco", False),
+        (9102.0, "Pescado", True),
+        (9103.0, "Carne", False),
+        (9104.0, "Marisco", False),
+    ]
+    assert 9102.0 not in db.get_all_scanned_product_ids(include_delisted=False)
+    # A scan cut short lists 9102 again, without delisting the products it did not reach
+    cut_scan = [scanned(9102.0, "Merge A", "Pescado")]
+    assert db.merge_scanned_products(cut_scan, delist=False) == {
+        "new": 0,
+        "seen": 1,
+        "delisted": 0,
+    }
+    assert 9102.0 in db.get_all_scanned_product_ids(include_delisted=False)
+    assert 9101.0 in db.get_all_scanned_product_ids(include_delisted=False)
+
+
+def test_insert_alerts_once_a_day():
+    # Arrange
+    with open("tests/fixtures/products_full.json", "r", encoding="utf-8") as json_file:
+        record = extract_full_info(json.load(json_file)[0]).model_dump()
+    record["product"]["id"] = 9201.0
+    record["price_instruction"]["previous_unit_price"] = (
+        record["price_instruction"]["unit_price"] + 1
+    )
+    conn = db.get_valid_connection()
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM alert_outbox WHERE product_id = 9201.0")
+        cursor.execute("DELETE FROM product_refresh WHERE product_id = 9201.0")
+        cursor.execute(
+            "INSERT INTO alert_rule (name, product_id, below_price) VALUES (%s, %s, %s) RETURNING id",
+            ("test_insert_alerts_once_a_day", 9201.0, 1000),
+        )
+        rule_id = cursor.fetchone()[0]
+    conn.commit()
+    engine = AlertEngine([AlertRule(id=rule_id, product_id=9201.0, below_price=1000)])
+
+    # Act
+    engine.add([record])
+    # The same batch stored again, e.g. after a retry
+    engine.add([record])
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT rule_id FROM alert_outbox WHERE product_id = 9201.0")
+        fired = cursor.fetchall()
+        cursor.execute("DELETE FROM alert_rule WHERE id = %s", (rule_id,))
+    conn.commit()
+    db.connection_pool.putconn(conn)
+
+    # Assert
+    assert fired == [(rule_id,)]
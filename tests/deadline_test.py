@@ -0,0 +1,29 @@
+from src.deadline import Deadline
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_deadline():
+    # Arrange
+    clock = FakeClock()
+    deadline = Deadline(600, safety_margin=60, clock=clock)
+
+    # Act & Assert
+    assert deadline.can_fit_batch()
+
+    clock.now = 100
+    deadline.record_batch(100)
+    clock.now = 150
+    deadline.record_batch(50)
+    assert deadline.slowest_batch_seconds == 100
+    assert deadline.remaining() == 450
+    assert deadline.can_fit_batch()
+
+    clock.now = 450
+    assert not deadline.can_fit_batch()
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from src.scraper.diagnostics import Diagnostics
+
+
+class FakePage:
+    url = "https://example.com/categories/112"
+
+    def __init__(self) -> None:
+        self.n_screenshots = 0
+
+    def screenshot(self, path: str, **_) -> None:
+        self.n_screenshots += 1
+        with open(path, "wb") as f:
+            f.write(b"png")
+
+    def content(self) -> str:
+        return "<html></html>"
+
+
+def test_diagnostics_only_written_on_failure(tmp_path):
+    # Arrange
+    page = FakePage()
+
+    # Act
+    with Diagnostics(n_steps=3, output_dir=tmp_path) as diagnostics:
+        diagnostics.attach(page)
+        for i in range(5):
+            diagnostics.step(f"step {i}")
+    with pytest.raises(TimeoutError):
+        with Diagnostics(n_steps=3, output_dir=tmp_path) as diagnostics:
+            diagnostics.attach(page)
+            for i in range(5):
+                diagnostics.step(f"step {i}")
+            raise TimeoutError("Category menu not visible")
+
+    # Assert
+    assert page.n_screenshots == 1
+    (report_path,) = tmp_path.glob("diagnostics_*.json")
+    report = json.loads(report_path.read_text(encoding="utf-8"))
+    assert [step["label"] for step in report["steps"]] == ["step 2", "step 3", "step 4"]
+    assert report["steps"][0]["url"] == page.url
+    assert "Category menu not visible" in report["error"]
+    assert report_path.with_suffix(".html").exists()
+    assert report_path.with_suffix(".png").exists()
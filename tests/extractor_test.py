@@ -0,0 +1,51 @@
+import json
+
+from src.models import (
+    Badge,
+    Category,
+    FullInfo,
+    NutritionInformation,
+    Photo,
+    PriceInstruction,
+    Product,
+    Supplier,
+)
+from src.scraper.extractor import extract_full_info
+from src.scraper.info_parser import InfoParser
+
+
+def _full_info_with_info_parser(item: dict) -> FullInfo:
+    product_data = InfoParser.product(item)
+    product_id = float(product_data["id"])
+    photos_data = InfoParser.photo(item)
+    for photo_data in photos_data:
+        photo_data["product_id"] = product_id
+    price_data = InfoParser.price_instruction(item)
+    price_data["product_id"] = product_id
+    nutrition_data = InfoParser.nutrition_information(item)
+    nutrition_data["product_id"] = product_id
+
+    return FullInfo(
+        product=Product(**product_data),
+        badge=Badge(**InfoParser.badge(item)),
+        supplier=Supplier(**InfoParser.supplier(item)),
+        photos=[Photo(**photo_data) for photo_data in photos_data],
+        categories=[Category(**category) for category in InfoParser.category(item)],
+        price_instruction=PriceInstruction(**price_data),
+        nutrition_information=NutritionInformation(**nutrition_data),
+    )
+
+
+def test_extract_full_info():
+    # Arrange
+    with open("tests/fixtures/products_full.json", "r", encoding="utf-8") as json_file:
+        products_full_dict = json.load(json_file)
+
+    for item in products_full_dict:
+        # Act
+        full_info = extract_full_info(item)
+
+        # Assert
+        assert full_info == _full_info_with_info_parser(item)
+        assert full_info.price_instruction.unit_price is not None
+        assert isinstance(full_info.price_instruction.unit_price, float)
@@ -0,0 +1,42 @@
+import asyncio
+import json
+
+import httpx
+
+from src.scraper import http_scan
+
+
+def test_http_scan(monkeypatch):
+    # Arrange
+    with open("tests/fixtures/category_listing.json", "r", encoding="utf-8") as json_file:
+        listing = json.load(json_file)
+    tree = {
+        "results": [
+            {"id": 12, "name": "Aceite, especias y salsas", "categories": [listing]},
+            {"id": 9, "name": "Azúcar, caramelos y chocolate", "categories": []},
+        ]
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.url.params["wh"] == "vlc1"
+        if request.url.path == "/api/categories/":
+            return httpx.Response(200, json=tree)
+        if request.url.path == "/api/categories/112/":
+            return httpx.Response(200, json=listing)
+        return httpx.Response(404)
+
+    monkeypatch.setattr(http_scan, "CATEGORIES_API_URL", "https://tienda.example/api/categories/")
+
+    # Act
+    products = asyncio.run(
+        http_scan.get_scanned_products(
+            partial_scan="first_half",
+            requests_per_second=1000,
+            transport=httpx.MockTransport(handler),
+        )
+    )
+
+    # Assert
+    assert [product.product_id for product in products] == [4241.0, 4717.0, 4740.0, 13501.1]
+    assert {product.category_name for product in products} == {"Aceite, especias y salsas"}
+    assert {product.subcategory_name for product in products} == {"Aceite, vinagre y sal"}
@@ -0,0 +1,34 @@
+import json
+
+from src.scraper.listing_capture import ListingCapture
+
+
+class _Response:
+    def __init__(self, url: str, data: dict, status: int = 200) -> None:
+        self.url = url
+        self.status = status
+        self._data = data
+
+    def json(self) -> dict:
+        return self._data
+
+
+def test_listing_capture():
+    # Arrange
+    with open("tests/fixtures/category_listing.json", "r", encoding="utf-8") as json_file:
+        listing = json.load(json_file)
+    capture = ListingCapture()
+
+    # Act
+    capture.on_response(_Response("https://tienda.example/api/categories/112/?lang=es", listing))
+    capture.on_response(_Response("https://tienda.example/api/products/4241/", {"id": "4241"}))
+    capture.on_response(_Response("https://tienda.example/api/categories/113/", {}, status=429))
+
+    # Assert
+    assert list(capture.listings) == [112]
+    assert len(capture.listings[112]) == 4
+    # Products sharing a name are ambiguous, they are left for the click fallback
+    assert capture.products_by_name(112) == {
+        "Aceite de oliva 0,4º Hacendado": 4241.0,
+        "Vinagre de vino blanco Hacendado": 13501.1,
+    }
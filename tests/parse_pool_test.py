@@ -0,0 +1,36 @@
+import asyncio
+import json
+
+from src.parse_pool import ParsePool
+
+
+def _raw_responses() -> list[bytes]:
+    with open("tests/fixtures/products_full.json", "r", encoding="utf-8") as json_file:
+        products_full_dict = json.load(json_file)
+
+    raws = []
+    for i in range(200):
+        item = dict(products_full_dict[i % len(products_full_dict)])
+        item["id"] = str(i + 1)
+        raws.append(json.dumps(item).encode())
+    raws.insert(10, b"<html>Too many requests</html>")
+    return raws
+
+
+def test_parse_pool():
+    # Arrange
+    raws = _raw_responses()
+
+    # Act
+    with ParsePool(workers=0) as inline_pool:
+        inline_records = inline_pool.parse(raws)
+    with ParsePool(workers=2) as pool:
+        records = pool.parse(raws)
+        async_records = asyncio.run(pool.parse_async(raws))
+
+    # Assert
+    assert len(records) == len(raws)
+    assert records[10] is None
+    assert [r["product"]["id"] for r in records if r is not None] == list(range(1, 201))
+    assert records == inline_records
+    assert async_records == inline_records
@@ -0,0 +1,37 @@
+import numpy as np
+import pyarrow as pa
+
+from src.price_changes import PriceArrays, compute_changes
+
+
+def test_compute_changes():
+    # Arrange
+    old = PriceArrays.from_table(
+        pa.table(
+            {
+                "product_id": [3.0, 1.0, 2.0, 4.0, 5.0],
+                "unit_price": [1.0, 2.0, 4.0, None, 10.0],
+                "category_id": pa.array([1, 1, 2, 2, 2], pa.int32()),
+            }
+        )
+    )
+    new = PriceArrays(
+        product_ids=np.array([1.0, 2.0, 3.0, 4.0, 6.0]),
+        prices=np.array([2.5, 3.0, 1.0, 5.0, 7.0]),
+        category_ids=np.array([1, 2, 1, 2, 2], np.int32),
+    )
+
+    # Act
+    change_set = compute_changes(old, new)
+    by_category = change_set.by_category()
+
+    # Assert
+    assert change_set.product_ids.tolist() == [1.0, 2.0]
+    assert change_set.deltas.tolist() == [0.5, -1.0]
+    assert change_set.pct_changes.tolist() == [25.0, -25.0]
+    assert change_set.only_new_ids.tolist() == [6.0]
+    assert change_set.only_old_ids.tolist() == [5.0]
+    assert by_category.category_ids.tolist() == [1, 2]
+    assert by_category.n_increases.tolist() == [1, 0]
+    assert by_category.n_decreases.tolist() == [0, 1]
+    assert change_set.top_movers(1).tolist() == [0, 1]
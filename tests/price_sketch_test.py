@@ -0,0 +1,31 @@
+import random
+from datetime import date
+
+from src.category_aggregates import aggregate_prices
+from src.price_sketch import RELATIVE_ACCURACY, PriceSketch
+
+
+def test_price_sketch():
+    # Arrange
+    rng = random.Random(0)
+    prices = [round(rng.uniform(0.3, 40), 2) for _ in range(5000)]
+    first, second = PriceSketch(), PriceSketch()
+
+    # Act
+    for price in prices[:2000]:
+        first.add(price)
+    for price in prices[2000:]:
+        second.add(price)
+    first.merge(second)
+    aggregates = aggregate_prices((7, date.today(), price) for price in prices)
+
+    # Assert
+    assert first.count == len(prices)
+    for q in (0.1, 0.5, 0.9):
+        actual = sorted(prices)[int(q * (len(prices) - 1))]
+        estimate = first.quantile(q)
+        assert estimate is not None
+        assert abs(estimate - actual) <= 2 * RELATIVE_ACCURACY * actual
+    assert len(aggregates) == 1
+    assert aggregates[0].sketch == first.buckets
+    assert aggregates[0].min_price == min(prices)
@@ -0,0 +1,159 @@
+from datetime import datetime
+
+from src.models import ScannedProduct
+from src.scraper.product_state import ProductsState
+
+
+class FakeLocator:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.n_inner_text = 0
+
+    def inner_text(self) -> str:
+        self.n_inner_text += 1
+        return self.text
+
+    def element_handle(self) -> "FakeLocator":
+        return self
+
+
+def scanned(product_id: float, category_name: str, subcategory_name: str) -> ScannedProduct:
+    return ScannedProduct(
+        product_id=product_id,
+        category_name=category_name,
+        subcategory_name=subcategory_name,
+        scanned_at=datetime(2024, 1, 1),
+    )
+
+
+def test_products_state():
+    # Arrange
+    products_state = ProductsState()
+    categories = [FakeLocator("Congelados"), FakeLocator("Aceite")]
+    subcategories = [FakeLocator("Pescado"), FakeLocator("Carne")]
+    products = [FakeLocator("Merluza"), FakeLocator("Bacalao")]
+
+    # Act & Assert
+    products_state.add_categories(categories)
+    assert products_state.get_pending_categories() == [categories[1], categories[0]]
+
+    products_state.add_subcategories(categories[0], subcategories)
+    assert products_state.get_pending_subcategories(categories[0]) == [
+        subcategories[1],
+        subcategories[0],
+    ]
+
+    products_state.add_products(categories[0], subcategories[0], products)
+    assert products_state.get_pending_products(categories[0], subcategories[0]) == products
+
+    products_state.add_scanned_product(
+        categories[0], subcategories[0], products[0], scanned(1.0, "Congelados", "Pescado")
+    )
+    assert products_state.scan_listed_products("Congelados", "Pescado", {"Bacalao": 2.0}) == 1
+    assert products_state.get_pending_subcategories(categories[0]) == [subcategories[1]]
+
+    # Reloaded page (new locators), with a product already scanned in another subcategory
+    products_state.add_categories([FakeLocator("Congelados"), FakeLocator("Aceite")])
+    new_category = products_state.get_pending_categories()[1]
+    new_subcategory = FakeLocator("Carne")
+    products_state.add_subcategories(new_category, [FakeLocator("Pescado"), new_subcategory])
+    products_state.add_products(
+        new_category, new_subcategory, [FakeLocator("Merluza"), FakeLocator("Pollo")]
+    )
+    (pending_product,) = products_state.get_pending_products(new_category, new_subcategory)
+    assert pending_product.text == "Pollo"
+
+    # Texts are read once, pending lookups with the locators of the state do not read the page
+    assert sum(c.n_inner_text for c in categories + subcategories + products) == 6
+
+    other_state = ProductsState()
+    other_state.add_categories([categories[1]])
+    other_state.add_subcategories(categories[1], [FakeLocator("Oliva")])
+    other_state.add_products(categories[1], FakeLocator("Oliva"), [FakeLocator("Virgen")])
+    other_state.scan_listed_products("Aceite", "Oliva", {"Virgen": 3.0})
+    products_state.merge(other_state)
+
+    assert [p.product_id for p in products_state.get_scanned_products()] == [1.0, 2.0, 3.0]
+    assert products_state.get_pending_categories() == [new_category]
+
+
+def test_products_state_with_read_texts():
+    # Arrange
+    products_state = ProductsState()
+    category, subcategory = FakeLocator("Congelados"), FakeLocator("Pescado")
+    products = [FakeLocator("Merluza"), FakeLocator("Bacalao")]
+
+    # Act
+    products_state.add_categories([category], ["Congelados"])
+    products_state.add_subcategories(category, [subcategory], ["Pescado"])
+    products_state.add_products(category, subcategory, products, ["Merluza", "Bacalao"], products)
+
+    # Assert
+    assert products_state.get_names(category, subcategory) == ("Congelados", "Pescado")
+    assert products_state.get_pending_products(category, subcategory) == products
+    assert sum(c.n_inner_text for c in [category, subcategory, *products]) == 0
+
+
+def test_products_state_resume_url():
+    # Arrange
+    products_state = ProductsState()
+    category = FakeLocator("Congelados")
+    subcategories = [FakeLocator("Pescado"), FakeLocator("Carne")]
+    products_state.add_categories([category])
+    products_state.add_subcategories(category, subcategories)
+
+    # Act & Assert
+    assert products_state.pop_resume_url() is None
+
+    products_state.set_subcategory_url(
+        category, subcategories[1], "https://example.com/categories/2"
+    )
+    products_state.add_products(category, subcategories[1], [FakeLocator("Pollo")])
+    assert products_state.pop_resume_url() == "https://example.com/categories/2"
+    # Only once, in case resuming from it fails
+    assert products_state.pop_resume_url() is None
+
+
+def test_products_state_known_listings():
+    # Arrange
+    category = FakeLocator("Congelados")
+    subcategories = [FakeLocator("Pescado"), FakeLocator("Carne")]
+    fish = ["Merluza\n3,50 €", "Bacalao\n5,00 €"]
+    meat = ["Pollo\n4,00 €", "Merluza\n3,50 €"]
+
+    walked = ProductsState()
+    walked.add_categories([category])
+    walked.add_subcategories(category, subcategories)
+    walked.add_products(category, subcategories[1], [FakeLocator(t) for t in meat])
+    walked.scan_listed_products("Congelados", "Carne", {"Pollo": 1.0, "Merluza": 2.0})
+    walked.add_products(category, subcategories[0], [FakeLocator(t) for t in fish])
+    # Merluza is skipped, it was already scanned in Carne
+    walked.scan_listed_products("Congelados", "Pescado", {"Bacalao": 3.0})
+
+    # Act
+    listings = walked.get_new_listings()
+    known_listings = {listing.hash_value: listing.product_ids for listing in listings}
+    products_state = ProductsState(known_listings)
+    products_state.add_categories([category])
+    products_state.add_subcategories(category, subcategories)
+    # Same products, in another order and with another price
+    cells = [FakeLocator("Bacalao\n4,50 €"), FakeLocator("Merluza\n3,50 €")]
+    products_state.add_products(category, subcategories[0], cells)
+    products_state.add_products(category, subcategories[1], [FakeLocator("Pollo\n4,00 €")])
+
+    # Assert
+    assert [(x.subcategory_name, x.product_ids) for x in listings] == [
+        ("Pescado", [2.0, 3.0]),
+        ("Carne", [1.0, 2.0]),
+    ]
+    assert products_state.get_pending_subcategories(category) == [subcategories[1]]
+    assert products_state.get_pending_products(category, subcategories[0]) == []
+    assert sorted(p.product_id for p in products_state.get_scanned_products()) == [2.0, 3.0]
+    assert products_state.get_new_listings() == []
+
+    # Bacalao was replaced by a new product with the same name
+    replaced = ProductsState(known_listings)
+    replaced.add_categories([category])
+    replaced.add_subcategories(category, subcategories)
+    replaced.add_products(category, subcategories[0], cells, listed_ids={"Bacalao": 4.0})
+    assert len(replaced.get_pending_products(category, subcategories[0])) == 2
@@ -0,0 +1,26 @@
+import asyncio
+
+from src.rate_limiter import RateLimiter
+
+
+def test_rate_limiter():
+    # Arrange
+    now = [100.0]
+    sleeps: list[float] = []
+
+    async def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+
+    limiter = RateLimiter(rate=4, clock=lambda: now[0], sleep=sleep)
+
+    async def run() -> None:
+        await asyncio.gather(*(limiter.wait() for _ in range(3)))
+        now[0] += 10
+        await limiter.wait()
+
+    # Act
+    asyncio.run(run())
+
+    # Assert
+    # Concurrent waits are spaced out, and an idle limiter does not delay
+    assert sleeps == [0.25, 0.5]
@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+from src.models import PriceChangeStats
+from src.refresh_scheduler import MAX_REFRESH_INTERVAL, RefreshScheduler
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+
+def _stats(product_id: float, n_prices: int, days: float, refreshed_ago: timedelta | None):
+    return PriceChangeStats(
+        product_id=product_id,
+        n_prices=n_prices,
+        first_seen_at=NOW - timedelta(days=days),
+        last_seen_at=NOW,
+        last_refreshed_at=NOW - refreshed_ago if refreshed_ago is not None else None,
+    )
+
+
+def test_refresh_interval():
+    # Arrange
+    stats = {
+        1.0: _stats(1.0, n_prices=11, days=10, refreshed_ago=timedelta(hours=1)),
+        2.0: _stats(2.0, n_prices=1, days=10, refreshed_ago=timedelta(hours=1)),
+    }
+
+    # Act
+    scheduler = RefreshScheduler(stats, now=NOW)
+
+    # Assert
+    assert scheduler.volatility(1.0) == 1.0
+    assert scheduler.refresh_interval(1.0) == timedelta(days=1)
+    assert scheduler.refresh_interval(2.0) == MAX_REFRESH_INTERVAL
+    assert scheduler.refresh_interval(3.0) == MAX_REFRESH_INTERVAL
+
+
+def test_volatility_after_a_stable_period():
+    # Arrange
+    stats = {
+        # Changed once, a day after it was first seen, then stable for two months
+        1.0: PriceChangeStats(
+            product_id=1.0,
+            n_prices=2,
+            first_seen_at=NOW - timedelta(days=60),
+            last_seen_at=NOW - timedelta(days=59),
+            last_refreshed_at=NOW - timedelta(days=1),
+        ),
+        # Same, without any recorded refresh
+        2.0: PriceChangeStats(
+            product_id=2.0,
+            n_prices=2,
+            first_seen_at=NOW - timedelta(days=60),
+            last_seen_at=NOW - timedelta(days=59),
+        ),
+    }
+
+    # Act
+    scheduler = RefreshScheduler(stats, now=NOW)
+
+    # Assert
+    assert scheduler.volatility(1.0) == 1 / 59
+    assert scheduler.volatility(2.0) == 1 / 60
+    assert scheduler.refresh_interval(1.0) == MAX_REFRESH_INTERVAL
+
+
+def test_order():
+    # Arrange
+    stats = {
+        # Volatile and due
+        1.0: _stats(1.0, n_prices=11, days=10, refreshed_ago=timedelta(days=2)),
+        # Very volatile and due
+        2.0: _stats(2.0, n_prices=21, days=10, refreshed_ago=timedelta(days=2)),
+        # Stable, not due, refreshed long ago
+        3.0: _stats(3.0, n_prices=1, days=10, refreshed_ago=timedelta(days=10)),
+        # Stable, not due, refreshed recently
+        4.0: _stats(4.0, n_prices=1, days=10, refreshed_ago=timedelta(days=1)),
+    }
+    scheduler = RefreshScheduler(stats, now=NOW)
+
+    # Act
+    ordered = scheduler.order([4.0, 3.0, 1.0, 2.0, 5.0])
+    ordered_budget = scheduler.order([4.0, 3.0, 1.0, 2.0, 5.0], budget=4)
+
+    # Assert
+    assert ordered == [5.0, 2.0, 1.0, 3.0, 4.0]
+    assert ordered_budget == [5.0, 2.0, 1.0, 3.0]
+
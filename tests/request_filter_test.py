@@ -0,0 +1,124 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.scraper.request_filter import RequestFilter
+
+
+class FakeRoute:
+    def __init__(self, url: str, resource_type: str) -> None:
+        self.request = SimpleNamespace(url=url, resource_type=resource_type, method="GET")
+        self.handled: str | None = None
+        self.fulfilled: dict = {}
+        self.n_fetched = 0
+
+    def abort(self) -> None:
+        self.handled = "abort"
+
+    def continue_(self) -> None:
+        self.handled = "continue"
+
+    def fetch(self):
+        self.n_fetched += 1
+        return SimpleNamespace(
+            ok=True,
+            headers={"content-type": "text/javascript", "content-encoding": "gzip"},
+            body=lambda: b"console.log(1);",
+        )
+
+    def fulfill(self, **kwargs) -> None:
+        self.handled = "fulfill"
+        self.fulfilled = kwargs
+
+
+class FakeAsyncRoute:
+    def __init__(self, url: str, resource_type: str) -> None:
+        self.route = FakeRoute(url, resource_type)
+        self.request = self.route.request
+
+    async def abort(self) -> None:
+        self.route.abort()
+
+    async def continue_(self) -> None:
+        self.route.continue_()
+
+    async def fetch(self):
+        response = self.route.fetch()
+        body = response.body()
+
+        async def read_body() -> bytes:
+            return body
+
+        return SimpleNamespace(ok=response.ok, headers=response.headers, body=read_body)
+
+    async def fulfill(self, **kwargs) -> None:
+        self.route.fulfill(**kwargs)
+
+
+def test_request_filter(tmp_path):
+    # Arrange
+    request_filter = RequestFilter(allow=("cdn.example.com/logo",), cache_dir=tmp_path)
+    script_url = "https://example.com/static/app.js"
+
+    # Act
+    routes = {
+        "image": FakeRoute("https://example.com/a.jpg", "image"),
+        "allowed": FakeRoute("https://cdn.example.com/logo.png", "image"),
+        "analytics": FakeRoute("https://www.google-analytics.com/g/collect", "fetch"),
+        "api": FakeRoute("https://example.com/api/categories/", "fetch"),
+        "script": FakeRoute(script_url, "script"),
+        "script_again": FakeRoute(script_url, "script"),
+    }
+    for route in routes.values():
+        request_filter.handle(route)
+    # A new run reads the cache on disk
+    new_run = FakeRoute(script_url, "script")
+    RequestFilter(cache_dir=tmp_path).handle(new_run)
+
+    # Assert
+    assert {name: route.handled for name, route in routes.items()} == {
+        "image": "abort",
+        "allowed": "continue",
+        "analytics": "abort",
+        "api": "continue",
+        "script": "fulfill",
+        "script_again": "fulfill",
+    }
+    assert request_filter.n_blocked == {"image": 1, "fetch": 1}
+    assert routes["script"].n_fetched == 1
+    assert routes["script_again"].n_fetched == 0
+    assert request_filter.n_cache_hits == 1
+    assert new_run.n_fetched == 0
+    assert new_run.fulfilled["body"] == b"console.log(1);"
+    assert new_run.fulfilled["headers"] == {"content-type": "text/javascript"}
+
+
+def test_request_filter_async(tmp_path):
+    # Arrange
+    request_filter = RequestFilter(cache_dir=tmp_path)
+    script_url = "https://example.com/static/app.js"
+    routes = {
+        "image": FakeAsyncRoute("https://example.com/a.jpg", "image"),
+        "api": FakeAsyncRoute("https://example.com/api/categories/", "fetch"),
+        "script": FakeAsyncRoute(script_url, "script"),
+        "script_again": FakeAsyncRoute(script_url, "script"),
+    }
+
+    # Act
+    async def run() -> None:
+        for route in routes.values():
+            await request_filter.handle_async(route)
+
+    asyncio.run(run())
+
+    # Assert
+    assert {name: route.route.handled for name, route in routes.items()} == {
+        "image": "abort",
+        "api": "continue",
+        "script": "fulfill",
+        "script_again": "fulfill",
+    }
+    assert request_filter.n_blocked == {"image": 1}
+    assert routes["script"].route.n_fetched == 1
+    assert routes["script_again"].route.n_fetched == 0
+    assert routes["script_again"].route.fulfilled["body"] == b"console.log(1);"
+    assert routes["script_again"].route.fulfilled["headers"] == {"content-type": "text/javascript"}
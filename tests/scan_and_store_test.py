@@ -0,0 +1,68 @@
+import asyncio
+from datetime import datetime
+
+from src import scan_and_store
+from src.models import ScannedProduct
+from src.parse_pool import ParsePool
+from src.store_products_remote import ProductStoringStatus
+
+
+def scanned(product_id: float) -> ScannedProduct:
+    return ScannedProduct(
+        product_id=product_id,
+        category_name="Congelados",
+        subcategory_name="Pescado",
+        scanned_at=datetime(2024, 1, 1),
+    )
+
+
+def test_scan_and_store(monkeypatch):
+    # Arrange
+    inserted: list[list[float]] = []
+    stored: list[list[float]] = []
+    first_batch_stored = asyncio.Event()
+
+    async def scan():
+        for product_id in [1.0, 2.0, 3.0]:
+            yield scanned(product_id)
+        # The first products are stored while the scan is still going on
+        await asyncio.wait_for(first_batch_stored.wait(), timeout=1)
+        for product_id in [2.0, 4.0, 5.0]:
+            yield scanned(product_id)
+
+    async def store_product_details(batch, *_):
+        stored.append([state.product_id for state in batch])
+        for state in batch:
+            # Product 4 fails once
+            if state.product_id == 4.0 and state.n_tries == 0:
+                state.n_tries += 1
+            else:
+                state.status = ProductStoringStatus.SUCCESS
+        first_batch_stored.set()
+
+    monkeypatch.setattr(scan_and_store, "BATCH_SIZE", 2)
+    monkeypatch.setattr(scan_and_store, "FLUSH_SECONDS", 0.05)
+    monkeypatch.setattr(scan_and_store, "BATCH_PAUSE_SECONDS", 0)
+    monkeypatch.setattr(scan_and_store, "store_product_details", store_product_details)
+    monkeypatch.setattr(
+        scan_and_store.db,
+        "insert_scanned_products",
+        lambda products: inserted.append([p.product_id for p in products]),
+    )
+    monkeypatch.setattr(scan_and_store.db, "mark_products_refreshed", lambda _: None)
+
+    async def run():
+        pending: asyncio.Queue = asyncio.Queue(maxsize=2)
+        return await asyncio.gather(
+            scan_and_store.scan_new_products(scan(), pending, {1.0}),
+            scan_and_store.store_new_products(pending, ParsePool(0)),
+        )
+
+    # Act
+    scanned_products, n_stored = asyncio.run(run())
+
+    # Assert
+    assert len(scanned_products) == 6
+    assert inserted == [[2.0, 3.0], [4.0, 5.0]]
+    assert stored == [[2.0, 3.0], [4.0, 5.0], [4.0]]
+    assert n_stored == 4
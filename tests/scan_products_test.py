@@ -0,0 +1,116 @@
+import time
+
+import pytest
+from playwright.sync_api import Error as pw_Error
+
+from src import scan_products
+from src.scraper import get_product_basic
+
+
+class FakeLocator:
+    def __init__(self, text: str) -> None:
+        self.text = text
+
+    def inner_text(self) -> str:
+        return self.text
+
+    def element_handle(self) -> "FakeLocator":
+        return self
+
+
+class FakeSession:
+    def __enter__(self) -> "FakeSession":
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+
+class FakeVpn:
+    n_rotations = 0
+
+    def __init__(self, configs_folder=None) -> None:
+        pass
+
+    def rotate(self) -> None:
+        FakeVpn.n_rotations += 1
+
+    def kill(self) -> None:
+        pass
+
+
+def test_get_scanned_products_parallel(monkeypatch):
+    # Arrange
+    category_names = [f"Category {i}" for i in range(5)]
+    n_calls: dict[str, int] = {}
+    discovery_errors = [pw_Error("Menu not loaded")]
+
+    def get_category_names(*_):
+        # The first try to get the categories fails
+        if discovery_errors:
+            raise discovery_errors.pop()
+        return category_names
+
+    def compute(products_state, _partial_scan, _shard, category_names, session):
+        assert isinstance(session, FakeSession)
+        (category_name,) = category_names
+        n_calls[category_name] = n_calls.get(category_name, 0) + 1
+        # Every category needs a second try
+        if n_calls[category_name] == 2:
+            products_state.add_categories([FakeLocator(category_name)])
+            category_loc = products_state.get_pending_categories()[0]
+            products_state.add_subcategories(category_loc, [FakeLocator("Subcategory")])
+            (subcategory_loc,) = products_state.get_pending_subcategories(category_loc)
+            products_state.add_products(category_loc, subcategory_loc, [FakeLocator("Product")])
+            products_state.scan_listed_products(
+                category_name, "Subcategory", {"Product": float(category_name[-1])}
+            )
+            products_state.is_finished = True
+        return products_state
+
+    monkeypatch.setattr(scan_products, "Vpn", FakeVpn)
+    monkeypatch.setattr(scan_products.db, "get_known_listings", lambda _: {})
+    monkeypatch.setattr(scan_products.db, "insert_html_category", lambda _: 0)
+    monkeypatch.setattr(get_product_basic, "get_category_names", get_category_names)
+    monkeypatch.setattr(get_product_basic, "compute", compute)
+    monkeypatch.setattr(get_product_basic, "ScannerSession", FakeSession)
+
+    # Act
+    products = scan_products.get_scanned_products_parallel(workers=3)
+
+    # Assert
+    assert n_calls == {name: 2 for name in category_names}
+    # Rotated before each try to get the categories, then after failed tries of the categories
+    assert 2 < FakeVpn.n_rotations <= 2 + len(category_names)
+    assert sorted(p.category_name for p in products) == category_names
+
+
+def test_get_scanned_products_parallel_fails_fast(monkeypatch):
+    # Arrange
+    category_names = [f"Category {i}" for i in range(10)]
+    n_calls: dict[str, int] = {}
+
+    def compute(products_state, _partial_scan, _shard, category_names, _session):
+        (category_name,) = category_names
+        n_calls[category_name] = n_calls.get(category_name, 0) + 1
+        # The first category never loads, the rest are slower than running out of its tries
+        if category_name != "Category 0":
+            time.sleep(0.1)
+            products_state.is_finished = True
+        return products_state
+
+    monkeypatch.setattr(scan_products, "N_TRIES_CATEGORY", 2)
+    monkeypatch.setattr(scan_products, "Vpn", FakeVpn)
+    monkeypatch.setattr(scan_products.db, "get_known_listings", lambda _: {})
+    monkeypatch.setattr(get_product_basic, "get_category_names", lambda *_: category_names)
+    monkeypatch.setattr(get_product_basic, "compute", compute)
+    monkeypatch.setattr(get_product_basic, "ScannerSession", FakeSession)
+
+    # Act
+    with pytest.raises(ValueError, match="Category 0"):
+        scan_products.get_scanned_products_parallel(workers=2)
+
+    # Assert
+    assert n_calls["Category 0"] == 2
+    # The other worker stopped after its current category, if it had claimed one
+    assert len(n_calls) <= 2
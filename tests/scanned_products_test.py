@@ -0,0 +1,25 @@
+import json
+
+from src.models import ScannedProduct
+from src.scanned_products import ScannedProducts
+
+
+def test_scanned_products_dump_load(tmp_path):
+    # Arrange
+    with open("tests/fixtures/scanned_products.json", "r", encoding="utf-8") as json_file:
+        scanned_products_dict = json.load(json_file)
+    scanned_products = [ScannedProduct(**item) for item in scanned_products_dict]
+    path = tmp_path / "scanned_products.bin"
+
+    # Act
+    products = ScannedProducts(scanned_products)
+    products.dump(path)
+    loaded = ScannedProducts.load(path)
+
+    # Assert
+    assert list(products) == scanned_products
+    assert list(loaded) == scanned_products
+    assert loaded[1] == scanned_products[1]
+    assert len(loaded.names) == len(
+        {p.category_name for p in scanned_products} | {p.subcategory_name for p in scanned_products}
+    )
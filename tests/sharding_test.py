@@ -0,0 +1,40 @@
+import pytest
+
+from src.sharding import Shard, shard_of
+
+
+def test_parse():
+    assert Shard.parse("2/5") == Shard(index=2, count=5)
+    assert str(Shard.parse("1/1")) == "1/1"
+
+    for invalid in ["0/4", "5/4", "1/0", "1", "a/b", "1/2/3"]:
+        with pytest.raises(ValueError):
+            Shard.parse(invalid)
+
+
+def test_shards_partition_keys():
+    # Arrange
+    keys = [str(i) for i in range(10000)]
+    count = 7
+
+    # Act
+    owners = [
+        [key for key in keys if Shard(index=i, count=count).contains(key)] for i in range(1, 8)
+    ]
+
+    # Assert
+    assert sum(len(o) for o in owners) == len(keys)
+    for owned in owners:
+        assert abs(len(owned) - len(keys) / count) < 0.1 * len(keys) / count
+
+
+def test_adding_a_shard_moves_few_keys():
+    # Arrange
+    keys = [str(i) for i in range(10000)]
+
+    # Act
+    moved = [key for key in keys if shard_of(key, 4) != shard_of(key, 5)]
+
+    # Assert
+    assert all(shard_of(key, 5) == 5 for key in moved)
+    assert abs(len(moved) - len(keys) / 5) < 0.1 * len(keys) / 5
@@ -0,0 +1,29 @@
+import json
+
+import pyarrow as pa
+
+from src.scraper.extractor import extract_full_info
+from src.snapshot import SnapshotWriter, read_snapshot
+
+
+def test_snapshot_writer(tmp_path):
+    # Arrange
+    with open("tests/fixtures/products_full.json", "r", encoding="utf-8") as json_file:
+        products_full_dict = json.load(json_file)
+    records = [extract_full_info(item).model_dump() for item in products_full_dict]
+    writer = SnapshotWriter(tmp_path)
+
+    # Act
+    writer.add(records)
+    writer.close()
+    snapshot = read_snapshot(tmp_path)
+
+    # Assert
+    assert snapshot.num_rows == len(records)
+    assert sorted(path.name for path in tmp_path.iterdir())[0].startswith("date=")
+    assert len(list(tmp_path.glob("date=*/category_id=*/*.parquet"))) == 3
+    assert pa.types.is_dictionary(snapshot.schema.field("supplier").type)
+    rows = {row["product_id"]: row for row in snapshot.to_pylist()}
+    assert rows[60722.0]["category"] == "Azúcar, caramelos y chocolate"
+    assert rows[60722.0]["category_id"] == 9
+    assert rows[60722.0]["unit_price"] == records[0]["price_instruction"]["unit_price"]
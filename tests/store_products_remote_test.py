@@ -0,0 +1,127 @@
+import asyncio
+
+import httpx
+
+from src import store_products_remote
+from src.circuit_breaker import BreakerState, CircuitBreaker, PayloadSpool
+from src.store_products_remote import ProductStoringStatus, StoringState
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeSink:
+    def __init__(self) -> None:
+        self.records: list[dict] = []
+
+    def add(self, records: list[dict]) -> None:
+        self.records.extend(records)
+
+    def close(self) -> None:
+        pass
+
+
+def _patch_store(monkeypatch, tmp_path, make_request_post, breaker=None):
+    fetched: list[float] = []
+    refreshed: list[float] = []
+
+    async def make_request_get(_, product_id):
+        fetched.append(product_id)
+        return str(product_id).encode()
+
+    monkeypatch.setattr(store_products_remote, "make_request_get", make_request_get)
+    monkeypatch.setattr(store_products_remote, "make_request_post", make_request_post)
+    monkeypatch.setattr(
+        store_products_remote,
+        "parse_responses",
+        lambda raws: [{"product": {"id": float(raw)}} for raw in raws],
+    )
+    monkeypatch.setattr(store_products_remote, "cf_breaker", breaker or CircuitBreaker("test"))
+    monkeypatch.setattr(
+        store_products_remote, "payload_spool", PayloadSpool(tmp_path / "spool.jsonl")
+    )
+    monkeypatch.setattr(store_products_remote, "PAUSE_WHILE_OPEN_SECONDS", 0)
+    monkeypatch.setattr(store_products_remote.db, "mark_products_refreshed", refreshed.extend)
+    monkeypatch.setattr(store_products_remote.db, "ack_store_batch", lambda *_: None)
+    return fetched, refreshed
+
+
+def test_spooled_products_stay_pending(monkeypatch, tmp_path):
+    # Arrange
+    is_endpoint_down = True
+
+    async def make_request_post(_, data):
+        if is_endpoint_down and data["product"]["id"] == 2.0:
+            raise httpx.ConnectError("Storage endpoint down")
+        return {"productId": data["product"]["id"]}
+
+    fetched, refreshed = _patch_store(monkeypatch, tmp_path, make_request_post)
+    states = [StoringState(product_id=1.0), StoringState(product_id=2.0)]
+    sink = FakeSink()
+
+    # Act
+    asyncio.run(store_products_remote.store_product_details(states, record_sinks=[sink]))
+    spooled = store_products_remote.payload_spool.read_all()
+    is_endpoint_down = False
+    asyncio.run(store_products_remote.store_product_details([StoringState(product_id=3.0)]))
+
+    # Assert
+    # The spooled product uses no try, it is only refreshed once the spool delivers it
+    assert [(state.status, state.n_tries) for state in states] == [
+        (ProductStoringStatus.SUCCESS, 0),
+        (ProductStoringStatus.SPOOLED, 0),
+    ]
+    assert spooled == [{"product": {"id": 2.0}}]
+    assert store_products_remote.payload_spool.read_all() == []
+    assert refreshed == [2.0]
+    assert fetched == [1.0, 2.0, 3.0]
+    # Sinks only observe the stored records
+    assert sink.records == [{"product": {"id": 1.0}}]
+
+
+def test_open_breaker_pauses_the_batch(monkeypatch, tmp_path):
+    # Arrange
+    async def make_request_post(_, data):
+        return {"productId": data["product"]["id"]}
+
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60, clock=FakeClock())
+    breaker.record_failure()
+    fetched, _ = _patch_store(monkeypatch, tmp_path, make_request_post, breaker)
+    states = [StoringState(product_id=1.0)]
+
+    # Act
+    asyncio.run(store_products_remote.store_product_details(states))
+
+    # Assert
+    assert fetched == []
+    assert (states[0].status, states[0].n_tries) == (ProductStoringStatus.PENDING, 0)
+
+
+def test_rejected_probe_releases_the_breaker(monkeypatch, tmp_path):
+    # Arrange
+    async def make_request_post(*_):
+        # A 4xx with an HTML body, as returned by a misconfigured edge
+        response = httpx.Response(403, text="<html>Forbidden</html>")
+        return response.json()
+
+    clock = FakeClock()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    clock.now = 60
+    _patch_store(monkeypatch, tmp_path, make_request_post, breaker)
+    states = [StoringState(product_id=1.0)]
+
+    # Act
+    asyncio.run(store_products_remote.store_product_details(states))
+
+    # Assert
+    # The probe failed, so the breaker opens again instead of waiting for it forever
+    assert breaker.state == BreakerState.OPEN
+    clock.now = 120
+    assert breaker.allow_request()
+    assert (states[0].status, states[0].n_tries) == (ProductStoringStatus.PENDING, 1)
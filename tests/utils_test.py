@@ -1,6 +1,10 @@
 import pytest
 
-from src.scraper.utils import extract_product_id_from_url
+from src.scraper.utils import (
+    extract_category_id_from_url,
+    extract_product_id_from_url,
+    listing_fingerprint,
+)
 
 
 def test_extract_product_id_from_url():
@@ -20,3 +24,21 @@ def test_invalid_url():
     # Test case for an invalid URL
     with pytest.raises(ValueError):
         extract_product_id_from_url("invalid_url")
+
+
+def test_extract_category_id_from_url():
+    assert extract_category_id_from_url("https://tienda.mercadona.es/categories/112") == 112
+    assert extract_category_id_from_url("https://tienda.mercadona.es/") is None
+
+
+def test_listing_fingerprint():
+    listing = ["Merluza\n3,50 €", "Bacalao\n5,00 €"]
+    fingerprint = listing_fingerprint("Congelados", "Pescado", listing)
+
+    assert listing_fingerprint("Congelados", "Pescado", listing[::-1]) == fingerprint
+    assert listing_fingerprint("Congelados", "Pescado", ["Merluza\n3,00 €", listing[1]]) == (
+        fingerprint
+    )
+    assert listing_fingerprint("Congelados", "Pescado", listing[:1]) != fingerprint
+    assert listing_fingerprint("Congelados", "Pescado", [*listing, listing[0]]) != fingerprint
+    assert listing_fingerprint("Congelados", "Carne", listing) != fingerprint
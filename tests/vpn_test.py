@@ -0,0 +1,82 @@
+import asyncio
+import threading
+
+from httpx import Request
+
+from src import vpn
+from src.vpn import NameSolver
+
+
+def test_name_solver_routes_to_healthiest_ip(monkeypatch):
+    # Arrange
+    latencies = {"10.0.0.1": 0.05, "10.0.0.2": 0.01, "10.0.0.3": None}
+    monkeypatch.setattr(vpn, "resolve_ips", lambda _: ["10.0.0.1", "10.0.0.2"])
+    monkeypatch.setattr(vpn, "probe_ip", lambda ip, port, timeout: latencies[ip])
+    solver = NameSolver(fallback_ips=["10.0.0.3"])
+
+    # Act & Assert
+    assert solver.get("example.com") == ""
+    assert solver.candidates("tienda.mercadona.es") == ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    assert solver.get("tienda.mercadona.es") == "10.0.0.2"
+
+    # The fastest IP starts failing
+    for _ in range(10):
+        solver.record("10.0.0.2", latency=None, error=True)
+    assert solver.get("tienda.mercadona.es") == "10.0.0.1"
+
+    report = solver.report()
+    assert report["10.0.0.2"]["n_errors"] == 10
+    assert report["10.0.0.1"]["selected"] == 1
+    assert report["10.0.0.3"]["n_errors"] == 1
+
+
+def test_name_solver_keeps_sni(monkeypatch):
+    # Arrange
+    monkeypatch.setattr(vpn, "resolve_ips", lambda _: [])
+    monkeypatch.setattr(vpn, "probe_ip", lambda ip, port, timeout: 0.01)
+    solver = NameSolver(fallback_ips=["10.0.0.1"])
+
+    # Act
+    request = solver.resolve(Request("GET", "https://tienda.mercadona.es/api/products/1/"))
+
+    # Assert
+    assert request.url.host == "10.0.0.1"
+    assert request.extensions["sni_hostname"] == "tienda.mercadona.es"
+
+
+def test_name_solver_probes_failed_ips_again(monkeypatch):
+    # Arrange
+    latencies: dict[str, float | None] = {"10.0.0.1": 0.05, "10.0.0.2": None}
+    monkeypatch.setattr(vpn, "resolve_ips", lambda _: ["10.0.0.1", "10.0.0.2"])
+    monkeypatch.setattr(vpn, "probe_ip", lambda ip, port, timeout: latencies[ip])
+    solver = NameSolver(ttl_seconds=0, fallback_ips=[])
+
+    # Act & Assert
+    assert solver.get("tienda.mercadona.es") == "10.0.0.1"
+    # Request latencies are not compared with the probe of an IP never used
+    solver.record("10.0.0.1", latency=0.3, error=False)
+
+    latencies["10.0.0.2"] = 0.01
+    assert solver.get("tienda.mercadona.es") == "10.0.0.2"
+
+
+def test_name_solver_prepare_off_the_loop(monkeypatch):
+    # Arrange
+    threads = []
+
+    def probe_ip(*_):
+        threads.append(threading.current_thread())
+        return 0.01
+
+    monkeypatch.setattr(vpn, "resolve_ips", lambda _: [])
+    monkeypatch.setattr(vpn, "probe_ip", probe_ip)
+    solver = NameSolver(fallback_ips=["10.0.0.1"])
+
+    # Act
+    asyncio.run(solver.prepare("tienda.mercadona.es"))
+    asyncio.run(solver.prepare("tienda.mercadona.es"))
+
+    # Assert
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
+    assert solver.candidates("tienda.mercadona.es") == ["10.0.0.1"]